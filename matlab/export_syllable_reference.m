@@ -0,0 +1,53 @@
+function export_syllable_reference(reference_file)
+    % EXPORT_SYLLABLE_REFERENCE Write syllable_cut boundaries for the Python parity test.
+    %
+    % Every case of the reference file describes a synthetic signal as rows of
+    % tone bursts [onset_s, length_s, freq_hz, amplitude]. The signal is
+    % synthesized, cut with syllable_cut, and the 1-based start/end sample
+    % indices of the syllables and their length are written back to the file.
+    % Run from the matlab directory after changing syllable_cut.m or constants.m.
+    %
+    % Parameters:
+    %   reference_file: JSON file (default: ../python/tests/fixtures/syllable_cut_reference.json)
+
+    if nargin < 1
+        reference_file = fullfile('..', 'python', 'tests', 'fixtures', 'syllable_cut_reference.json');
+    end
+
+    % Add necessary paths
+    addpath(genpath(fullfile(pwd, 'src', 'utils')));
+    addpath(genpath(fullfile(pwd, 'src')));
+
+    reference = jsondecode(fileread(reference_file));
+    cases = reference.cases;
+    for i = 1:numel(cases)
+        signal = synthesize(cases(i));
+        [syllables, time_points] = syllable_cut(signal, cases(i).fs, ...
+            reference.min_length, reference.max_length);
+
+        cases(i).starts = round(time_points(1, :) * cases(i).fs);
+        cases(i).ends = round(time_points(2, :) * cases(i).fs);
+        cases(i).syllable_length = size(syllables, 1);
+        fprintf('%s: %d syllables\n', cases(i).name, numel(cases(i).starts));
+    end
+
+    reference.generator = sprintf('MATLAB %s', version);
+    reference.cases = cases;
+
+    fid = fopen(reference_file, 'w');
+    fprintf(fid, '%s', jsonencode(reference));
+    fclose(fid);
+end
+
+function signal = synthesize(c)
+    % Sum of sine bursts, identical to synthesize() in test_segmentation_parity.py
+    signal = zeros(round(c.duration * c.fs), 1);
+    bursts = reshape(c.bursts, [], 4);
+    for k = 1:size(bursts, 1)
+        onset = round(bursts(k, 1) * c.fs);
+        n = round(bursts(k, 2) * c.fs);
+        t = (0:n-1)' / c.fs;
+        idx = onset + (1:n);
+        signal(idx) = signal(idx) + bursts(k, 4) * sin(2 * pi * bursts(k, 3) * t);
+    end
+end
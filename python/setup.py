@@ -7,6 +7,8 @@ setup(
     package_dir={"": "src"},
     install_requires=[
         "numpy",
+        "scipy",
+        "soundfile",
         "tensorflow",
         "opencv-python",
         "matplotlib",
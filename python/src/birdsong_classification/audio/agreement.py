@@ -0,0 +1,334 @@
+# src/birdsong_classification/audio/agreement.py
+"""
+Agreement of the in-memory featurizer with the MATLAB JPEG path
+
+Usage:
+    python -m birdsong_classification.audio.agreement data/raw [--model models/birdsong_classifier.h5]
+
+The model was trained on JPEGs rendered by MATLAB (spectrogram figure,
+parula colormap, exportgraphics). SpectrogramFeaturizer computes the same
+STFT in NumPy but only approximates that rendering: the colormap is
+interpolated from a few anchors and the white figure margin is missing.
+This tool renders the same syllables both ways (MATLAB through the engine,
+then decoded like BirdSongDataset.load_data) and reports how far the images
+and the model's predictions differ. The report is written next to the model
+(``<model>.agreement.json``) together with the model's hash; predict_batch,
+predict_stream, serve and live refuse the in-memory path unless such a
+report shows enough agreement, and otherwise render with MatlabFeaturizer.
+"""
+import argparse
+import hashlib
+import json
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from birdsong_classification.audio.pipeline import extract_syllables_from_file
+from birdsong_classification.audio.segmentation import sample_syllables
+from birdsong_classification.audio.spectrogram import SpectrogramFeaturizer
+from birdsong_classification.utils.path_utils import get_models_dir
+
+# Recording-level agreement the in-memory path needs before it is used
+MIN_RECORDING_AGREEMENT = 0.95
+
+
+def render_matlab(eng, syllables: np.ndarray, featurizer: SpectrogramFeaturizer) -> np.ndarray:
+    """
+    Render syllables with generate_spectrograms.m and decode them like the training data
+
+    Args:
+        eng: MATLAB engine with the pipeline on its path (predict.start_matlab_engine)
+        syllables: Array of shape (n_syllables, n_samples)
+        featurizer: Featurizer whose STFT parameters and image size to use
+
+    Returns:
+        uint8 images of shape (n_syllables, img_size, img_size, 3)
+    """
+    import matlab
+    from birdsong_classification.data.dataset import BirdSongDataset
+
+    params = featurizer.params()
+    spectro = {'window': float(params['window']), 'overlap': float(params['overlap']),
+               'nfft': float(params['nfft']), 'fs': float(params['fs'])}
+    temp_dir = Path(tempfile.mkdtemp(prefix="birdsong_agreement_"))
+    try:
+        # MATLAB takes one (samples x syllables) matrix per recording
+        eng.generate_spectrograms([matlab.double(np.asarray(syllables).T.tolist())], spectro,
+                                  str(temp_dir), nargout=0)
+        # Files are named <recording><syllable>.jpg with recording 1
+        paths = sorted(temp_dir.glob('*.jpg'), key=lambda path: int(path.stem[1:]))
+        if len(paths) != len(syllables):
+            raise RuntimeError(f"MATLAB rendered {len(paths)} of {len(syllables)} syllables")
+        X, loaded = BirdSongDataset(str(temp_dir), [], featurizer.img_size).load_images(paths)
+        if not loaded.all():
+            raise RuntimeError("Could not decode the MATLAB spectrograms")
+        return X
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class MatlabFeaturizer(SpectrogramFeaturizer):
+    """
+    Renders syllables with generate_spectrograms.m instead of approximating them
+
+    Drop-in replacement for SpectrogramFeaturizer: syllables are still
+    segmented in Python, only the images come from MATLAB, like the JPEGs the
+    model was trained on. One engine is shared and calls are serialized.
+    """
+
+    renderer = 'matlab'
+
+    def __init__(self, img_size: int = 150, eng=None):
+        """
+        Start the MATLAB engine
+
+        Args:
+            img_size: Size of output images (square)
+            eng: Running MATLAB engine (defaults to predict.start_matlab_engine())
+        """
+        super().__init__(img_size=img_size)
+        if eng is None:
+            from birdsong_classification.predict import start_matlab_engine
+            eng = start_matlab_engine()
+        self._eng = eng
+        self._lock = threading.Lock()
+
+    def params(self) -> Dict:
+        return {**super().params(), 'renderer': self.renderer}
+
+    def __call__(self, syllables: np.ndarray) -> np.ndarray:
+        if len(syllables) == 0:
+            return np.empty((0, self.img_size, self.img_size, self.channels), dtype=np.float32)
+        with self._lock:
+            return render_matlab(self._eng, syllables, self).astype(np.float32)
+
+    def close(self):
+        """Stop the MATLAB engine"""
+        with self._lock:
+            self._eng.quit()
+
+
+def default_report_path(model_path) -> Path:
+    """Agreement report of a model: ``<model>.agreement.json`` next to it"""
+    model_path = Path(model_path)
+    return model_path.with_name(model_path.name + '.agreement.json')
+
+
+def model_digest(model_path) -> str:
+    """SHA-256 of a model file, or of all files of a model directory"""
+    model_path = Path(model_path)
+    files = sorted(p for p in model_path.rglob('*') if p.is_file()) if model_path.is_dir() else [model_path]
+    digest = hashlib.sha256()
+    for path in files:
+        digest.update(path.relative_to(model_path).as_posix().encode() if model_path.is_dir() else b'')
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def check_agreement(model_path, featurizer: SpectrogramFeaturizer, report_path=None,
+                    min_agreement: float = MIN_RECORDING_AGREEMENT) -> Dict:
+    """
+    Make sure an agreement report covers the in-memory path of this model
+
+    Args:
+        model_path: Path to the trained model
+        featurizer: In-memory featurizer that will be used with it
+        report_path: Report written by this module (defaults to default_report_path())
+        min_agreement: Minimum recording-level agreement
+
+    Returns:
+        The report
+
+    Raises:
+        ValueError: If the report is missing, was measured for another model
+            or other featurizer settings, or shows too little agreement
+    """
+    report_path = Path(report_path) if report_path else default_report_path(model_path)
+    hint = (f"Measure it with `python -m birdsong_classification.audio.agreement <audio> --model {model_path}` "
+            "or render with MATLAB (--matlab).")
+    if not report_path.exists():
+        raise ValueError(f"No featurizer agreement report for {model_path} ({report_path}). {hint}")
+    with open(report_path) as f:
+        report = json.load(f)
+    if report.get('model_sha256') != model_digest(model_path):
+        raise ValueError(f"{report_path} was measured for a different model. {hint}")
+    if report.get('featurizer') != json.loads(json.dumps(featurizer.params())):
+        raise ValueError(f"{report_path} was measured with other featurizer settings. {hint}")
+    if report['recording_agreement'] < min_agreement:
+        raise ValueError(f"The in-memory featurizer agrees with MATLAB on {report['recording_agreement']:.1%} "
+                         f"of recordings ({report_path}), below the required {min_agreement:.1%}. "
+                         f"Render with MATLAB (--matlab) instead.")
+    return report
+
+
+def featurizer_for_model(model, model_path, use_matlab: bool = False, report_path=None,
+                         min_agreement: float = MIN_RECORDING_AGREEMENT) -> SpectrogramFeaturizer:
+    """
+    Featurizer for a loaded model: MATLAB rendering, or the in-memory
+    featurizer if check_agreement() accepts it
+
+    Args:
+        model: Loaded InferenceBackend
+        model_path: Path the model was loaded from
+        use_matlab: Render with the MATLAB engine
+        report_path: Agreement report (defaults to default_report_path())
+        min_agreement: Minimum recording-level agreement for the in-memory path
+
+    Returns:
+        Featurizer; its ``renderer`` attribute says which path it is
+    """
+    height, _, channels = model.input_shape
+    if use_matlab:
+        if channels != 3:
+            raise ValueError(f"The MATLAB path renders color images; the model expects {channels} channel(s)")
+        return MatlabFeaturizer(img_size=height)
+    featurizer = SpectrogramFeaturizer(img_size=height, colormap='parula' if channels == 3 else None)
+    check_agreement(model_path, featurizer, report_path, min_agreement)
+    return featurizer
+
+
+def agreement_report(jpeg_images: np.ndarray, featurizer_images: np.ndarray,
+                     jpeg_predictions: np.ndarray, featurizer_predictions: np.ndarray,
+                     recording_ids: np.ndarray) -> Dict:
+    """
+    Summarize how the featurizer's images and predictions differ from the JPEG path
+
+    Args:
+        jpeg_images: Images decoded from the MATLAB JPEGs, (n, h, w, c)
+        featurizer_images: Featurizer output for the same syllables, (n, h, w, c)
+        jpeg_predictions: Model probabilities for jpeg_images, (n, n_classes)
+        featurizer_predictions: Model probabilities for featurizer_images
+        recording_ids: Recording index of every syllable, (n,)
+
+    Returns:
+        Number of syllables and recordings, mean absolute pixel difference
+        (0-255 scale), fraction of syllables and of recordings (majority
+        vote) whose predicted class agrees, and mean total variation
+        distance between the probability vectors
+    """
+    from birdsong_classification.models.aggregation import aggregate
+
+    pixel_error = np.abs(np.asarray(jpeg_images, dtype=np.float64)
+                         - np.asarray(featurizer_images, dtype=np.float64))
+    jpeg_classes = np.argmax(jpeg_predictions, axis=1)
+    featurizer_classes = np.argmax(featurizer_predictions, axis=1)
+
+    recordings = np.unique(recording_ids)
+    recording_agreement = [
+        np.argmax(aggregate(jpeg_predictions[recording_ids == rec]))
+        == np.argmax(aggregate(featurizer_predictions[recording_ids == rec]))
+        for rec in recordings
+    ]
+    return {
+        'syllables': int(len(jpeg_classes)),
+        'recordings': int(len(recordings)),
+        'mean_abs_pixel_error': float(pixel_error.mean()),
+        'syllable_agreement': float(np.mean(jpeg_classes == featurizer_classes)),
+        'recording_agreement': float(np.mean(recording_agreement)),
+        'mean_total_variation': float(0.5 * np.abs(jpeg_predictions - featurizer_predictions).sum(axis=1).mean()),
+    }
+
+
+def measure_agreement(audio_paths: List[str],
+                      model_path: Optional[str] = None,
+                      stats_path: Optional[str] = None,
+                      max_syllables: int = 5,
+                      seed: int = 0) -> Dict:
+    """
+    Render the syllables of each recording both ways and compare the results
+
+    Args:
+        audio_paths: Audio files
+        model_path: Path to the trained model (defaults to models/birdsong_classifier.h5)
+        stats_path: Training statistics, only needed for models without embedded
+            preprocessing (defaults to models/train_stats.npz)
+        max_syllables: Maximum number of syllables per recording
+        seed: Seed for syllable sampling
+
+    Returns:
+        agreement_report() of all syllables, plus the model and its hash, the
+        featurizer parameters and the files that could not be compared
+    """
+    from birdsong_classification.models.backend import load_backend
+    from birdsong_classification.predict import start_matlab_engine
+
+    model_path = model_path or get_models_dir() / "birdsong_classifier.h5"
+    model = load_backend(model_path, stats_path=stats_path)
+    height, _, channels = model.input_shape
+    if channels != 3:
+        raise ValueError("The MATLAB path renders color images; the model expects "
+                         f"{channels} channel(s)")
+    featurizer = SpectrogramFeaturizer(img_size=height)
+    rng = np.random.default_rng(seed)
+
+    jpeg_images, featurizer_images, recording_ids, failed = [], [], [], []
+    eng = start_matlab_engine()
+    try:
+        for i, audio_path in enumerate(audio_paths):
+            try:
+                syllables = sample_syllables(extract_syllables_from_file(audio_path), max_syllables, rng)
+                if len(syllables) == 0:
+                    raise ValueError("No syllables detected in audio")
+                jpeg_images.append(render_matlab(eng, syllables, featurizer))
+            except Exception as e:
+                print(f"Skipping {audio_path}: {e}")
+                failed.append(str(audio_path))
+                continue
+            featurizer_images.append(featurizer(syllables))
+            recording_ids.append(np.full(len(syllables), i))
+            print(f"Rendered {len(syllables)} syllables of {audio_path}")
+    finally:
+        eng.quit()
+
+    if not jpeg_images:
+        raise ValueError("No recording could be compared")
+    jpeg_images = np.concatenate(jpeg_images)
+    featurizer_images = np.concatenate(featurizer_images)
+    report = agreement_report(jpeg_images, featurizer_images,
+                              model.predict(jpeg_images), model.predict(featurizer_images),
+                              np.concatenate(recording_ids))
+    report.update(model=str(model_path), model_sha256=model_digest(model_path),
+                  featurizer=featurizer.params(), failed=failed)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the in-memory featurizer with the MATLAB JPEG path')
+    parser.add_argument('inputs', nargs='+',
+                      help='Directories, audio files or glob patterns')
+    parser.add_argument('--model', type=str, default=None,
+                      help='Path to trained model (.h5, or .tflite for the TFLite runtime)')
+    parser.add_argument('--stats', type=str, default=None,
+                      help='Path to training statistics (models without embedded preprocessing)')
+    parser.add_argument('--max-syllables', type=int, default=5,
+                      help='Maximum number of syllables per recording')
+    parser.add_argument('--seed', type=int, default=0,
+                      help='Seed for syllable sampling')
+    parser.add_argument('--output', type=str, default=None,
+                      help='Report file (defaults to <model>.agreement.json)')
+    args = parser.parse_args()
+
+    from birdsong_classification.predict_batch import find_audio_files
+
+    report = measure_agreement([str(path) for path in find_audio_files(args.inputs)],
+                               args.model, args.stats, args.max_syllables, args.seed)
+    print(f"\nCompared {report['syllables']} syllables of {report['recordings']} recordings")
+    print(f"Mean absolute pixel error: {report['mean_abs_pixel_error']:.2f} (0-255)")
+    print(f"Syllable agreement: {report['syllable_agreement']:.1%}")
+    print(f"Recording agreement: {report['recording_agreement']:.1%}")
+    print(f"Mean total variation: {report['mean_total_variation']:.4f}")
+    output = Path(args.output) if args.output else default_report_path(report['model'])
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# src/birdsong_classification/audio/benchmark.py
+"""
+Benchmark in-memory spectrogram generation against the figure/JPEG path
+
+The figure path is emulated with matplotlib: render the spectrogram at
+FIGURE_DPI, encode it as JPEG, then decode and resize it exactly like
+BirdSongDataset.load_data does.
+"""
+import argparse
+import io
+import time
+
+import numpy as np
+
+from birdsong_classification.audio import constants
+from birdsong_classification.audio.segmentation import ms_to_samples
+from birdsong_classification.audio.spectrogram import SpectrogramFeaturizer
+
+FIGURE_DPI = 300
+
+
+def render_jpeg_path(syllables: np.ndarray, img_size: int = 150) -> np.ndarray:
+    """Render, encode, decode and resize each syllable like the MATLAB path"""
+    import cv2
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    images = []
+    for syllable in syllables:
+        fig = plt.figure()
+        ax = fig.add_axes([0, 0, 1, 1])
+        ax.specgram(syllable, NFFT=constants.WINDOW_LENGTH, Fs=constants.DEFAULT_FS,
+                    noverlap=constants.OVERLAP, pad_to=constants.NFFT)
+        ax.set_axis_off()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='jpg', dpi=FIGURE_DPI)
+        plt.close(fig)
+
+        img = cv2.imdecode(np.frombuffer(buffer.getvalue(), np.uint8), cv2.IMREAD_COLOR)
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        images.append(cv2.resize(img, (img_size, img_size)))
+    return np.array(images)
+
+
+def _time_per_item(fn, syllables: np.ndarray, repeats: int) -> float:
+    fn(syllables[:1])  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(syllables)
+    return (time.perf_counter() - start) / (repeats * len(syllables))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark spectrogram generation per syllable')
+    parser.add_argument('--num-syllables', type=int, default=20,
+                        help='Number of syllables per run')
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='Number of timed runs')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    syllables = rng.standard_normal(
+        (args.num_syllables, ms_to_samples(constants.MIN_LENGTH_MS, constants.DEFAULT_FS)))
+
+    results = {
+        'featurizer (batch)': _time_per_item(SpectrogramFeaturizer(), syllables, args.repeats),
+        'featurizer (gray)': _time_per_item(SpectrogramFeaturizer(colormap=None), syllables, args.repeats),
+        'figure + JPEG': _time_per_item(render_jpeg_path, syllables, 1),
+    }
+
+    print(f"\nPer-syllable latency ({args.num_syllables} syllables):")
+    baseline = results['figure + JPEG']
+    for name, seconds in results.items():
+        print(f"  {name:20s} {seconds * 1000:8.3f} ms  ({baseline / seconds:6.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
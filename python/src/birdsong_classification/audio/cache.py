@@ -0,0 +1,198 @@
+# src/birdsong_classification/audio/cache.py
+"""
+Content-addressed on-disk cache for syllables and spectrogram features
+
+Entries are keyed by the SHA-256 of the input bytes together with every
+parameter that influences the result (sampling rate, filter band and order,
+segmentation settings, spectrogram settings, image size), so a changed
+recording or a changed setting never returns stale data. The prediction
+tools cache the syllables of each recording and the rendered image of each
+syllable (audio/pipeline.py); the incremental dataset build caches decoded
+spectrogram JPEGs. The cache is capped in size and evicts least recently
+used entries.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Union
+
+import numpy as np
+
+from birdsong_classification.utils.path_utils import get_cache_dir
+
+_CHUNK_SIZE = 1 << 20
+
+
+def hash_audio(source: Union[str, Path, BinaryIO]) -> str:
+    """
+    Hash the raw bytes of an audio file
+
+    Args:
+        source: Path to audio file or a seekable binary file-like object
+            (hashed from the start; its position is restored afterwards)
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    if hasattr(source, 'read'):
+        position = source.tell()
+        source.seek(0)
+        for chunk in iter(lambda: source.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+        source.seek(position)
+    else:
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_key(audio_hash: str, params: Dict) -> str:
+    """
+    Combine an audio hash and processing parameters into a cache key
+
+    Args:
+        audio_hash: Output of hash_audio
+        params: JSON-serializable processing parameters
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    payload = json.dumps({'audio': audio_hash, 'params': params}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class FeatureCache:
+    """
+    Size-capped LRU cache of NumPy arrays on local disk
+
+    The directory is scanned once; after that an in-memory index of entry
+    sizes in least-recently-used order makes lookups, inserts and evictions
+    independent of the number of entries. Entries written by other processes
+    sharing the directory join the index when they are first read.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = 1 << 30):
+        """
+        Initialize cache
+
+        Args:
+            cache_dir: Cache directory (defaults to <project root>/cache)
+            max_bytes: Maximum total size of cached arrays
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else get_cache_dir()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index = OrderedDict()
+        self._size = 0
+        self._scan()
+
+    def _path(self, key: str, name: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}-{name}.npy"
+
+    def _scan(self):
+        """Rebuild the index from the directory, oldest entries first"""
+        entries = []
+        for path in self.cache_dir.glob('*/*.npy'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        self._index = OrderedDict((path, size) for _, size, path in sorted(entries))
+        self._size = sum(self._index.values())
+
+    def _touch(self, path: Path, size: int):
+        """Record an entry as most recently used (caller holds the lock)"""
+        self._size += size - self._index.pop(path, 0)
+        self._index[path] = size
+
+    def get(self, key: str, name: str) -> Optional[np.ndarray]:
+        """
+        Look up an array
+
+        Args:
+            key: Cache key from make_key
+            name: Kind of array, e.g. 'syllables'
+
+        Returns:
+            Cached array, or None on a miss
+        """
+        path = self._path(key, name)
+        try:
+            array = np.load(path)
+            # Mark as recently used, also for other processes sharing the directory
+            os.utime(path)
+            size = path.stat().st_size
+        except (ValueError, OSError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self._touch(path, size)
+        return array
+
+    def put(self, key: str, name: str, array: np.ndarray):
+        """
+        Store an array, evicting least recently used entries if needed
+
+        Args:
+            key: Cache key from make_key
+            name: Kind of array, e.g. 'syllables'
+            array: Array to store
+        """
+        path = self._path(key, name)
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        size = tmp_path.stat().st_size
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            # Replaces the size of an overwritten entry
+            self._touch(path, size)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits max_bytes"""
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._index:
+            path, size = self._index.popitem(last=False)
+            path.unlink(missing_ok=True)
+            self._size -= size
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._scan()
+            for path in self._index:
+                path.unlink(missing_ok=True)
+            self._index.clear()
+            self._size = 0
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and size in bytes"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._index),
+                'size_bytes': self._size,
+                'max_bytes': self.max_bytes,
+            }
@@ -0,0 +1,30 @@
+# src/birdsong_classification/audio/constants.py
+"""Python mirror of matlab/src/utils/constants.m
+
+Keep these values in sync with the MATLAB pipeline so that syllables and
+spectrograms produced in Python match the ones used to train the model.
+"""
+
+# Audio processing
+DEFAULT_FS = 22050        # Default sampling frequency
+MIN_FREQ = 1000           # Minimum frequency for bandpass
+MAX_FREQ = 10000          # Maximum frequency for bandpass
+
+# Syllable detection
+MIN_LENGTH_MS = 100       # Minimum syllable length (ms)
+MAX_LENGTH_MS = 300       # Maximum syllable length (ms)
+MIN_SPACE_MS = 50         # Minimum space between syllables (ms)
+MAX_SYLLABLES = 5         # Syllables sampled per recording (config.m)
+
+# Power envelope calculation
+SHORT_WINDOW_MS = 48      # Short window for power calculation
+LONG_WINDOW_MS = 50       # Long window for power calculation
+
+# Spectrogram parameters
+WINDOW_LENGTH = 128       # Window length
+NFFT = 512                # Number of FFT points
+OVERLAP = 120             # Overlap between windows
+
+# File formats
+AUDIO_FORMAT = '.mp3'
+IMAGE_FORMAT = '.jpg'
@@ -0,0 +1,260 @@
+# src/birdsong_classification/audio/frontend.py
+"""
+Parallel audio front end: decode, resample and bandpass-filter raw recordings
+
+Python counterpart of the per-file loop in preprocessing.m
+(load_and_preprocess_audio), run over a process pool across all species
+directories under data/raw. Each filtered signal is written to
+``<output_dir>/<species>/<name>.npy``; segmentation reads it back through
+load_filtered (``--filtered-dir`` of predict_batch) instead of decoding the
+recording again. As in MATLAB, a file that fails is reported and skipped.
+
+A manifest in the output directory records the source file (path, size,
+modification time) and the resampling and filter parameters of every
+output, so reruns skip only outputs that are still valid for the current
+settings, and readers never pick up a signal filtered differently.
+"""
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from birdsong_classification.audio import constants
+from birdsong_classification.audio.io import load_audio, resample_audio, design_bandpass, apply_bandpass
+from birdsong_classification.utils.path_utils import get_data_dir
+
+MANIFEST_NAME = 'frontend.json'
+MANIFEST_VERSION = 1
+
+# Manifests read by load_filtered, by path: (mtime_ns, files)
+_manifest_cache: Dict[Path, Tuple[int, Dict]] = {}
+
+
+def preprocess_file(audio_path: Path,
+                    target_fs: int = constants.DEFAULT_FS,
+                    filter_band: Tuple[float, float] = (constants.MIN_FREQ, constants.MAX_FREQ)) -> np.ndarray:
+    """
+    Decode, resample and bandpass-filter one audio file
+
+    Args:
+        audio_path: Path to audio file
+        target_fs: Sampling frequency to resample to
+        filter_band: (low_freq, high_freq) bandpass range
+
+    Returns:
+        Filtered signal at target_fs
+    """
+    signal, fs = load_audio(audio_path)
+    signal = resample_audio(signal, fs, target_fs)
+    return apply_bandpass(signal, target_fs, filter_band)
+
+
+def list_audio_files(raw_dir: Path) -> List[Tuple[str, Path]]:
+    """
+    List audio files of all species directories
+
+    Files are ordered by their numeric name (1.mp3, 2.mp3, ...) like the
+    file_idx loop in preprocessing.m.
+
+    Args:
+        raw_dir: Directory with one sub-directory per species
+
+    Returns:
+        (species, path) pairs
+    """
+    def order(path: Path):
+        return (0, int(path.stem), '') if re.fullmatch(r'\d+', path.stem) else (1, 0, path.stem)
+
+    files = []
+    for species_dir in sorted(p for p in Path(raw_dir).iterdir() if p.is_dir()):
+        paths = sorted(species_dir.glob(f'*{constants.AUDIO_FORMAT}'), key=order)
+        files.extend((species_dir.name, path) for path in paths)
+    return files
+
+
+def output_key(audio_path: Path) -> str:
+    """Output of an audio file relative to the output directory"""
+    return f"{audio_path.parent.name}/{audio_path.stem}.npy"
+
+
+def source_entry(audio_path: Path, target_fs: int, filter_band: Tuple[float, float]) -> Dict:
+    """Manifest entry describing the output of audio_path for the given settings"""
+    stat = Path(audio_path).stat()
+    return {
+        'source': str(Path(audio_path).resolve()),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'target_fs': int(target_fs),
+        'filter_band': [float(f) for f in filter_band],
+    }
+
+
+def load_manifest(output_dir: Path) -> Dict[str, Dict]:
+    """Map of output file (see output_key) to its source entry"""
+    manifest_path = Path(output_dir) / MANIFEST_NAME
+    if not manifest_path.exists():
+        return {}
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    return manifest['files'] if manifest.get('version') == MANIFEST_VERSION else {}
+
+
+def save_manifest(output_dir: Path, files: Dict[str, Dict]):
+    """Atomically write the manifest"""
+    tmp_path = Path(output_dir) / (MANIFEST_NAME + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': MANIFEST_VERSION, 'files': files}, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, Path(output_dir) / MANIFEST_NAME)
+
+
+def load_filtered(audio_path: Path,
+                  output_dir: Path,
+                  target_fs: int = constants.DEFAULT_FS,
+                  filter_band: Tuple[float, float] = (constants.MIN_FREQ, constants.MAX_FREQ)) -> Optional[np.ndarray]:
+    """
+    Filtered signal of an audio file written by run_frontend
+
+    Args:
+        audio_path: Path to the original audio file
+        output_dir: Front-end output directory
+        target_fs: Sampling frequency the signal must have
+        filter_band: Bandpass range the signal must have been filtered with
+
+    Returns:
+        The stored signal, or None if there is none that is up to date for
+        this file and these settings
+    """
+    manifest_path = Path(output_dir) / MANIFEST_NAME
+    try:
+        mtime_ns = manifest_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _manifest_cache.get(manifest_path)
+    if cached is None or cached[0] != mtime_ns:
+        cached = (mtime_ns, load_manifest(output_dir))
+        _manifest_cache[manifest_path] = cached
+
+    key = output_key(Path(audio_path))
+    if cached[1].get(key) != source_entry(audio_path, target_fs, filter_band):
+        return None
+    try:
+        return np.load(Path(output_dir) / key)
+    except FileNotFoundError:
+        return None
+
+
+def _init_worker(target_fs: int, filter_band: Tuple[float, float]):
+    # Design the bandpass once per worker instead of once per file
+    design_bandpass(int(target_fs), float(filter_band[0]), float(filter_band[1]))
+
+
+def _process(audio_path: Path, output_path: Path, target_fs: int,
+             filter_band: Tuple[float, float]) -> Optional[str]:
+    """Worker task; returns an error message instead of raising"""
+    try:
+        signal = preprocess_file(audio_path, target_fs, filter_band)
+        tmp_path = output_path.with_name(output_path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            # Full precision, so segmentation matches decoding the file directly
+            np.save(f, signal)
+        os.replace(tmp_path, output_path)
+        return None
+    except Exception as e:
+        return str(e) or type(e).__name__
+
+
+def run_frontend(raw_dir: Optional[Path] = None,
+                 output_dir: Optional[Path] = None,
+                 num_workers: Optional[int] = None,
+                 target_fs: int = constants.DEFAULT_FS,
+                 filter_band: Tuple[float, float] = (constants.MIN_FREQ, constants.MAX_FREQ),
+                 overwrite: bool = False) -> Dict[str, int]:
+    """
+    Preprocess all recordings under raw_dir on a process pool
+
+    Args:
+        raw_dir: Directory with one sub-directory per species (defaults to data/raw)
+        output_dir: Output directory (defaults to data/filtered)
+        num_workers: Number of worker processes (defaults to the CPU count)
+        target_fs: Sampling frequency to resample to
+        filter_band: (low_freq, high_freq) bandpass range
+        overwrite: Reprocess files whose output is up to date
+
+    Returns:
+        Counts of processed, skipped and failed files
+    """
+    raw_dir = Path(raw_dir) if raw_dir else get_data_dir() / "raw"
+    output_dir = Path(output_dir) if output_dir else get_data_dir() / "filtered"
+    num_workers = num_workers or os.cpu_count() or 1
+
+    summary = {'processed': 0, 'skipped': 0, 'failed': 0}
+    manifest = load_manifest(output_dir)
+    jobs = []
+    for species, audio_path in list_audio_files(raw_dir):
+        key = output_key(audio_path)
+        entry = source_entry(audio_path, target_fs, filter_band)
+        if not overwrite and manifest.get(key) == entry and (output_dir / key).exists():
+            summary['skipped'] += 1
+            continue
+        # Invalid until it has been rewritten
+        manifest.pop(key, None)
+        (output_dir / species).mkdir(parents=True, exist_ok=True)
+        jobs.append((species, audio_path, key, entry))
+
+    print(f"Processing {len(jobs)} audio files with {num_workers} workers "
+          f"({summary['skipped']} up to date)")
+    output_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker,
+                                 initargs=(target_fs, filter_band)) as executor:
+            futures = {
+                executor.submit(_process, audio_path, output_dir / key, target_fs, filter_band):
+                    (species, audio_path, key, entry)
+                for species, audio_path, key, entry in jobs
+            }
+            for future in as_completed(futures):
+                species, audio_path, key, entry = futures[future]
+                try:
+                    error = future.result()
+                except Exception as e:
+                    # Worker process died (e.g. out of memory)
+                    error = str(e) or type(e).__name__
+                if error is not None:
+                    print(f"Warning: Failed to process file {species}/{audio_path.name}: {error}")
+                    summary['failed'] += 1
+                    continue
+                manifest[key] = entry
+                summary['processed'] += 1
+                print(f"Processed {summary['processed']} audio files")
+    finally:
+        save_manifest(output_dir, manifest)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Decode, resample and bandpass-filter raw recordings')
+    parser.add_argument('--raw-dir', type=str, default=None,
+                      help='Directory with one sub-directory per species (defaults to data/raw)')
+    parser.add_argument('--output-dir', type=str, default=None,
+                      help='Output directory (defaults to data/filtered)')
+    parser.add_argument('--workers', type=int, default=None,
+                      help='Number of worker processes (defaults to the CPU count)')
+    parser.add_argument('--overwrite', action='store_true',
+                      help='Reprocess files that are already up to date')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary = run_frontend(args.raw_dir, args.output_dir, args.workers, overwrite=args.overwrite)
+    elapsed = time.perf_counter() - start
+    print(f"Processed {summary['processed']}, skipped {summary['skipped']}, "
+          f"failed {summary['failed']} files in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# src/birdsong_classification/audio/io.py
+"""Audio loading and filtering (Python port of audio_utils.m / filter_utils.m)"""
+from functools import lru_cache
+from math import gcd
+from typing import BinaryIO, Tuple, Union
+
+import numpy as np
+import soundfile as sf
+
+from birdsong_classification.audio import constants
+
+# Order of the Butterworth bandpass used in place of MATLAB's `bandpass`
+BANDPASS_ORDER = 8
+
+
+def load_audio(filepath: Union[str, BinaryIO]) -> Tuple[np.ndarray, int]:
+    """
+    Load audio file and convert to mono if stereo
+
+    Args:
+        filepath: Path to audio file or a binary file-like object
+
+    Returns:
+        signal: Audio signal (mono, float64)
+        fs: Sampling frequency
+    """
+    source = filepath if hasattr(filepath, 'read') else str(filepath)
+    signal, fs = sf.read(source, dtype='float64', always_2d=True)
+    # Like audio_utils.load_audio, keep only the first channel
+    return signal[:, 0], fs
+
+
+def resample_audio(signal: np.ndarray, original_fs: int,
+                   target_fs: int = constants.DEFAULT_FS) -> np.ndarray:
+    """
+    Resample audio signal to target frequency using polyphase filtering
+
+    Args:
+        signal: Input audio signal
+        original_fs: Original sampling frequency
+        target_fs: Target sampling frequency
+
+    Returns:
+        Resampled signal
+    """
+    if original_fs == target_fs:
+        return signal
+    from scipy import signal as sps
+    g = gcd(int(original_fs), int(target_fs))
+    return sps.resample_poly(signal, int(target_fs) // g, int(original_fs) // g)
+
+
+@lru_cache(maxsize=None)
+def design_bandpass(fs: int, low: float, high: float,
+                    order: int = BANDPASS_ORDER) -> np.ndarray:
+    """
+    Design (once per parameter set) a Butterworth bandpass filter
+
+    Args:
+        fs: Sampling frequency
+        low: Lower cutoff frequency in Hz
+        high: Upper cutoff frequency in Hz
+        order: Filter order
+
+    Returns:
+        Second-order sections of the filter
+    """
+    from scipy import signal as sps
+    return sps.butter(order, [low, high], btype='bandpass', fs=fs, output='sos')
+
+
+def apply_bandpass(signal: np.ndarray, fs: int = constants.DEFAULT_FS,
+                   freq_range: Tuple[float, float] = (constants.MIN_FREQ, constants.MAX_FREQ)
+                   ) -> np.ndarray:
+    """
+    Apply zero-phase bandpass filter to signal
+
+    Args:
+        signal: Input signal
+        fs: Sampling frequency
+        freq_range: (low_freq, high_freq) filter range
+
+    Returns:
+        Filtered signal
+    """
+    if signal.size == 0:
+        return signal
+    sos = design_bandpass(int(fs), float(freq_range[0]), float(freq_range[1]))
+    # sosfiltfilt needs a minimum number of samples for its edge padding
+    padlen = min(3 * (2 * len(sos) + 1), signal.size - 1)
+    from scipy import signal as sps
+    return sps.sosfiltfilt(sos, signal, padlen=padlen)
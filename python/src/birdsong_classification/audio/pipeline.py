@@ -0,0 +1,146 @@
+# src/birdsong_classification/audio/pipeline.py
+"""In-process equivalent of matlab/src/process_single_audio.m"""
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Tuple, Union
+
+import numpy as np
+
+from birdsong_classification.audio import constants
+from birdsong_classification.audio.cache import FeatureCache, hash_audio, make_key
+from birdsong_classification.audio.frontend import load_filtered
+from birdsong_classification.audio import segmentation
+from birdsong_classification.audio.io import BANDPASS_ORDER, load_audio, resample_audio, apply_bandpass
+from birdsong_classification.audio.segmentation import syllable_cut, sample_indices
+from birdsong_classification.audio.spectrogram import SpectrogramFeaturizer
+
+
+def extract_syllables_from_file(audio_path: Union[str, BinaryIO],
+                                target_fs: int = constants.DEFAULT_FS,
+                                filter_band: Tuple[float, float] = (constants.MIN_FREQ, constants.MAX_FREQ),
+                                min_length: float = constants.MIN_LENGTH_MS,
+                                max_length: float = constants.MAX_LENGTH_MS,
+                                cache: Optional[FeatureCache] = None,
+                                audio_hash: Optional[str] = None,
+                                filtered_dir: Optional[Union[str, Path]] = None) -> np.ndarray:
+    """
+    Load, resample, filter and segment an audio file
+
+    Args:
+        audio_path: Path to audio file or a binary file-like object
+        target_fs: Sampling frequency to resample to
+        filter_band: (low_freq, high_freq) bandpass range
+        min_length: Minimum syllable length (ms)
+        max_length: Maximum syllable length (ms)
+        cache: Optional cache to reuse syllables of previously seen audio
+        audio_hash: Precomputed hash_audio(audio_path), if available
+        filtered_dir: Output directory of audio/frontend.py; an up-to-date
+            filtered signal found there replaces decoding, resampling and
+            filtering
+
+    Returns:
+        Array of shape (n_syllables, n_samples)
+    """
+    if cache is not None:
+        audio_hash = audio_hash or hash_audio(audio_path)
+        key = make_key(audio_hash, syllable_params(target_fs, filter_band, min_length, max_length))
+        syllables = cache.get(key, 'syllables')
+        if syllables is not None:
+            return syllables
+
+    signal = None
+    if filtered_dir is not None and not hasattr(audio_path, 'read'):
+        signal = load_filtered(Path(audio_path), Path(filtered_dir), target_fs, filter_band)
+    if signal is None:
+        signal, fs = load_audio(audio_path)
+        signal = resample_audio(signal, fs, target_fs)
+        signal = apply_bandpass(signal, target_fs, filter_band)
+    syllables, _ = syllable_cut(signal, target_fs, min_length, max_length)
+
+    if cache is not None:
+        cache.put(key, 'syllables', syllables)
+    return syllables
+
+
+def syllable_params(target_fs: int = constants.DEFAULT_FS,
+                    filter_band: Tuple[float, float] = (constants.MIN_FREQ, constants.MAX_FREQ),
+                    min_length: float = constants.MIN_LENGTH_MS,
+                    max_length: float = constants.MAX_LENGTH_MS) -> Dict:
+    """Every setting that determines the syllables of a recording, for cache keys"""
+    return {
+        'target_fs': int(target_fs),
+        'filter_band': [float(f) for f in filter_band],
+        'bandpass_order': BANDPASS_ORDER,
+        'min_length': float(min_length),
+        'max_length': float(max_length),
+        'min_space_ms': float(constants.MIN_SPACE_MS),
+        'short_window_ms': float(constants.SHORT_WINDOW_MS),
+        'long_window_ms': float(constants.LONG_WINDOW_MS),
+        'threshold_ratio': float(segmentation.THRESHOLD_RATIO),
+    }
+
+
+def render_cached(syllables: np.ndarray,
+                  positions: np.ndarray,
+                  featurizer: SpectrogramFeaturizer,
+                  cache: FeatureCache,
+                  audio_hash: str) -> np.ndarray:
+    """
+    Spectrogram images of the selected syllables, rendering only cache misses
+
+    Images are cached per syllable under a key that includes the featurizer
+    parameters, so a repeat request (or a different sample of the same
+    recording) only renders syllables that were never rendered before.
+
+    Args:
+        syllables: All syllables of the recording, from extract_syllables_from_file
+        positions: Indices of the syllables to render
+        featurizer: Spectrogram featurizer
+        cache: Feature cache
+        audio_hash: hash_audio() of the recording
+
+    Returns:
+        float32 array of shape (len(positions), img_size, img_size, channels)
+    """
+    if len(positions) == 0:
+        return featurizer(syllables[positions])
+    key = make_key(audio_hash, {**syllable_params(), 'featurizer': featurizer.params()})
+    images = [cache.get(key, f"features-{i}") for i in positions]
+    missing = [j for j, image in enumerate(images) if image is None]
+    if missing:
+        for j, image in zip(missing, featurizer(syllables[positions[missing]])):
+            cache.put(key, f"features-{positions[j]}", image)
+            images[j] = image
+    return np.stack(images)
+
+
+def process_single_audio(audio_path: Union[str, BinaryIO],
+                         max_syllables: int = constants.MAX_SYLLABLES,
+                         featurizer: Optional[SpectrogramFeaturizer] = None,
+                         rng: Optional[np.random.Generator] = None,
+                         cache: Optional[FeatureCache] = None,
+                         filtered_dir: Optional[Union[str, Path]] = None) -> np.ndarray:
+    """
+    Extract syllables from an audio file and turn them into spectrogram images
+
+    Args:
+        audio_path: Path to audio file or a binary file-like object
+        max_syllables: Maximum number of syllables to keep
+        featurizer: Spectrogram featurizer (defaults to the MATLAB parameters)
+        rng: Random generator used to sample syllables
+        cache: Optional cache to skip decoding, segmentation and rendering
+            for previously seen audio
+        filtered_dir: Output directory of audio/frontend.py to take filtered
+            signals from
+
+    Returns:
+        float32 array of shape (n_syllables, img_size, img_size, channels)
+    """
+    featurizer = SpectrogramFeaturizer() if featurizer is None else featurizer
+    audio_hash = hash_audio(audio_path) if cache is not None else None
+    syllables = extract_syllables_from_file(audio_path, cache=cache, audio_hash=audio_hash,
+                                            filtered_dir=filtered_dir)
+    # Only the sampled syllables are rendered, with or without a cache
+    positions = sample_indices(len(syllables), max_syllables, rng)
+    if cache is None:
+        return featurizer(syllables[positions])
+    return render_cached(syllables, positions, featurizer, cache, audio_hash)
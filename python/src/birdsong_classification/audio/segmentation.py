@@ -0,0 +1,207 @@
+# src/birdsong_classification/audio/segmentation.py
+"""
+Syllable segmentation (Python port of matlab/src/syllable_cut.m)
+
+The functions here reproduce the MATLAB implementation sample for sample so
+that syllables detected in Python match the ones used to build the training
+set. Boundaries are returned as 0-based sample indices; add 1 to compare
+them against MATLAB output.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+
+from birdsong_classification.audio import constants
+
+# A segment starts where the short envelope exceeds the long one by this
+# fraction of the long envelope's maximum (0.01 * max(power_long) in MATLAB)
+THRESHOLD_RATIO = 0.01
+
+
+def ms_to_samples(length_ms: float, fs: float) -> int:
+    """Convert milliseconds to samples, rounding half away from zero like MATLAB"""
+    return int(np.floor((length_ms / 1000) * fs + 0.5))
+
+
+def get_power_envelope(signal: np.ndarray, window_length: float, fs: float) -> np.ndarray:
+    """
+    Calculate power envelope using moving average
+
+    Equivalent to MATLAB ``conv(signal.^2, ones(w, 1) / w, 'same')`` but
+    computed from a cumulative sum, so the cost does not depend on the
+    window length.
+
+    Args:
+        signal: Input signal
+        window_length: Window length in milliseconds
+        fs: Sampling frequency
+
+    Returns:
+        Power envelope (same length as signal)
+    """
+    n = signal.size
+    window_samples = ms_to_samples(window_length, fs)
+
+    csum = np.zeros(n + 1)
+    np.cumsum(np.square(signal, dtype=np.float64), out=csum[1:])
+
+    # MATLAB's 'same' keeps the full convolution starting at floor(w/2),
+    # so output m averages samples [m + w//2 - w + 1, m + w//2]
+    positions = np.arange(n)
+    hi = np.minimum(positions + window_samples // 2, n - 1) + 1
+    lo = np.maximum(positions + window_samples // 2 - window_samples + 1, 0)
+    return (csum[hi] - csum[lo]) / window_samples
+
+
+def detect_boundaries(power_short: np.ndarray, power_long: np.ndarray,
+                      fs: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Detect syllable boundaries from short and long power envelopes
+
+    A segment starts where the short envelope rises above the long envelope
+    plus 1/100 of the long envelope's maximum. Segments followed by another
+    segment less than MIN_SPACE_MS later are discarded.
+
+    The boundaries are then paired like in syllable_cut.m, which stacks the
+    column vectors of starts and ends (``reshape([starts; ends], [], 1)``)
+    and reads consecutive entries as (start, end). The candidates are
+    therefore (s1, s2), (s3, s4), ... followed by the pairs of ends, not
+    (s1, e1), (s2, e2), ...; the training set was cut this way.
+
+    Args:
+        power_short: Short-window power envelope
+        power_long: Long-window power envelope
+        fs: Sampling frequency
+
+    Returns:
+        starts: 0-based index of the first sample of each candidate
+        ends: 0-based index of the sample after each candidate (may precede
+            the start; extract_syllables drops those)
+    """
+    threshold = THRESHOLD_RATIO * np.max(power_long)
+    detected = power_short > (power_long + threshold)
+
+    initial_bounds = np.flatnonzero(np.diff(np.concatenate(([0], detected.astype(np.int8), [0]))))
+    starts = initial_bounds[0::2]
+    ends = initial_bounds[1::2]
+
+    # Drop every segment whose successor starts within the minimum space
+    min_space = ms_to_samples(constants.MIN_SPACE_MS, fs)
+    valid_segments = np.ones(starts.size, dtype=bool)
+    valid_segments[:-1] = (starts[1:] - ends[:-1]) >= min_space
+
+    # Reconstruct boundaries the MATLAB way and pair consecutive entries
+    boundaries = np.concatenate((starts[valid_segments], ends[valid_segments]))
+    return boundaries[0::2], boundaries[1::2]
+
+
+def extract_syllables(signal: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+                      min_length: float, max_length: float,
+                      fs: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cut syllables out of the signal
+
+    Segments longer than ``min_length`` are kept and truncated to exactly
+    ``min_length`` milliseconds, as in the MATLAB implementation.
+    ``max_length`` is accepted for parity with syllable_cut.m, which does not
+    use it either.
+
+    Args:
+        signal: Input signal
+        starts: Segment starts from detect_boundaries
+        ends: Segment ends from detect_boundaries
+        min_length: Minimum syllable length (ms)
+        max_length: Maximum syllable length (ms)
+        fs: Sampling frequency
+
+    Returns:
+        syllables: Array of shape (n_syllables, min_samples)
+        time_points: Array of shape (2, n_syllables) with start/end times in
+            seconds, identical to the MATLAB output
+    """
+    min_samples = ms_to_samples(min_length, fs)
+
+    keep = (ends - starts) / fs > min_length / 1000
+    starts = starts[keep]
+    ends = ends[keep]
+
+    # MATLAB's inclusive signal(start:end) is always longer than min_samples
+    # here, so every syllable is exactly min_samples long
+    syllables = signal[starts[:, None] + np.arange(min_samples)]
+
+    # MATLAB indices are 1-based; keep time_points identical
+    time_points = np.vstack([starts + 1, ends + 1]) / fs
+    return syllables, time_points
+
+
+def syllable_cut(signal: np.ndarray, fs: float = constants.DEFAULT_FS,
+                 min_length: float = constants.MIN_LENGTH_MS,
+                 max_length: float = constants.MAX_LENGTH_MS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Detect and extract syllables from a filtered audio signal
+
+    Args:
+        signal: Bandpass filtered mono signal at ``fs``
+        fs: Sampling frequency
+        min_length: Minimum syllable length (ms)
+        max_length: Maximum syllable length (ms)
+
+    Returns:
+        syllables: Array of shape (n_syllables, min_samples). Note that this is
+            the transpose of the MATLAB (samples x syllables) layout.
+        time_points: Array of shape (2, n_syllables) with start/end times
+    """
+    signal = np.asarray(signal, dtype=np.float64).ravel()
+
+    # Find last non-zero sample - this is useful from old implementation
+    nonzero = np.flatnonzero(signal)
+    if nonzero.size == 0:
+        return np.empty((0, ms_to_samples(min_length, fs))), np.empty((2, 0))
+    signal = signal[:nonzero[-1] + 1]
+
+    # Calculate power envelopes
+    power_short = get_power_envelope(signal, constants.SHORT_WINDOW_MS, fs)
+    power_long = get_power_envelope(signal, constants.LONG_WINDOW_MS, fs)
+
+    # Get boundaries with minimum space requirement
+    starts, ends = detect_boundaries(power_short, power_long, fs)
+
+    return extract_syllables(signal, starts, ends, min_length, max_length, fs)
+
+
+def sample_indices(num_syllables: int, max_syllables: int = constants.MAX_SYLLABLES,
+                   rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """
+    Positions of the syllables kept by sample_syllables
+
+    Args:
+        num_syllables: Number of detected syllables
+        max_syllables: Maximum number of syllables to keep
+        rng: Random generator (defaults to a fresh unseeded generator)
+
+    Returns:
+        Indices into the detected syllables, all of them in order if there
+        are at most max_syllables
+    """
+    if num_syllables <= max_syllables:
+        return np.arange(num_syllables)
+    rng = np.random.default_rng() if rng is None else rng
+    return rng.permutation(num_syllables)[:max_syllables]
+
+
+def sample_syllables(syllables: np.ndarray, max_syllables: int = constants.MAX_SYLLABLES,
+                     rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """
+    Randomly keep at most ``max_syllables`` syllables (sample_syllables.m)
+
+    Args:
+        syllables: Array of shape (n_syllables, n_samples)
+        max_syllables: Maximum number of syllables to keep
+        rng: Random generator (defaults to a fresh unseeded generator)
+
+    Returns:
+        Array of shape (min(n_syllables, max_syllables), n_samples)
+    """
+    if len(syllables) <= max_syllables:
+        return syllables
+    return syllables[sample_indices(len(syllables), max_syllables, rng)]
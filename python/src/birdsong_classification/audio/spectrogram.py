@@ -0,0 +1,180 @@
+# src/birdsong_classification/audio/spectrogram.py
+"""
+In-memory spectrogram images (replacement for spectro_utils.m + exportgraphics)
+
+The MATLAB pipeline renders every syllable as a figure, exports it as a JPEG
+and ``BirdSongDataset.load_data`` decodes and resizes it again. The featurizer
+below computes the same STFT directly and produces model-ready batches.
+
+The images only approximate the JPEGs the models were trained on: parula is
+interpolated from nine anchors, and the white margin exportgraphics leaves
+around the axes is not reproduced. Measure the agreement with a model with
+audio/agreement.py before using the in-memory path for it.
+"""
+from typing import Dict, Optional
+
+import numpy as np
+
+from birdsong_classification.audio import constants
+
+# Approximation of MATLAB's default 'parula' colormap (anchor points,
+# linearly interpolated)
+_PARULA_ANCHORS = np.array([
+    [0.2422, 0.1504, 0.6603],
+    [0.2780, 0.3556, 0.9777],
+    [0.1540, 0.5902, 0.9218],
+    [0.0704, 0.7457, 0.7258],
+    [0.1802, 0.7709, 0.5630],
+    [0.4420, 0.7795, 0.3880],
+    [0.7525, 0.7381, 0.2170],
+    [0.9910, 0.7785, 0.2019],
+    [0.9769, 0.9839, 0.0805],
+])
+
+
+def _build_lut(anchors: np.ndarray, size: int = 256) -> np.ndarray:
+    """Interpolate colormap anchors into a (size, 3) lookup table"""
+    x = np.linspace(0, 1, len(anchors))
+    xi = np.linspace(0, 1, size)
+    return np.stack([np.interp(xi, x, anchors[:, c]) for c in range(3)], axis=1)
+
+
+COLORMAPS = {
+    'parula': _build_lut(_PARULA_ANCHORS),
+}
+
+
+def _linear_resize_matrix(src: int, dst: int) -> np.ndarray:
+    """
+    Build a (dst, src) matrix performing 1-D bilinear resampling with the
+    same pixel-center convention as cv2.resize(INTER_LINEAR)
+    """
+    coords = (np.arange(dst) + 0.5) * (src / dst) - 0.5
+    coords = np.clip(coords, 0, src - 1)
+    lo = np.floor(coords).astype(int)
+    hi = np.minimum(lo + 1, src - 1)
+    frac = coords - lo
+
+    matrix = np.zeros((dst, src))
+    rows = np.arange(dst)
+    np.add.at(matrix, (rows, lo), 1 - frac)
+    np.add.at(matrix, (rows, hi), frac)
+    return matrix
+
+
+class SpectrogramFeaturizer:
+    """Turns equal-length syllables into (N, img_size, img_size, C) float32 batches"""
+
+    renderer = 'in-memory'
+
+    def __init__(self,
+                 fs: int = constants.DEFAULT_FS,
+                 window: int = constants.WINDOW_LENGTH,
+                 overlap: int = constants.OVERLAP,
+                 nfft: int = constants.NFFT,
+                 img_size: int = 150,
+                 colormap: Optional[str] = 'parula'):
+        """
+        Initialize featurizer
+
+        Args:
+            fs: Sampling frequency
+            window: Hamming window length
+            overlap: Overlap between windows
+            nfft: Number of FFT points
+            img_size: Size of output images (square)
+            colormap: Name of colormap in COLORMAPS to produce 3-channel
+                images like the rendered JPEGs, or None for a single
+                channel with the scaled power in dB
+        """
+        if colormap is not None and colormap not in COLORMAPS:
+            raise ValueError(f"Unknown colormap '{colormap}'. Available: {list(COLORMAPS)}")
+
+        self.fs = fs
+        self.window = np.hamming(window)
+        self.hop = window - overlap
+        self.nfft = nfft
+        self.img_size = img_size
+        self.colormap = colormap
+        self.channels = 3 if colormap is not None else 1
+
+        # PSD scaling as in MATLAB spectrogram: one-sided, density per Hz
+        self._scale = np.full(nfft // 2 + 1, 2.0 / (fs * np.sum(self.window ** 2)))
+        self._scale[0] /= 2
+        if nfft % 2 == 0:
+            self._scale[-1] /= 2
+
+        self._resize_cache = {}
+
+    def params(self) -> Dict:
+        """Parameters that determine the output, e.g. for cache keys"""
+        return {
+            'fs': self.fs,
+            'window': len(self.window),
+            'overlap': len(self.window) - self.hop,
+            'nfft': self.nfft,
+            'img_size': self.img_size,
+            'colormap': self.colormap,
+        }
+
+    def power_db(self, syllables: np.ndarray) -> np.ndarray:
+        """
+        Compute the power spectral density in dB
+
+        Args:
+            syllables: Array of shape (n_syllables, n_samples)
+
+        Returns:
+            Array of shape (n_syllables, n_freqs, n_frames), lowest
+            frequency in the last row (image orientation of 'yaxis')
+        """
+        syllables = np.atleast_2d(np.asarray(syllables, dtype=np.float64))
+        frames = np.lib.stride_tricks.sliding_window_view(
+            syllables, len(self.window), axis=-1)[:, ::self.hop]
+        spectrum = np.fft.rfft(frames * self.window, n=self.nfft, axis=-1)
+        power = np.square(np.abs(spectrum)) * self._scale
+        power_db = 10 * np.log10(power + np.finfo(np.float64).eps)
+        return power_db.transpose(0, 2, 1)[:, ::-1, :]
+
+    def _resize_matrices(self, height: int, width: int):
+        key = (height, width)
+        if key not in self._resize_cache:
+            self._resize_cache[key] = (
+                _linear_resize_matrix(height, self.img_size),
+                _linear_resize_matrix(width, self.img_size),
+            )
+        return self._resize_cache[key]
+
+    def __call__(self, syllables: np.ndarray) -> np.ndarray:
+        """
+        Convert syllables into model input images
+
+        Args:
+            syllables: Array of shape (n_syllables, n_samples)
+
+        Returns:
+            float32 array of shape (n_syllables, img_size, img_size, channels)
+            with values in [0, 255], like the decoded JPEG pixels
+        """
+        power_db = self.power_db(syllables)
+        n, height, width = power_db.shape
+        if n == 0:
+            return np.empty((0, self.img_size, self.img_size, self.channels), dtype=np.float32)
+
+        # Per-image color limits, as with MATLAB's automatic caxis
+        lo = power_db.min(axis=(1, 2), keepdims=True)
+        hi = power_db.max(axis=(1, 2), keepdims=True)
+        scaled = (power_db - lo) / np.maximum(hi - lo, np.finfo(np.float64).eps)
+
+        # Resize the scalar image first; the colormap is then only applied
+        # to img_size x img_size pixels
+        rows, cols = self._resize_matrices(height, width)
+        resized = np.matmul(rows, np.matmul(scaled, cols.T))
+
+        if self.colormap is not None:
+            lut = COLORMAPS[self.colormap]
+            resized = lut[np.rint(resized * (len(lut) - 1)).astype(np.intp)]
+        else:
+            resized = resized[..., np.newaxis]
+
+        return (resized * 255).astype(np.float32)
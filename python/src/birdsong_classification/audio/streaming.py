@@ -0,0 +1,400 @@
+# src/birdsong_classification/audio/streaming.py
+"""
+Block-wise audio front end and syllable segmentation for long recordings
+
+``stream_syllables`` reads a recording in blocks, resamples and filters each
+block with enough overlapping context to hide block edges, and runs an
+incremental version of syllable_cut that carries the power-envelope state
+across block boundaries. Memory use depends on the block size, not on the
+recording length.
+
+Segments are paired like syllable_cut (see detect_boundaries). Its detection
+threshold depends on the maximum of the long envelope over the whole signal,
+so stream_syllables reads a file twice by default: once to find that maximum
+and once to segment. Endless streams (live.py) use the running maximum up to
+the current block instead and only emit the pairs of starts. Blocks are
+filtered separately (StreamingFilter), so boundaries can differ from
+syllable_cut on the whole signal by a few samples, and trailing silence is
+not trimmed.
+"""
+from math import ceil, gcd
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+import soundfile as sf
+
+from birdsong_classification.audio import constants
+from birdsong_classification.audio.io import apply_bandpass, resample_audio
+from birdsong_classification.audio.segmentation import THRESHOLD_RATIO, ms_to_samples
+
+
+class SyllableEvent(NamedTuple):
+    """A detected syllable and its position in the recording"""
+    samples: np.ndarray
+    start: float
+    end: float
+
+
+def iter_audio_blocks(audio_path: Union[str, BinaryIO],
+                      block_seconds: float = 10.0) -> Iterator[Tuple[np.ndarray, int]]:
+    """
+    Read an audio file block by block
+
+    Args:
+        audio_path: Path to audio file or a binary file-like object
+        block_seconds: Block duration
+
+    Yields:
+        (block, fs): First channel of each block (float64) and the file's
+        sampling frequency
+    """
+    source = audio_path if hasattr(audio_path, 'read') else str(audio_path)
+    with sf.SoundFile(source) as f:
+        block_size = max(int(block_seconds * f.samplerate), 1)
+        while True:
+            block = f.read(block_size, dtype='float64', always_2d=True)
+            if len(block) == 0:
+                return
+            yield block[:, 0], f.samplerate
+
+
+class StreamingFilter:
+    """Resamples and bandpass-filters a signal that arrives in blocks"""
+
+    def __init__(self,
+                 original_fs: int,
+                 target_fs: int = constants.DEFAULT_FS,
+                 filter_band: Tuple[float, float] = (constants.MIN_FREQ, constants.MAX_FREQ),
+                 hop_seconds: float = 5.0,
+                 context_seconds: float = 0.25):
+        """
+        Initialize filter
+
+        Each output hop is computed from the hop plus ``context_seconds`` of
+        input on both sides, and only the middle part is kept, so the
+        zero-phase filter and the resampler see no block edges.
+
+        Args:
+            original_fs: Sampling frequency of the input
+            target_fs: Sampling frequency to resample to
+            filter_band: (low_freq, high_freq) bandpass range
+            hop_seconds: Amount of input processed per step
+            context_seconds: Overlap on each side of a step
+        """
+        g = gcd(int(original_fs), int(target_fs))
+        self.up, self.down = int(target_fs) // g, int(original_fs) // g
+        self.original_fs = original_fs
+        self.target_fs = target_fs
+        self.filter_band = filter_band
+
+        # Keep step boundaries on multiples of `down` so every input step maps
+        # to a whole number of output samples
+        self._context = ceil(context_seconds * original_fs / self.down) * self.down
+        self._hop = max(ceil(hop_seconds * original_fs / self.down) * self.down, self._context)
+        self._buffer = np.empty(0)
+        self._left = 0
+
+    def _process(self, segment: np.ndarray) -> np.ndarray:
+        return apply_bandpass(resample_audio(segment, self.original_fs, self.target_fs),
+                              self.target_fs, self.filter_band)
+
+    def push(self, block: np.ndarray) -> np.ndarray:
+        """
+        Add input samples
+
+        Args:
+            block: Next input samples
+
+        Returns:
+            Filtered output that is final (may be empty)
+        """
+        self._buffer = np.concatenate((self._buffer, block))
+        outputs = []
+        while len(self._buffer) >= self._left + self._hop + self._context:
+            out = self._process(self._buffer[:self._left + self._hop + self._context])
+            lo = self._left * self.up // self.down
+            hi = (self._left + self._hop) * self.up // self.down
+            outputs.append(out[lo:hi])
+            self._buffer = self._buffer[self._left + self._hop - self._context:]
+            self._left = self._context
+        return np.concatenate(outputs) if outputs else np.empty(0)
+
+    def flush(self) -> np.ndarray:
+        """Process the remaining input"""
+        if len(self._buffer) <= self._left:
+            return np.empty(0)
+        out = self._process(self._buffer)
+        self._buffer = np.empty(0)
+        return out[self._left * self.up // self.down:]
+
+
+class StreamingSegmenter:
+    """
+    Incremental syllable_cut
+
+    Power envelopes are computed from a running sum over a short tail of the
+    signal. The "same"-aligned moving averages need ``w // 2`` samples of
+    lookahead, so positions are evaluated as soon as that many later samples
+    have arrived. A closed segment is held back until it is clear whether the
+    next segment starts within MIN_SPACE_MS (in which case it is dropped,
+    as in syllable_cut).
+
+    Kept segments are paired like detect_boundaries: the pairs of
+    consecutive starts are emitted as soon as both are known, and the pairs
+    of consecutive ends, whose alignment depends on the total number of
+    segments, at flush(). Only the first MIN_LENGTH_MS of every boundary is
+    kept until it is known whether it starts a syllable.
+    """
+
+    def __init__(self,
+                 fs: int = constants.DEFAULT_FS,
+                 min_length: float = constants.MIN_LENGTH_MS,
+                 max_length: float = constants.MAX_LENGTH_MS,
+                 envelope_max: Optional[float] = None,
+                 end_pairs: bool = True):
+        """
+        Initialize segmenter
+
+        Args:
+            fs: Sampling frequency of the filtered signal
+            min_length: Minimum syllable length (ms)
+            max_length: Maximum syllable length (ms), unused like in syllable_cut
+            envelope_max: Maximum of the long power envelope over the whole
+                signal (see long_envelope_max), which sets the detection
+                threshold as in syllable_cut; None uses the running maximum
+            end_pairs: Emit the syllables that start at segment ends at
+                flush(), like syllable_cut. Their candidates are kept until
+                then, so disable this for endless streams.
+        """
+        self.fs = fs
+        self.min_length = min_length
+        self.max_length = max_length
+        self.min_samples = ms_to_samples(min_length, fs)
+        self.min_space = ms_to_samples(constants.MIN_SPACE_MS, fs)
+        self.w_short = ms_to_samples(constants.SHORT_WINDOW_MS, fs)
+        self.w_long = ms_to_samples(constants.LONG_WINDOW_MS, fs)
+        self.lookahead = max(self.w_short, self.w_long) // 2
+        self._margin = max(self.w_short, self.w_long)
+        self.end_pairs = end_pairs
+
+        # Zeros before the signal reproduce the clamped window at the start
+        self._buffer = np.zeros(self._margin)
+        self._buffer_start = -self._margin
+        self._received = 0
+        self._next = 0
+        self._fixed_max = envelope_max
+        self.envelope_max = 0.0 if envelope_max is None else float(envelope_max)
+        self._detected = False
+        self._seg_start = None
+        self._pending = None
+        # Boundary position -> its first min_samples samples (None until received)
+        self._heads = {}
+        self._kept = 0
+        self._held_start = None
+        self._last_end = None
+        # (index of the first end, start, end, head) of consecutive-end candidates
+        self._end_candidates = []
+
+    def _envelope(self, csum: np.ndarray, positions: np.ndarray, window: int) -> np.ndarray:
+        hi = positions + window // 2 + 1 - self._buffer_start
+        lo = positions + window // 2 - window + 1 - self._buffer_start
+        return (csum[hi] - csum[lo]) / window
+
+    def _head(self, position: int) -> np.ndarray:
+        offset = position - self._buffer_start
+        return self._buffer[offset:offset + self.min_samples].copy()
+
+    def _emit(self, start: int, end: int, out: List[SyllableEvent]):
+        if (end - start) / self.fs > self.min_length / 1000:
+            # The head may still be uncaptured, but end > start + min_samples
+            # means it has arrived and is still buffered
+            head = self._heads[start]
+            if head is None:
+                head = self._head(start)
+            # Same 1-based times as syllable_cut's time_points
+            out.append(SyllableEvent(head, (start + 1) / self.fs, (end + 1) / self.fs))
+
+    def _keep(self, start: int, end: int, out: List[SyllableEvent]):
+        """A segment survived the minimum-space check: pair its boundaries"""
+        if self._kept % 2 == 0:
+            self._held_start = start
+        else:
+            self._emit(self._held_start, start, out)
+            self._heads.pop(self._held_start, None)
+            self._heads.pop(start, None)
+            self._held_start = None
+        if self._held_start != start:
+            self._heads.pop(start, None)
+
+        if self.end_pairs:
+            if self._last_end is not None:
+                if (end - self._last_end) / self.fs > self.min_length / 1000:
+                    self._end_candidates.append((self._kept - 1, self._last_end, end))
+                else:
+                    self._heads.pop(self._last_end, None)
+            self._last_end = end
+        else:
+            self._heads.pop(end, None)
+        self._kept += 1
+
+    def _drop(self, start: int, end: int):
+        self._heads.pop(start, None)
+        self._heads.pop(end, None)
+
+    def _capture_heads(self):
+        for position, head in self._heads.items():
+            if head is None and self._received >= position + self.min_samples:
+                self._heads[position] = self._head(position)
+
+    def _advance(self, limit: int) -> List[SyllableEvent]:
+        out = []
+        if limit > self._next:
+            csum = np.zeros(len(self._buffer) + 1)
+            np.cumsum(np.square(self._buffer), out=csum[1:])
+            positions = np.arange(self._next, limit)
+            power_short = self._envelope(csum, positions, self.w_short)
+            power_long = self._envelope(csum, positions, self.w_long)
+            if self._fixed_max is None:
+                self.envelope_max = max(self.envelope_max, float(power_long.max()))
+            detected = power_short > (power_long + THRESHOLD_RATIO * self.envelope_max)
+
+            changes = np.flatnonzero(np.diff(np.concatenate(([self._detected], detected))))
+            for change in changes:
+                position = int(positions[change])
+                if detected[change]:
+                    # Segment starts; the pending one survives only if far enough away
+                    if self._pending is not None:
+                        if position - self._pending[1] >= self.min_space:
+                            self._keep(*self._pending, out)
+                        else:
+                            self._drop(*self._pending)
+                        self._pending = None
+                    self._seg_start = position
+                else:
+                    self._pending = (self._seg_start, position)
+                    self._seg_start = None
+                self._heads.setdefault(position, None)
+            self._detected = bool(detected[-1])
+            self._next = limit
+
+        if self._pending is not None and self._next - self._pending[1] >= self.min_space:
+            self._keep(*self._pending, out)
+            self._pending = None
+
+        # Copy the heads that are complete so the buffer can be trimmed
+        self._capture_heads()
+        keep_from = self._next - self._margin
+        waiting = [position for position, head in self._heads.items() if head is None]
+        if waiting:
+            keep_from = min(keep_from, min(waiting))
+        if keep_from > self._buffer_start:
+            self._buffer = self._buffer[keep_from - self._buffer_start:]
+            self._buffer_start = keep_from
+        return out
+
+    def push(self, samples: np.ndarray) -> List[SyllableEvent]:
+        """
+        Add filtered samples
+
+        Args:
+            samples: Next samples of the filtered signal
+
+        Returns:
+            Syllables that are complete
+        """
+        self._buffer = np.concatenate((self._buffer, np.asarray(samples, dtype=np.float64)))
+        self._received += len(samples)
+        return self._advance(self._received - self.lookahead)
+
+    def flush(self) -> List[SyllableEvent]:
+        """Finish the signal and return the remaining syllables"""
+        # Zeros after the signal reproduce the clamped window at the end
+        self._buffer = np.concatenate((self._buffer, np.zeros(self.lookahead)))
+        out = self._advance(self._received)
+        if self._seg_start is not None:
+            # A segment still open at the end closes with the signal
+            self._pending = (self._seg_start, self._received)
+            self._seg_start = None
+        if self._pending is not None:
+            self._keep(*self._pending, out)
+            self._pending = None
+
+        # With an odd number of segments the last start pairs with the first
+        # end, which precedes it, and the ends pair from the second one on
+        first = self._kept % 2
+        for index, start, end in self._end_candidates:
+            if index % 2 == first:
+                self._emit(start, end, out)
+        self._end_candidates = []
+        self._heads = {}
+        return out
+
+
+def long_envelope_max(audio_path: Union[str, BinaryIO],
+                      block_seconds: float = 10.0,
+                      target_fs: int = constants.DEFAULT_FS,
+                      filter_band: Tuple[float, float] = (constants.MIN_FREQ, constants.MAX_FREQ)) -> float:
+    """
+    Maximum of the long power envelope of a recording, read block by block
+
+    Args:
+        audio_path: Path to audio file or a seekable binary file-like object
+        block_seconds: Duration of the blocks read from the file
+        target_fs: Sampling frequency to resample to
+        filter_band: (low_freq, high_freq) bandpass range
+
+    Returns:
+        The maximum syllable_cut bases its detection threshold on
+    """
+    segmenter = StreamingSegmenter(target_fs, end_pairs=False)
+    stream_filter = None
+    for block, fs in iter_audio_blocks(audio_path, block_seconds):
+        if stream_filter is None:
+            stream_filter = StreamingFilter(fs, target_fs, filter_band, hop_seconds=block_seconds)
+        segmenter.push(stream_filter.push(block))
+    if stream_filter is not None:
+        segmenter.push(stream_filter.flush())
+    segmenter.flush()
+    return segmenter.envelope_max
+
+
+def stream_syllables(audio_path: Union[str, BinaryIO],
+                     block_seconds: float = 10.0,
+                     target_fs: int = constants.DEFAULT_FS,
+                     filter_band: Tuple[float, float] = (constants.MIN_FREQ, constants.MAX_FREQ),
+                     min_length: float = constants.MIN_LENGTH_MS,
+                     max_length: float = constants.MAX_LENGTH_MS,
+                     two_pass: bool = True) -> Iterator[SyllableEvent]:
+    """
+    Detect syllables in an audio file without loading it completely
+
+    Args:
+        audio_path: Path to audio file or a binary file-like object
+            (seekable with ``two_pass``)
+        block_seconds: Duration of the blocks read from the file
+        target_fs: Sampling frequency to resample to
+        filter_band: (low_freq, high_freq) bandpass range
+        min_length: Minimum syllable length (ms)
+        max_length: Maximum syllable length (ms)
+        two_pass: Read the file once more beforehand to find the detection
+            threshold over the whole recording, as syllable_cut does; False
+            uses the running maximum and reads the file only once
+
+    Yields:
+        Syllables in the order of syllable_cut: the pairs of starts as they
+        are found, then the pairs of ends
+    """
+    envelope_max = None
+    if two_pass:
+        envelope_max = long_envelope_max(audio_path, block_seconds, target_fs, filter_band)
+        if hasattr(audio_path, 'seek'):
+            audio_path.seek(0)
+    segmenter = StreamingSegmenter(target_fs, min_length, max_length, envelope_max)
+    stream_filter = None
+    for block, fs in iter_audio_blocks(audio_path, block_seconds):
+        if stream_filter is None:
+            stream_filter = StreamingFilter(fs, target_fs, filter_band, hop_seconds=block_seconds)
+        yield from segmenter.push(stream_filter.push(block))
+    if stream_filter is not None:
+        yield from segmenter.push(stream_filter.flush())
+    yield from segmenter.flush()
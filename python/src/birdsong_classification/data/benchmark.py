@@ -0,0 +1,64 @@
+# src/birdsong_classification/data/benchmark.py
+"""Benchmark serial vs. parallel image decoding in BirdSongDataset.load_data"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from birdsong_classification.data.dataset import BirdSongDataset
+from birdsong_classification.utils.path_utils import get_data_dir
+
+CATEGORIES = ["common_chaffinch", "eurasian_blue_tit", "house_sparrow"]
+
+
+def write_synthetic_images(data_dir: Path, num_images: int, size: int = 1000):
+    """Write random JPEGs of roughly the exported spectrogram size"""
+    rng = np.random.default_rng(0)
+    for i in range(num_images):
+        category_dir = data_dir / CATEGORIES[i % len(CATEGORIES)]
+        category_dir.mkdir(parents=True, exist_ok=True)
+        img = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        cv2.imwrite(str(category_dir / f"{i}.jpg"), img)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark spectrogram image loading')
+    parser.add_argument('--data-dir', type=str, default=None,
+                        help='Spectrogram directory (defaults to data/spectrograms)')
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help='Benchmark on this many generated images instead')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1],
+                        help='Worker counts to compare')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.synthetic:
+            data_dir = Path(tmp_dir)
+            write_synthetic_images(data_dir, args.synthetic)
+        else:
+            data_dir = Path(args.data_dir) if args.data_dir else get_data_dir() / "spectrograms"
+
+        dataset = BirdSongDataset(data_dir, CATEGORIES)
+        reference = None
+        results = {}
+        for num_workers in sorted(set(args.workers)):
+            start = time.perf_counter()
+            X, y = dataset.load_data(num_workers=num_workers)
+            results[num_workers] = time.perf_counter() - start
+            if reference is None:
+                reference = (X, y)
+            elif not (np.array_equal(X, reference[0]) and np.array_equal(y, reference[1])):
+                raise RuntimeError(f"Output with {num_workers} workers differs from serial loading")
+
+    print(f"\nLoaded {len(reference[0])} images:")
+    for num_workers, seconds in results.items():
+        print(f"  {num_workers:3d} workers: {seconds:7.3f} s "
+              f"({len(reference[0]) / seconds:8.1f} images/s, {results[min(results)] / seconds:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,49 @@
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import cv2
 from tqdm import tqdm
 from typing import List, Tuple, Optional
 import pickle
 
+from birdsong_classification.data.store import SpectrogramStore
+from birdsong_classification.data.preprocessing import load_train_stats, standardize
+
+INDEX_DTYPE = np.dtype([('recording_id', object), ('syllable_idx', np.int64), ('label', np.int64)])
+
+def recording_id(path: Path) -> str:
+    """
+    Recording a spectrogram belongs to
+    
+    generate_spectrograms.m names images ``<recording><syllable>.jpg`` with a
+    single-digit syllable number, so all syllables of one recording share the
+    file name without its last character.
+    
+    Args:
+        path: Spectrogram path inside its category directory
+        
+    Returns:
+        Id of the form ``<category>/<recording>``
+    """
+    path = Path(path)
+    return f"{path.parent.name}/{path.stem[:-1]}"
+
+def build_index(paths: List[Path], labels: np.ndarray) -> np.ndarray:
+    """
+    Lightweight per-sample index used for grouped splits
+    
+    Args:
+        paths: Spectrogram paths
+        labels: Label of each spectrogram
+        
+    Returns:
+        Structured array with fields recording_id, syllable_idx and label
+    """
+    index = np.empty(len(paths), dtype=INDEX_DTYPE)
+    for i, (path, label) in enumerate(zip(paths, labels)):
+        stem = Path(path).stem
+        index[i] = (recording_id(path), int(stem[-1]) if stem[-1:].isdigit() else 0, label)
+    return index
+
 class BirdSongDataset:
     """Dataset class for bird song spectrograms"""
     
@@ -22,75 +61,185 @@ class BirdSongDataset:
         self.img_size = img_size
         self.data = []
         
-    def load_data(self, prediction_mode=False) -> Tuple[np.ndarray, np.ndarray]:
+    def list_images(self, prediction_mode: bool = False) -> Tuple[List[Path], np.ndarray]:
+        """
+        List image files and their labels in loading order
+        
+        Args:
+            prediction_mode: If True, list all images in the root directory without categories
+            
+        Returns:
+            paths: Image paths
+            labels: Labels of shape (n_samples,) (0 in prediction mode)
+        """
+        if prediction_mode:
+            paths = list(self.data_dir.glob('*.jpg'))
+            return paths, np.zeros(len(paths), dtype=np.int64)
+        
+        paths = []
+        labels = []
+        for class_num, category in enumerate(self.categories):
+            category_paths = list((self.data_dir / category).glob('*.jpg'))
+            paths.extend(category_paths)
+            labels.extend([class_num] * len(category_paths))
+        return paths, np.array(labels, dtype=np.int64)
+    
+    def load_image(self, img_path: Path) -> np.ndarray:
+        """
+        Decode, convert to RGB and resize a single image
+        
+        Args:
+            img_path: Path to image file
+            
+        Returns:
+            uint8 image of shape (img_size, img_size, 3)
+        """
+        # Imported here so the CLIs that only import this module start quickly
+        import cv2
+        img = cv2.imread(str(img_path))
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        return cv2.resize(img, (self.img_size, self.img_size))
+        
+    def load_data(self, prediction_mode=False, num_workers: int = 1) -> Tuple[np.ndarray, np.ndarray]:
         """
         Load and preprocess all images
         
+        Images are decoded straight into a preallocated array. With
+        ``num_workers > 1`` decoding runs on a thread pool (OpenCV releases
+        the GIL); the output order is the same as with a single worker.
+        
         Args:
             prediction_mode: If True, load all images from root directory without categories
+            num_workers: Number of decoding threads
         
         Returns:
             X: Image data of shape (n_samples, img_size, img_size, 3)
             y: Labels of shape (n_samples,)
         """
         print("Loading data...")
-        X = []
-        y = []
+        print(f"Loading from {self.data_dir}")
+        paths, y = self.list_images(prediction_mode)
+        X, loaded = self.load_images(paths, num_workers)
+        if not loaded.all():
+            X, y = X[loaded], y[loaded]
+        return X, y
+    
+    def load_images(self, paths: List[Path], num_workers: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Decode a list of images into a preallocated array
         
-        if prediction_mode:
-            # Load directly from root directory
-            print(f"Loading from {self.data_dir}")
-            for img_path in tqdm(list(self.data_dir.glob('*.jpg')), desc="Loading images"):
-                try:
-                    img = cv2.imread(str(img_path))
-                    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                    img = cv2.resize(img, (self.img_size, self.img_size))
-                    X.append(img)
-                    y.append(0)  # Dummy label
-                except Exception as e:
-                    print(f"Error loading {img_path}: {e}")
-                    continue
+        Args:
+            paths: Image paths
+            num_workers: Number of decoding threads
+            
+        Returns:
+            X: uint8 image data of shape (len(paths), img_size, img_size, 3)
+            loaded: Boolean mask of the images that were decoded successfully
+        """
+        X = np.empty((len(paths), self.img_size, self.img_size, 3), dtype=np.uint8)
+        loaded = np.ones(len(paths), dtype=bool)
+        
+        def load(i: int):
+            try:
+                X[i] = self.load_image(paths[i])
+            except Exception as e:
+                print(f"Error loading {paths[i]}: {e}")
+                loaded[i] = False
+        
+        if num_workers > 1:
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                for _ in tqdm(executor.map(load, range(len(paths))), total=len(paths), desc="Loading images"):
+                    pass
         else:
-            # Original category-based loading
-            for category in self.categories:
-                class_num = self.categories.index(category)
-                path = self.data_dir / category
-                print(path)
-                for img_path in tqdm(list(path.glob('*.jpg')), desc=f"Loading {category}"):
-                    try:
-                        img = cv2.imread(str(img_path))
-                        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                        img = cv2.resize(img, (self.img_size, self.img_size))
-                        X.append(img)
-                        y.append(class_num)
-                    except Exception as e:
-                        print(f"Error loading {img_path}: {e}")
-                        continue
-                    
-        return np.array(X), np.array(y)
+            for i in tqdm(range(len(paths)), desc="Loading images"):
+                load(i)
+        return X, loaded
     
-    def save_data(self, X: np.ndarray, y: np.ndarray, save_dir: str):
+    def save_data(self, X: np.ndarray, y: np.ndarray, save_dir: str,
+                  shard_size: Optional[int] = None,
+                  indices: Optional[np.ndarray] = None,
+                  recording_ids: Optional[np.ndarray] = None) -> SpectrogramStore:
         """
-        Save processed data to pickle files
+        Save processed data as a memory-mappable spectrogram store
         
         Args:
             X: Image data
             y: Labels
-            save_dir: Directory to save pickle files
+            save_dir: Directory to save the store to
+            shard_size: Maximum number of samples per shard (None for one shard)
+            indices: Rows to save, e.g. one split from preprocess_data (defaults to all)
+            recording_ids: Recording id of every row of X (e.g. the
+                recording_id field of build_index), stored with the samples
+            
+        Returns:
+            The written store
+        """
+        return SpectrogramStore.write(save_dir, X, y, categories=self.categories,
+                                      shard_size=shard_size, indices=indices,
+                                      recording_ids=recording_ids)
+    
+    @staticmethod
+    def load_store(data_dir: str) -> SpectrogramStore:
+        """
+        Open a spectrogram store without reading its samples
+        
+        Args:
+            data_dir: Directory containing manifest.json
+            
+        Returns:
+            Store giving memory-mapped access to the data
+        """
+        return SpectrogramStore(data_dir)
+    
+    @staticmethod
+    def load_processed_data(data_dir: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Load processed data without reading store samples into memory
+        
+        For the store format the samples are returned as the
+        SpectrogramStore itself, which is indexed like an array and reads
+        only the selected rows from its memory-mapped shards. Falls back to
+        X.pickle / y.pickle for directories written by older versions.
+        
+        Args:
+            data_dir: Directory containing processed data
+            
+        Returns:
+            X: Image data (a SpectrogramStore for the store format)
+            y: Labels
+        """
+        if SpectrogramStore.exists(data_dir):
+            store = SpectrogramStore(data_dir)
+            return store, store.labels
+        return BirdSongDataset.load_pickle_data(data_dir)
+    
+    @staticmethod
+    def load_standardized_data(data_dir: str, stats_path: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
         """
-        save_dir = Path(save_dir)
-        save_dir.mkdir(parents=True, exist_ok=True)
+        Load processed data into memory and standardize it in float32
         
-        with open(save_dir / "X.pickle", "wb") as f:
-            pickle.dump(X, f)
+        Stores hold raw uint8 pixels, which are read and standardized here
+        with the training statistics; stream stores that may not fit in
+        memory with pipeline.store_dataset instead. Legacy pickle files
+        already contain standardized data and are returned unchanged.
+        
+        Args:
+            data_dir: Directory containing processed data
+            stats_path: Training statistics file (defaults to models/train_stats.npz)
             
-        with open(save_dir / "y.pickle", "wb") as f:
-            pickle.dump(y, f)
+        Returns:
+            X: Standardized float32 image data
+            y: Labels
+        """
+        X, y = BirdSongDataset.load_processed_data(data_dir)
+        if np.issubdtype(X.dtype, np.integer):
+            X = standardize(X[:], *load_train_stats(stats_path))
+        return X, y
             
     @staticmethod
     def load_pickle_data(data_dir: str) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Load data from pickle files
+        Load data from legacy pickle files
         
         Args:
             data_dir: Directory containing pickle files
@@ -1,76 +1,314 @@
 # scripts/download_bird_songs.py
 import os
+import json
+import time
 import argparse
 import requests
-import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from birdsong_classification.utils.path_utils import get_data_dir, get_models_dir, get_results_dir
+from typing import Dict, List, Optional
+from requests.adapters import HTTPAdapter
+from birdsong_classification.utils.path_utils import get_data_dir
 
+API_URL = 'https://xeno-canto.org/api/2/recordings'
+MANIFEST_NAME = 'manifest.json'
+CHUNK_SIZE = 1 << 16
 
-def download_bird_songs(species, quality='A', page=1, num_files=150, start_index=1):#, output_dir='../data/raw'):
+
+def create_session(max_workers: int = 4) -> requests.Session:
+    """
+    Create an HTTP session whose connection pool fits the download workers
+
+    Args:
+        max_workers: Number of concurrent downloads
+
+    Returns:
+        Session reusing connections across requests
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def is_permanent_error(error: Exception) -> bool:
+    """
+    Whether retrying a failed request cannot help
+
+    Client errors (4xx) are permanent, except for timeouts (408) and rate
+    limiting (429).
+    """
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+
+def with_retries(func, max_retries: int = 5, backoff: float = 1.0):
+    """
+    Call func, retrying on network errors with exponential backoff
+
+    Permanent client errors (see is_permanent_error) are raised right away.
+
+    Args:
+        func: Function without arguments
+        max_retries: Maximum number of attempts
+        backoff: Delay before the first retry in seconds (doubled every retry)
+
+    Returns:
+        Return value of func
+    """
+    for attempt in range(max_retries):
+        try:
+            return func()
+        except (requests.exceptions.RequestException, IOError) as e:
+            if attempt == max_retries - 1 or is_permanent_error(e):
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+def fetch_recordings(session: requests.Session, species: str, quality: str = 'A', page: int = 1,
+                     num_files: int = 150, base_url: str = API_URL,
+                     max_retries: int = 5, backoff: float = 1.0) -> List[Dict]:
+    """
+    Query the xeno-canto API, following pagination until enough recordings are found
+
+    Args:
+        session: HTTP session
+        species: Bird species name (e.g., 'Eurasian blue tit')
+        quality: Recording quality
+        page: Page number to start from
+        num_files: Number of recordings wanted
+        base_url: API endpoint
+        max_retries: Maximum number of attempts per page
+        backoff: Initial retry delay in seconds
+
+    Returns:
+        Recording metadata dictionaries, at most num_files
+    """
+    query = f"{species} q:{quality}"
+    recordings = []
+    num_pages = page
+    while page <= num_pages and len(recordings) < num_files:
+        def get_page():
+            response = session.get(base_url, params={'query': query, 'page': page}, timeout=30)
+            response.raise_for_status()
+            return response.json()
+
+        data = with_retries(get_page, max_retries, backoff)
+        recordings.extend(data.get("recordings", []))
+        num_pages = int(data.get("numPages", page))
+        page += 1
+    return recordings[:num_files]
+
+
+def download_file(session: requests.Session, url: str, filepath: Path,
+                  max_retries: int = 5, backoff: float = 1.0,
+                  part_path: Optional[Path] = None) -> Path:
+    """
+    Download a file atomically, resuming partial downloads
+
+    Data is written to a part file and moved into place once complete. A
+    leftover part file from an earlier attempt is continued with an HTTP
+    Range request, so it must belong to the same URL; name it after the
+    recording, not after the destination.
+
+    Args:
+        session: HTTP session
+        url: File URL
+        filepath: Destination path
+        max_retries: Maximum number of attempts
+        backoff: Initial retry delay in seconds
+        part_path: Part file (defaults to ``<filepath>.part``)
+
+    Returns:
+        filepath
+    """
+    part_path = part_path or filepath.with_name(filepath.name + '.part')
+
+    def attempt():
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        with session.get(url, headers=headers, stream=True, timeout=60) as response:
+            if response.status_code == 416:
+                # Part file already holds the whole file
+                return
+            response.raise_for_status()
+            if response.status_code != 206:
+                # Server ignored the range, start over
+                offset = 0
+            expected = response.headers.get('Content-Length')
+            written = 0
+            with open(part_path, 'ab' if offset else 'wb') as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    written += len(chunk)
+            if expected is not None and written != int(expected):
+                raise IOError(f"Incomplete download: {written} of {expected} bytes")
+
+    with_retries(attempt, max_retries, backoff)
+    os.replace(part_path, filepath)
+    return filepath
+
+
+def load_manifest(output_dir: Path) -> Dict[str, str]:
+    """Map of xeno-canto id to file name (downloaded, or assigned and pending)"""
+    manifest_path = output_dir / MANIFEST_NAME
+    if not manifest_path.exists():
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def save_manifest(output_dir: Path, manifest: Dict[str, str]):
+    """Atomically write the download manifest"""
+    tmp_path = output_dir / (MANIFEST_NAME + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, output_dir / MANIFEST_NAME)
+
+
+def part_path_for(species_dir: Path, rec_id: str) -> Path:
+    """Part file of a recording, keyed by its xeno-canto id"""
+    return species_dir / f"XC{rec_id}.part"
+
+
+def adopt_legacy_files(species_dir: Path, recordings: List[Dict], start_index: int = 1) -> Dict[str, str]:
+    """
+    Map files of the downloader without manifest to xeno-canto ids
+
+    That downloader saved the i-th recording of the query as
+    ``<start_index + i>.mp3``; replaying its naming over the same query
+    finds the recording of every existing file, so it is neither downloaded
+    again nor ends up twice in the dataset.
+
+    Args:
+        species_dir: Species directory
+        recordings: Recording metadata of the query, in API order
+        start_index: Index the files were numbered from
+
+    Returns:
+        Map of xeno-canto id to existing file name
+    """
+    adopted = {}
+    for i, recording in enumerate(recordings):
+        filename = f"{start_index + i}.mp3"
+        if (species_dir / filename).exists():
+            adopted[str(recording.get("id"))] = filename
+    return adopted
+
+
+def download_bird_songs(species, quality='A', page=1, num_files=150, start_index=1,
+                        output_dir: Optional[str] = None, base_url: str = API_URL,
+                        max_workers: int = 4, max_retries: int = 5, backoff: float = 1.0,
+                        session: Optional[requests.Session] = None) -> Dict[str, int]:
     """
     Download bird songs from xeno-canto.org
-    
+
+    Recordings are fetched concurrently over a pooled session. A manifest of
+    xeno-canto ids in the species directory makes reruns skip everything
+    that was already downloaded; file names are recorded in it before the
+    downloads start, so an interrupted recording keeps its name and part
+    file even if the API returns recordings in a different order. Species
+    directories without a manifest adopt their existing files (see
+    adopt_legacy_files).
+
     Parameters:
         species (str): Bird species name (e.g., 'Eurasian blue tit')
         quality (str): Recording quality (default: 'A')
         page (int): Page number to start from (default: 1)
         num_files (int): Number of files to download (default: 150)
         start_index (int): Starting index for file naming (default: 1)
-        output_dir (str): Directory to save files (default: '../data/raw')
+        output_dir (str): Directory to create the species folder in (default: data/raw)
+        base_url (str): API endpoint, e.g. a local test server
+        max_workers (int): Number of concurrent downloads
+        max_retries (int): Maximum number of attempts per request
+        backoff (float): Initial retry delay in seconds
+        session (requests.Session): Session to use (default: a new pooled session)
+
+    Returns:
+        Counts of downloaded, skipped and failed recordings
     """
     # Sanitize species name for folder creation
     sanitized_species = "_".join(species.lower().split())
-    
+
     # Create species-specific output directory
-    species_output_path = get_data_dir() / "raw" / sanitized_species #Path(output_dir) / sanitized_species
+    output_dir = Path(output_dir) if output_dir else get_data_dir() / "raw"
+    species_output_path = output_dir / sanitized_species
     species_output_path.mkdir(parents=True, exist_ok=True)
-    
-    # Construct URL
-    species_url = '%20'.join(species.split())
-    url = f'https://xeno-canto.org/api/2/recordings?query={species_url}%20q:{quality}&page={page}'
-    
+
+    session = session or create_session(max_workers)
+    summary = {'downloaded': 0, 'skipped': 0, 'failed': 0}
+
     # Fetch data from API
     try:
-        response = requests.get(url)  # Changed to GET
-        response.raise_for_status()  # Raises exception for 4XX/5XX errors
-        data = response.json()
+        recordings = fetch_recordings(session, species, quality, page, num_files,
+                                      base_url, max_retries, backoff)
     except requests.exceptions.RequestException as e:
         print(f"Error fetching data: {e}")
-        return
-    
-    # Check if there are enough recordings
-    recordings = data.get("recordings", [])
+        return summary
+
     if len(recordings) < num_files:
         print(f"Only found {len(recordings)} recordings. Adjusting num_files to {len(recordings)}.")
-        num_files = len(recordings)
-    
+
+    # Adopt files written before downloads were tracked by id
+    manifest = load_manifest(species_output_path)
+    if not manifest:
+        manifest = adopt_legacy_files(species_output_path, recordings, start_index)
+        if manifest:
+            print(f"Adopted {len(manifest)} existing files into the manifest")
+            save_manifest(species_output_path, manifest)
+
+    # Assign file names: known ids keep theirs, new ones get the next free index
+    used = set(manifest.values())
+    next_index = start_index
+    jobs = []
+    for recording in recordings:
+        rec_id = str(recording.get("id"))
+        file_url = recording.get("file")
+        if not file_url:
+            print(f"No file URL for recording {rec_id}, skipping...")
+            continue
+        if rec_id in manifest and (species_output_path / manifest[rec_id]).exists():
+            summary['skipped'] += 1
+            continue
+
+        filename = manifest.get(rec_id)
+        if filename is None:
+            while f"{next_index}.mp3" in used or (species_output_path / f"{next_index}.mp3").exists():
+                next_index += 1
+            filename = f"{next_index}.mp3"
+            used.add(filename)
+            manifest[rec_id] = filename
+        if file_url.startswith('//'):
+            file_url = 'https:' + file_url
+        jobs.append((rec_id, file_url, species_output_path / filename))
+
+    # Record the assignments before downloading, so a rerun resumes every
+    # recording under the same name
+    save_manifest(species_output_path, manifest)
+
     # Download files
-    print(f"Downloading {num_files} recordings for {species}...")
-    for i in range(num_files):
-        try:
-            filename = f"{start_index + i}.mp3"
-            filepath = species_output_path / filename
-            
-            # Skip if file already exists
-            if filepath.exists():
-                print(f"File {filename} already exists, skipping...")
-                continue
-            
-            # Download file
-            file_url = recordings[i].get("file")
-            if not file_url:
-                print(f"No file URL for recording {i+1}, skipping...")
+    print(f"Downloading {len(jobs)} recordings for {species} ({summary['skipped']} already present)...")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(download_file, session, url, filepath, max_retries, backoff,
+                            part_path_for(species_output_path, rec_id)): (rec_id, filepath)
+            for rec_id, url, filepath in jobs
+        }
+        for future in as_completed(futures):
+            rec_id, filepath = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error downloading recording {rec_id}: {e}")
+                summary['failed'] += 1
                 continue
-            
-            urllib.request.urlretrieve(file_url, str(filepath))
-            print(f"Downloaded file {i+1}/{num_files}: {filename}")
-            
-        except Exception as e:
-            print(f"Error downloading file {i+1}: {e}")
-            continue
-    
+            summary['downloaded'] += 1
+            print(f"Downloaded file {summary['downloaded']}/{len(jobs)}: {filepath.name}")
+
     print("Download complete!")
+    return summary
 
 def main():
     parser = argparse.ArgumentParser(description='Download bird songs from xeno-canto.org')
@@ -84,12 +322,18 @@ def main():
                       help='Number of files to download')
     parser.add_argument('--start-index', type=int, default=1,
                       help='Starting index for file naming')
-    #parser.add_argument('--output-dir', type=str, 
-    #                  default='../../../data/raw/',  
-    #                  help='Directory to save files')
-        
+    parser.add_argument('--output-dir', type=str, default=None,
+                      help='Directory to save files (defaults to data/raw)')
+    parser.add_argument('--workers', type=int, default=4,
+                      help='Number of concurrent downloads')
+    parser.add_argument('--retries', type=int, default=5,
+                      help='Maximum number of attempts per request')
+    parser.add_argument('--base-url', type=str, default=API_URL,
+                      help='xeno-canto API endpoint')
+
     args = parser.parse_args()
-    
+
+    session = create_session(args.workers)
     for species in args.species.split(','):
         download_bird_songs(
             species=species,
@@ -97,7 +341,11 @@ def main():
             page=args.page,
             num_files=args.num_files,
             start_index=args.start_index,
-            #output_dir=args.output_dir
+            output_dir=args.output_dir,
+            base_url=args.base_url,
+            max_workers=args.workers,
+            max_retries=args.retries,
+            session=session
         )
 
 if __name__ == "__main__":
@@ -0,0 +1,303 @@
+# src/birdsong_classification/data/incremental.py
+"""
+Incremental build of the processed train/test stores
+
+A build index next to the stores records every spectrogram that has been
+processed (size, modification time, content hash, split and row). Later runs
+only decode images that are new or whose content changed: new images are
+appended to the stores as a new shard, changed images are overwritten in
+place. Splits are assigned by hashing the recording id, so images never move
+between train and test, and the training mean/std are updated with a
+streaming (Welford) update instead of a full pass over the training set.
+
+The index is the commit point of a run: it also holds the running training
+statistics and a generation number. Rows appended by a run that was
+interrupted before the index was saved are truncated on the next run, and
+rows overwritten in place are restored from an undo file written before
+the overwrite, so no image is counted twice.
+With a FeatureCache, decoded images are cached by content hash, so a
+``--rebuild`` only decodes images that were never seen before.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from birdsong_classification.audio.cache import FeatureCache, make_key
+from birdsong_classification.data.dataset import recording_id
+from birdsong_classification.data.preprocessing import RunningStats
+from birdsong_classification.data.store import SpectrogramStore
+
+INDEX_NAME = "build_index.json"
+INDEX_VERSION = 1
+# Old rows of an in-place update, kept in the store directory until the index is saved
+UNDO_NAME = "undo.npz"
+
+
+def assign_split(rec_id: str, test_size: float = 0.1) -> str:
+    """
+    Deterministically assign a recording to the train or test split
+
+    Args:
+        rec_id: Recording id from recording_id()
+        test_size: Expected fraction of recordings in the test split
+
+    Returns:
+        'train' or 'test'
+    """
+    bucket = int(hashlib.sha256(rec_id.encode()).hexdigest()[:16], 16) / 16 ** 16
+    return 'test' if bucket < test_size else 'train'
+
+
+def split_by_hash(recording_ids: Sequence[str], test_size: float = 0.1) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Split samples with assign_split, so a full build holds out the same
+    recordings as the incremental build
+
+    Args:
+        recording_ids: Recording id of every sample
+        test_size: Expected fraction of recordings in the test split
+
+    Returns:
+        (train_indices, test_indices): Sorted sample indices of each split
+    """
+    splits = {rec_id: assign_split(rec_id, test_size) for rec_id in set(recording_ids)}
+    is_test = np.array([splits[rec_id] == 'test' for rec_id in recording_ids], dtype=bool)
+    return np.flatnonzero(~is_test), np.flatnonzero(is_test)
+
+
+def file_hash(path: Path) -> str:
+    """SHA-256 of a file's contents"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_index(index_path: Path) -> Optional[Dict]:
+    """Load a build index, or None if it does not exist"""
+    if not Path(index_path).exists():
+        return None
+    with open(index_path) as f:
+        return json.load(f)
+
+
+def save_index(index: Dict, index_path: Path):
+    """Atomically write a build index"""
+    tmp_path = Path(str(index_path) + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp_path, index_path)
+
+
+def _save_undo(store: SpectrogramStore, rows: List[int], generation: int):
+    """Keep the rows an in-place update is about to overwrite"""
+    tmp_path = store.root / (UNDO_NAME + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(f, rows=np.asarray(rows, dtype=np.int64), X=store.take(rows), generation=generation)
+    os.replace(tmp_path, store.root / UNDO_NAME)
+
+
+def _recover(stores: Dict[str, SpectrogramStore], index: Dict):
+    """Roll the stores back to the state recorded in the index"""
+    for split, store in stores.items():
+        undo_path = store.root / UNDO_NAME
+        if undo_path.exists():
+            with np.load(undo_path) as undo:
+                # Only undo updates whose index was never saved
+                if int(undo["generation"]) > index.get("generation", 0):
+                    print(f"Restoring {len(undo['rows'])} {split} samples overwritten by an interrupted run")
+                    store.update(undo["rows"], undo["X"])
+            undo_path.unlink()
+
+        indexed = sum(1 for entry in index["files"].values() if entry["split"] == split)
+        if len(store) < indexed:
+            raise ValueError(f"The {split} store has fewer samples than {INDEX_NAME}. Use a full rebuild.")
+        if len(store) > indexed:
+            print(f"Dropping {len(store) - indexed} {split} samples appended by an interrupted run")
+            store.truncate(indexed)
+
+
+def load_images(dataset, paths: List[Path], digests: List[str], num_workers: int = 1,
+                cache: Optional[FeatureCache] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decode images like dataset.load_images, taking cached images by content hash
+
+    Args:
+        dataset: BirdSongDataset pointing at the spectrogram directory
+        paths: Image paths
+        digests: file_hash() of every image
+        num_workers: Number of decoding threads
+        cache: Optional cache of decoded images
+
+    Returns:
+        X: uint8 image data of shape (len(paths), img_size, img_size, 3)
+        loaded: Boolean mask of the images that were decoded successfully
+    """
+    if cache is None:
+        return dataset.load_images(paths, num_workers)
+
+    params = {'decoder': 'BirdSongDataset.load_image', 'img_size': dataset.img_size}
+    keys = [make_key(digest, params) for digest in digests]
+    X = np.empty((len(paths), dataset.img_size, dataset.img_size, 3), dtype=np.uint8)
+    loaded = np.ones(len(paths), dtype=bool)
+    missing = []
+    for i, key in enumerate(keys):
+        image = cache.get(key, 'image')
+        if image is None:
+            missing.append(i)
+        else:
+            X[i] = image
+    if missing:
+        decoded, ok = dataset.load_images([paths[i] for i in missing], num_workers)
+        X[missing], loaded[missing] = decoded, ok
+        for i, image, image_ok in zip(missing, decoded, ok):
+            if image_ok:
+                cache.put(keys[i], 'image', image)
+    return X, loaded
+
+
+def update_dataset(dataset,
+                   train_dir: Path,
+                   test_dir: Path,
+                   stats_path: Optional[Path] = None,
+                   test_size: float = 0.1,
+                   num_workers: int = 1,
+                   rebuild: bool = False,
+                   cache: Optional[FeatureCache] = None) -> Dict:
+    """
+    Bring the train/test stores up to date with the spectrogram directory
+
+    The build index is kept in the parent directory of ``train_dir``. Without
+    an index (or with ``rebuild=True``) the stores are created from scratch.
+
+    Args:
+        dataset: BirdSongDataset pointing at the spectrogram directory
+        train_dir: Train store directory
+        test_dir: Test store directory
+        stats_path: Training statistics file (defaults to models/train_stats.npz)
+        test_size: Fraction of recordings assigned to the test split
+        num_workers: Number of decoding threads
+        rebuild: Ignore the existing index and rebuild everything
+        cache: Optional cache of decoded images, keyed by content hash
+
+    Returns:
+        Summary with the number of new, changed, unchanged, missing and
+        failed images
+    """
+    train_dir, test_dir = Path(train_dir), Path(test_dir)
+    index_path = train_dir.parent / INDEX_NAME
+    index = None if rebuild else load_index(index_path)
+    stats = None
+    if index is not None:
+        if index.get("test_size") != test_size:
+            raise ValueError(
+                f"Index was built with test_size={index.get('test_size')}; changing it would move "
+                f"recordings between splits. Use a full rebuild instead."
+            )
+        if "stats" in index:
+            stats = RunningStats(**index["stats"])
+        else:
+            # Indexes written before the statistics were kept in them
+            stats = RunningStats.load(stats_path)
+        if stats is None:
+            raise ValueError(f"No running training statistics found for {index_path}. Use a full rebuild.")
+
+    sample_shape = (dataset.img_size, dataset.img_size, 3)
+    created = index is None
+    if created:
+        index = {"version": INDEX_VERSION, "test_size": test_size, "files": {}}
+        stats = RunningStats()
+        stores = {
+            split: SpectrogramStore.create(root, sample_shape, np.uint8, dataset.categories)
+            for split, root in (('train', train_dir), ('test', test_dir))
+        }
+    else:
+        stores = {'train': SpectrogramStore(train_dir), 'test': SpectrogramStore(test_dir)}
+        _recover(stores, index)
+    generation = index.get("generation", 0) + 1
+
+    # Find new and changed images
+    files = index["files"]
+    paths, labels = dataset.list_images()
+    todo = []
+    summary = {'new': 0, 'changed': 0, 'unchanged': 0, 'missing': 0, 'failed': 0}
+    seen = set()
+    for path, label in zip(paths, labels):
+        key = path.relative_to(dataset.data_dir).as_posix()
+        seen.add(key)
+        stat = path.stat()
+        entry = files.get(key)
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            summary['unchanged'] += 1
+            continue
+        digest = file_hash(path)
+        if entry is not None and entry["sha256"] == digest:
+            entry["mtime_ns"] = stat.st_mtime_ns
+            summary['unchanged'] += 1
+            continue
+        todo.append((key, path, int(label), digest, stat, entry))
+    summary['missing'] = len(set(files) - seen)
+
+    X, loaded = load_images(dataset, [item[1] for item in todo], [item[3] for item in todo],
+                            num_workers, cache)
+    summary['failed'] = int((~loaded).sum())
+
+    for split, store in stores.items():
+        changed = [i for i, item in enumerate(todo) if loaded[i] and item[5] is not None and item[5]["split"] == split]
+        new = [i for i, item in enumerate(todo)
+               if loaded[i] and item[5] is None and assign_split(recording_id(item[1]), test_size) == split]
+
+        # Changed images keep their split and row
+        if changed:
+            rows = [todo[i][5]["row"] for i in changed]
+            if split == 'train':
+                stats.remove(store.take(rows))
+                stats.update(X[changed])
+            _save_undo(store, rows, generation)
+            store.update(rows, X[changed])
+
+        if new:
+            # Interleave categories instead of appending them one after another
+            new = [int(i) for i in np.random.default_rng(len(store)).permutation(new)]
+            first_row = len(store)
+            store.append(X[new], np.array([todo[i][2] for i in new], dtype=np.int64),
+                         recording_ids=[recording_id(todo[i][1]) for i in new])
+            if split == 'train':
+                stats.update(X[new])
+            for row, i in enumerate(new, start=first_row):
+                todo[i] = todo[i][:5] + ({"split": split, "row": row},)
+
+        for i in changed + new:
+            key, _, label, digest, stat, entry = todo[i]
+            files[key] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": digest,
+                "label": label,
+                "split": split,
+                "row": entry["row"],
+            }
+        summary['changed'] += len(changed)
+        summary['new'] += len(new)
+
+    if created:
+        # New stores replace the old ones only once they are complete; the
+        # old index goes first so a crash in between forces a rebuild
+        index_path.unlink(missing_ok=True)
+        for store in stores.values():
+            store.commit()
+
+    # Saving the index commits the run; the statistics file is derived from it
+    index["generation"] = generation
+    index["stats"] = {"count": stats.count, "mean": stats.mean, "m2": stats.m2}
+    save_index(index, index_path)
+    for store in stores.values():
+        (store.root / UNDO_NAME).unlink(missing_ok=True)
+    if stats.count:
+        stats.save(stats_path)
+
+    summary['train'] = len(stores['train'])
+    summary['test'] = len(stores['test'])
+    return summary
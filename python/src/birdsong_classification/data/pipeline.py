@@ -0,0 +1,160 @@
+# src/birdsong_classification/data/pipeline.py
+"""
+Streaming tf.data input pipelines
+
+Samples are read batch by batch from a SpectrogramStore (or decoded from the
+spectrogram JPEGs) and standardized inside the pipeline, so memory use
+depends on the batch size and prefetch depth, not on the dataset size.
+"""
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import tensorflow as tf
+
+from birdsong_classification.data.dataset import INDEX_DTYPE
+from birdsong_classification.data.preprocessing import grouped_split
+from birdsong_classification.data.store import SpectrogramStore
+
+AUTOTUNE = tf.data.AUTOTUNE
+
+
+def split_indices(num_samples: int,
+                  validation_split: float = 0.1,
+                  labels: Optional[np.ndarray] = None,
+                  seed: int = 0,
+                  recording_ids: Optional[Sequence[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Split sample indices into training and validation parts
+
+    With recording ids, whole recordings are assigned to one part with
+    preprocessing.grouped_split (stratified by label), so syllables of a
+    validation recording are never trained on. Without them (stores written
+    by older versions) samples are drawn at random, stratified by label.
+    Either way the split does not depend on the order in which the store
+    was written (stores are written and appended to category by category).
+
+    Args:
+        num_samples: Number of samples
+        validation_split: Fraction of recordings (or samples) to use for validation
+        labels: Labels of the samples, to keep the class balance in both parts
+        seed: Random seed
+        recording_ids: Recording id of every sample (SpectrogramStore.recording_ids)
+
+    Returns:
+        (train_indices, validation_indices), each sorted
+    """
+    labels = np.zeros(num_samples, dtype=np.int64) if labels is None else np.asarray(labels)
+    if len(labels) != num_samples:
+        raise ValueError(f"Got {len(labels)} labels for {num_samples} samples")
+    if recording_ids is not None:
+        if len(recording_ids) != num_samples:
+            raise ValueError(f"Got {len(recording_ids)} recording ids for {num_samples} samples")
+        index = np.zeros(num_samples, dtype=INDEX_DTYPE)
+        index['recording_id'] = np.asarray(recording_ids, dtype=object)
+        index['label'] = labels
+        return grouped_split(index, validation_split, seed)
+
+    rng = np.random.default_rng(seed)
+    is_val = np.zeros(num_samples, dtype=bool)
+    for label in np.unique(labels):
+        members = rng.permutation(np.flatnonzero(labels == label))
+        is_val[members[:int(round(len(members) * validation_split))]] = True
+    return np.flatnonzero(~is_val), np.flatnonzero(is_val)
+
+
+def _standardize(mean: float, std: float):
+    mean = tf.constant(mean, dtype=tf.float32)
+    std = tf.constant(std, dtype=tf.float32)
+
+    def standardize(images, labels):
+        return (tf.cast(images, tf.float32) - mean) / std, labels
+
+    return standardize
+
+
+def store_dataset(store: SpectrogramStore,
+                  indices: Optional[Sequence[int]] = None,
+                  stats: Optional[Tuple[float, float]] = None,
+                  batch_size: int = 64,
+                  shuffle: bool = False,
+                  shuffle_buffer: int = 10000,
+                  seed: Optional[int] = None) -> tf.data.Dataset:
+    """
+    Build a batched dataset that streams samples from a store
+
+    Args:
+        store: Spectrogram store to read from
+        indices: Global sample indices to use (defaults to all)
+        stats: (mean, std) used for standardization, None to skip it
+        batch_size: Number of samples per batch
+        shuffle: Whether to shuffle the samples every epoch
+        shuffle_buffer: Size of the shuffle buffer
+        seed: Random seed for shuffling
+
+    Returns:
+        Dataset of (images, labels) batches
+    """
+    indices = np.arange(len(store)) if indices is None else np.asarray(indices, dtype=np.int64)
+    labels = store.labels
+    sample_shape = store.sample_shape
+    dtype = tf.as_dtype(store.dtype)
+
+    def read_batch(batch_indices):
+        return store.take(batch_indices), labels[batch_indices]
+
+    def read(batch_indices):
+        images, batch_labels = tf.numpy_function(read_batch, [batch_indices], [dtype, tf.int64])
+        images.set_shape((None,) + sample_shape)
+        batch_labels.set_shape((None,))
+        return images, batch_labels
+
+    ds = tf.data.Dataset.from_tensor_slices(indices)
+    if shuffle:
+        ds = ds.shuffle(min(shuffle_buffer, max(len(indices), 1)), seed=seed,
+                        reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size)
+    ds = ds.map(read, num_parallel_calls=AUTOTUNE)
+    if stats is not None:
+        ds = ds.map(_standardize(*stats), num_parallel_calls=AUTOTUNE)
+    return ds.prefetch(AUTOTUNE)
+
+
+def image_dataset(paths: List[str],
+                  labels: Sequence[int],
+                  img_size: int = 150,
+                  stats: Optional[Tuple[float, float]] = None,
+                  batch_size: int = 64,
+                  shuffle: bool = False,
+                  shuffle_buffer: int = 10000,
+                  seed: Optional[int] = None) -> tf.data.Dataset:
+    """
+    Build a batched dataset that decodes spectrogram JPEGs on the fly
+
+    Args:
+        paths: Image paths (e.g. from BirdSongDataset.list_images)
+        labels: Label of each image
+        img_size: Size to resize images to (square)
+        stats: (mean, std) used for standardization, None to skip it
+        batch_size: Number of samples per batch
+        shuffle: Whether to shuffle the samples every epoch
+        shuffle_buffer: Size of the shuffle buffer
+        seed: Random seed for shuffling
+
+    Returns:
+        Dataset of (images, labels) batches
+    """
+    def decode(path, label):
+        img = tf.io.decode_jpeg(tf.io.read_file(path), channels=3)
+        img = tf.image.resize(img, (img_size, img_size), method='bilinear')
+        return tf.cast(tf.round(img), tf.uint8), label
+
+    ds = tf.data.Dataset.from_tensor_slices(
+        ([str(p) for p in paths], np.asarray(labels, dtype=np.int64)))
+    if shuffle:
+        ds = ds.shuffle(min(shuffle_buffer, max(len(paths), 1)), seed=seed,
+                        reshuffle_each_iteration=True)
+    ds = ds.map(decode, num_parallel_calls=AUTOTUNE)
+    ds = ds.batch(batch_size)
+    if stats is not None:
+        ds = ds.map(_standardize(*stats), num_parallel_calls=AUTOTUNE)
+    return ds.prefetch(AUTOTUNE)
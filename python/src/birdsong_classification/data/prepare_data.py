@@ -1,10 +1,24 @@
 from pathlib import Path
-from dataset import BirdSongDataset
-from preprocessing import preprocess_data
+from birdsong_classification.data.dataset import BirdSongDataset, build_index
+from birdsong_classification.data.preprocessing import preprocess_data
+from birdsong_classification.audio.cache import FeatureCache
+from birdsong_classification.data.incremental import update_dataset
 from birdsong_classification.utils.path_utils import get_project_root, get_data_dir
+import argparse
 import os
 import numpy as np
 def main():
+    parser = argparse.ArgumentParser(description='Prepare train/test data from spectrograms')
+    parser.add_argument('--incremental', action='store_true',
+                      help='Only process new or changed spectrograms and append them to the stores')
+    parser.add_argument('--rebuild', action='store_true',
+                      help='With --incremental, rebuild the stores and build index from scratch')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                      help='With --incremental, cache decoded images in this directory')
+    parser.add_argument('--cache-size-mb', type=float, default=1024,
+                      help='Cache size limit in MB')
+    args = parser.parse_args()
+    
     # Get directories using utility functions
     project_root = get_project_root()
     data_dir = get_data_dir()
@@ -13,6 +27,7 @@ def main():
     TEST_DIR = data_dir / "processed" / "test"
     CATEGORIES = ["common_chaffinch", "eurasian_blue_tit", "house_sparrow"]
     IMG_SIZE = 150
+    NUM_WORKERS = os.cpu_count() or 1
     
     # Ensure directories exist
     if not DATA_DIR.exists():
@@ -34,23 +49,50 @@ def main():
     # Create dataset
     dataset = BirdSongDataset(DATA_DIR, CATEGORIES, IMG_SIZE)
     
+    if args.incremental:
+        cache = None
+        if args.cache_dir:
+            cache = FeatureCache(args.cache_dir, max_bytes=int(args.cache_size_mb * 2**20))
+        summary = update_dataset(dataset, TRAIN_DIR, TEST_DIR, num_workers=NUM_WORKERS,
+                                 rebuild=args.rebuild, cache=cache)
+        print(f"New: {summary['new']}, changed: {summary['changed']}, "
+              f"unchanged: {summary['unchanged']}, failed: {summary['failed']}")
+        if summary['missing']:
+            print(f"Warning: {summary['missing']} indexed spectrograms no longer exist; "
+                  f"their samples stay in the stores until a --rebuild")
+        
+        for split_name, split_dir in [("Train", TRAIN_DIR), ("Test", TEST_DIR)]:
+            labels = dataset.load_store(split_dir).labels
+            print(f"\n{split_name} set class distribution:")
+            for category, count in zip(CATEGORIES, np.bincount(labels, minlength=len(CATEGORIES))):
+                print(f"{category}: {count} samples")
+        return
+    
     try:
         # Load data
-        X, y = dataset.load_data()
+        paths, y = dataset.list_images()
+        X, loaded = dataset.load_images(paths, num_workers=NUM_WORKERS)
+        if not loaded.all():
+            paths = [path for path, ok in zip(paths, loaded) if ok]
+            X, y = X[loaded], y[loaded]
         
-        # Split and preprocess data
-        (X_train, y_train), (X_test, y_test) = preprocess_data(X, y)
+        # Split by recording so syllables of one recording stay together
+        index = build_index(paths, y)
+        train_idx, test_idx = preprocess_data(X, y, index=index)
+        print(f"Split {len(np.unique(index['recording_id'].astype(str)))} recordings")
         
         # Save train data
-        dataset.save_data(X_train, y_train, TRAIN_DIR)
-        print(f"Saved {len(X_train)} training samples")
+        dataset.save_data(X, y, TRAIN_DIR, indices=train_idx,
+                          recording_ids=index['recording_id'])
+        print(f"Saved {len(train_idx)} training samples")
         
         # Save test data
-        dataset.save_data(X_test, y_test, TEST_DIR)
-        print(f"Saved {len(X_test)} test samples")
+        dataset.save_data(X, y, TEST_DIR, indices=test_idx,
+                          recording_ids=index['recording_id'])
+        print(f"Saved {len(test_idx)} test samples")
         
         # Print class distribution
-        for split_name, y_data in [("Train", y_train), ("Test", y_test)]:
+        for split_name, y_data in [("Train", y[train_idx]), ("Test", y[test_idx])]:
             print(f"\n{split_name} set class distribution:")
             for category, count in zip(CATEGORIES, np.bincount(y_data)):
                 print(f"{category}: {count} samples")
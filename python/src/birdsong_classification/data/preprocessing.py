@@ -1,43 +1,268 @@
 # src/birdsong_classification/data/preprocessing.py
 import numpy as np
-from typing import Tuple
-from sklearn.model_selection import train_test_split
+from pathlib import Path
+from typing import Optional, Tuple
 from birdsong_classification.utils.path_utils import get_project_root, get_models_dir
 
-def preprocess_data(X: np.ndarray, y: np.ndarray, test_size: float = 0.1, random_state: int = 42) -> Tuple[Tuple[np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray]]:
+def compute_stats(X: np.ndarray, chunk_size: int = 1024,
+                  indices: Optional[np.ndarray] = None) -> Tuple[float, float]:
     """
-    Preprocess data by standardizing and splitting into train/test sets
+    Compute mean and standard deviation of all pixels without a float copy of X
+    
+    Args:
+        X: Image data (any dtype, typically uint8)
+        chunk_size: Number of samples converted to float64 at a time
+        indices: Samples to include (defaults to all)
+        
+    Returns:
+        (mean, std) over all elements of the selected samples
+    """
+    num_samples = len(X) if indices is None else len(indices)
+    total = 0.0
+    total_sq = 0.0
+    for start in range(0, num_samples, chunk_size):
+        if indices is None:
+            chunk = X[start:start + chunk_size]
+        else:
+            chunk = X[indices[start:start + chunk_size]]
+        chunk = np.asarray(chunk, dtype=np.float64)
+        total += chunk.sum()
+        total_sq += np.square(chunk).sum()
+    count = num_samples * int(np.prod(X.shape[1:]))
+    mean = total / count
+    std = np.sqrt(max(total_sq / count - mean ** 2, 0.0))
+    return mean, std
+
+class RunningStats:
+    """
+    Streaming mean and variance of all pixels
+    
+    Batches are merged with the parallel form of Welford's algorithm
+    (Chan et al.), so statistics can be extended with new samples, or have
+    samples taken out again, without revisiting the rest of the data.
+    """
+    
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        """
+        Initialize statistics
+        
+        Args:
+            count: Number of pixels seen
+            mean: Mean pixel value
+            m2: Sum of squared differences from the mean
+        """
+        self.count = int(count)
+        self.mean = float(mean)
+        self.m2 = float(m2)
+    
+    @staticmethod
+    def _chunk_stats(chunk: np.ndarray) -> Tuple[int, float, float]:
+        chunk = np.asarray(chunk, dtype=np.float64)
+        mean = chunk.mean()
+        return chunk.size, mean, np.square(chunk - mean).sum()
+    
+    def update(self, X: np.ndarray, chunk_size: int = 1024):
+        """
+        Add samples to the statistics
+        
+        Args:
+            X: Image data (any dtype, typically uint8)
+            chunk_size: Number of samples converted to float64 at a time
+        """
+        for start in range(0, len(X), chunk_size):
+            n_b, mean_b, m2_b = self._chunk_stats(X[start:start + chunk_size])
+            if n_b == 0:
+                continue
+            n = self.count + n_b
+            delta = mean_b - self.mean
+            self.mean += delta * n_b / n
+            self.m2 += m2_b + delta ** 2 * self.count * n_b / n
+            self.count = n
+    
+    def remove(self, X: np.ndarray, chunk_size: int = 1024):
+        """
+        Take previously added samples out of the statistics
+        
+        Args:
+            X: Image data that was passed to update() before
+            chunk_size: Number of samples converted to float64 at a time
+        """
+        for start in range(0, len(X), chunk_size):
+            n_b, mean_b, m2_b = self._chunk_stats(X[start:start + chunk_size])
+            if n_b == 0:
+                continue
+            n = self.count - n_b
+            if n <= 0:
+                self.count, self.mean, self.m2 = 0, 0.0, 0.0
+                continue
+            mean = (self.count * self.mean - n_b * mean_b) / n
+            delta = mean_b - mean
+            self.m2 = max(self.m2 - m2_b - delta ** 2 * n * n_b / self.count, 0.0)
+            self.mean = mean
+            self.count = n
+    
+    @property
+    def std(self) -> float:
+        """Population standard deviation"""
+        return float(np.sqrt(self.m2 / self.count)) if self.count else 0.0
+    
+    def save(self, stats_path: Optional[Path] = None) -> Path:
+        """Save as training statistics (readable by load_train_stats)"""
+        return save_train_stats(self.mean, self.std, stats_path, count=self.count, m2=self.m2)
+    
+    @classmethod
+    def load(cls, stats_path: Optional[Path] = None) -> Optional['RunningStats']:
+        """
+        Load statistics saved by save()
+        
+        Returns:
+            The statistics, or None if the file does not exist or was
+            written without the running totals
+        """
+        stats_path = Path(stats_path or get_models_dir() / 'train_stats.npz')
+        if not stats_path.exists():
+            return None
+        stats = np.load(stats_path)
+        if 'count' not in stats or 'm2' not in stats:
+            return None
+        return cls(stats['count'], stats['mean'], stats['m2'])
+
+def save_train_stats(mean: float, std: float, stats_path: Optional[Path] = None, **extra) -> Path:
+    """
+    Save training statistics used for standardization
+    
+    Args:
+        mean: Mean pixel value of the training data
+        std: Pixel standard deviation of the training data
+        stats_path: Output file (defaults to models/train_stats.npz)
+        **extra: Additional values to store (e.g. running totals)
+        
+    Returns:
+        Path of the saved file
+    """
+    if stats_path is None:
+        models_dir = get_models_dir()
+        models_dir.mkdir(exist_ok=True, parents=True)
+        stats_path = models_dir / 'train_stats.npz'
+    np.savez(stats_path, mean=mean, std=std, **extra)
+    return Path(stats_path)
+
+def load_train_stats(stats_path: Optional[Path] = None) -> Tuple[np.float32, np.float32]:
+    """
+    Load training statistics
+    
+    Args:
+        stats_path: Statistics file (defaults to models/train_stats.npz)
+        
+    Returns:
+        (mean, std) as float32 scalars
+    """
+    stats = np.load(stats_path or get_models_dir() / 'train_stats.npz')
+    return np.float32(stats['mean']), np.float32(stats['std'])
+
+def standardize(X: np.ndarray, mean: float, std: float) -> np.ndarray:
+    """
+    Standardize image data in float32
+    
+    Args:
+        X: Raw image data (typically uint8)
+        mean: Training mean
+        std: Training standard deviation
+        
+    Returns:
+        float32 array of (X - mean) / std
+    """
+    X = np.asarray(X, dtype=np.float32)
+    return (X - np.float32(mean)) / np.float32(std)
+
+def destandardize(X: np.ndarray, mean: float, std: float) -> np.ndarray:
+    """
+    Undo ``standardize``, e.g. for legacy pickles fed to a model that
+    standardizes its input itself
+    
+    Args:
+        X: Standardized image data
+        mean: Training mean the data was standardized with
+        std: Training standard deviation the data was standardized with
+        
+    Returns:
+        float32 array of X * std + mean
+    """
+    X = np.asarray(X, dtype=np.float32)
+    return X * np.float32(std) + np.float32(mean)
+
+def grouped_split(index: np.ndarray, test_size: float = 0.1,
+                  random_state: int = 42) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Split samples into train/test so that no recording is on both sides
+    
+    Whole recordings are assigned to a split with ``train_test_split``,
+    stratified by their label; only the index is touched, never pixel data.
+    
+    Args:
+        index: Structured array with recording_id and label fields
+            (see dataset.build_index)
+        test_size: Fraction of recordings to use for testing
+        random_state: Random seed for reproducibility
+        
+    Returns:
+        (train_indices, test_indices): Sorted sample indices of each split
+    """
+    from sklearn.model_selection import train_test_split
+    
+    recordings, first, inverse = np.unique(
+        index['recording_id'].astype(str), return_index=True, return_inverse=True)
+    recording_labels = index['label'][first]
+    train_recordings, test_recordings = train_test_split(
+        np.arange(len(recordings)), test_size=test_size, random_state=random_state,
+        stratify=recording_labels
+    )
+    is_test = np.zeros(len(recordings), dtype=bool)
+    is_test[test_recordings] = True
+    return np.flatnonzero(~is_test[inverse]), np.flatnonzero(is_test[inverse])
+
+def preprocess_data(X: np.ndarray, y: np.ndarray, test_size: float = 0.1, random_state: int = 42,
+                    index: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Split data into train/test sets and save the training statistics
+    
+    Only index arrays are returned; the caller gathers the pixel data of
+    each split when it is written (see ``SpectrogramStore.write``).
+    Standardization with the saved statistics is applied when the data is
+    loaded for training, evaluation or prediction (see ``standardize``).
     
     Args:
         X: Image data
         y: Labels
         test_size: Fraction of data to use for testing
         random_state: Random seed for reproducibility
+        index: Per-sample (recording_id, syllable_idx, label) index. When
+            given, recordings are assigned by a hash of their id like the
+            incremental build (incremental.split_by_hash), so both build
+            modes hold out the same recordings; otherwise individual samples
+            are split.
         
     Returns:
-        (X_train, y_train), (X_test, y_test): Train and test splits
+        (train_indices, test_indices): Sample indices of each split; the
+        training indices are shuffled with random_state so the training
+        store is not written category by category
     """
-    # Split data first
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=test_size, random_state=random_state, stratify=y
-    )
+    if index is not None:
+        from birdsong_classification.data.incremental import split_by_hash
+        train_idx, test_idx = split_by_hash(index['recording_id'].astype(str), test_size)
+    else:
+        from sklearn.model_selection import train_test_split
+        train_idx, test_idx = train_test_split(
+            np.arange(len(y)), test_size=test_size, random_state=random_state, stratify=y
+        )
+    
+    train_idx = np.random.default_rng(random_state).permutation(train_idx)
     
     # Calculate mean and std from training data
-    train_mean = np.mean(X_train)
-    train_std = np.std(X_train)
+    train_mean, train_std = compute_stats(X, indices=train_idx)
     
     # Save training statistics
-    models_dir = get_models_dir()
-    models_dir.mkdir(exist_ok=True, parents=True)
-    np.savez(
-        models_dir / 'train_stats.npz',
-        mean=train_mean,
-        std=train_std
-    )
-    print(f"Saved training statistics to {models_dir/'train_stats.npz'}")
-    
-    # Standardize both sets using training statistics
-    X_train = (X_train - train_mean) / train_std
-    X_test = (X_test - train_mean) / train_std
+    stats_path = save_train_stats(train_mean, train_std)
+    print(f"Saved training statistics to {stats_path}")
     
-    return (X_train, y_train), (X_test, y_test)
\ No newline at end of file
+    return train_idx, test_idx
@@ -0,0 +1,449 @@
+# src/birdsong_classification/data/store.py
+"""
+Memory-mapped, sharded storage for processed spectrograms
+
+A store is a directory with a ``manifest.json`` and one ``X-<n>.npy`` /
+``y-<n>.npy`` pair per shard. Shards are opened with ``np.load(mmap_mode='r')``
+so loading a store is instant and only the rows that are actually accessed
+are read from disk. A store can be indexed like an array (``store[i]``,
+``store[a:b]``, ``store[indices]``); only the selected rows are read.
+
+New stores are built in a staging directory next to their final location
+and moved into place by ``commit()``, so an interrupted rebuild leaves the
+previous store intact.
+"""
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+FORMAT_NAME = "birdsong-spectrogram-store"
+FORMAT_VERSION = 1
+
+
+def _atomic_save(path: Path, array: np.ndarray):
+    """Write an .npy file under a temporary name and move it into place"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _atomic_save_rows(path: Path, X: np.ndarray, indices: np.ndarray, dtype: np.dtype,
+                      chunk_size: int = 1024):
+    """Gather rows of X into a new .npy file chunk by chunk, without a full copy"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype,
+                                    shape=(len(indices),) + tuple(X.shape[1:]))
+    for start in range(0, len(indices), chunk_size):
+        out[start:start + chunk_size] = X[indices[start:start + chunk_size]]
+    out.flush()
+    del out
+    os.replace(tmp_path, path)
+
+
+class SpectrogramStore:
+    """Sharded on-disk dataset of spectrogram images and labels"""
+
+    MANIFEST_NAME = "manifest.json"
+
+    def __init__(self, root: str):
+        """
+        Open an existing store
+
+        Args:
+            root: Store directory containing manifest.json
+        """
+        self.root = Path(root)
+        manifest_path = self.root / self.MANIFEST_NAME
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"No dataset manifest found at {manifest_path}")
+
+        with open(manifest_path) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != FORMAT_NAME:
+            raise ValueError(f"{manifest_path} is not a spectrogram store manifest")
+
+        self._shards = [None] * len(self.manifest["shards"])
+        self._labels = None
+        self._recording_ids = None
+        # Final location of a store staged by create()
+        self._target = None
+        self._offsets = np.concatenate(
+            ([0], np.cumsum([shard["count"] for shard in self.manifest["shards"]]))
+        ).astype(np.int64)
+
+    @classmethod
+    def exists(cls, root: str) -> bool:
+        """Check whether a directory contains a store"""
+        return (Path(root) / cls.MANIFEST_NAME).exists()
+
+    @staticmethod
+    def staging_dir(root: str) -> Path:
+        """Directory a new store for ``root`` is built in before commit()"""
+        root = Path(root)
+        return root.with_name(root.name + ".staging")
+
+    @classmethod
+    def create(cls,
+               root: str,
+               sample_shape: Sequence[int],
+               dtype: np.dtype,
+               categories: Optional[List[str]] = None) -> 'SpectrogramStore':
+        """
+        Create an empty store that will replace any store in ``root``
+
+        The store is built in staging_dir(root); samples are appended there
+        and commit() moves it into ``root``. Until then the previous store
+        is untouched, so an interrupted rebuild does not lose it.
+
+        Args:
+            root: Store directory
+            sample_shape: Shape of a single sample, e.g. (150, 150, 3)
+            dtype: Data type of the samples
+            categories: Category names indexed by label
+
+        Returns:
+            The new, empty store (staged until commit())
+        """
+        staging = cls.staging_dir(root)
+        # Left over by an interrupted rebuild
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+
+        manifest = {
+            "format": FORMAT_NAME,
+            "version": FORMAT_VERSION,
+            "sample_shape": [int(d) for d in sample_shape],
+            "dtype": np.dtype(dtype).str,
+            "label_dtype": np.dtype(np.int64).str,
+            "categories": categories,
+            "count": 0,
+            "label_counts": {},
+            "shards": [],
+        }
+        cls._write_manifest(staging, manifest)
+        store = cls(staging)
+        store._target = Path(root)
+        return store
+
+    def commit(self):
+        """
+        Move a store made by create() into its final directory
+
+        The previous store is renamed aside first and removed only after the
+        new one is in place. Does nothing for stores that were opened.
+        """
+        if self._target is None:
+            return
+        old = self._target.with_name(self._target.name + ".old")
+        shutil.rmtree(old, ignore_errors=True)
+        if self._target.exists():
+            os.rename(self._target, old)
+        os.rename(self.root, self._target)
+        shutil.rmtree(old, ignore_errors=True)
+        self.root, self._target = self._target, None
+        self._shards = [None] * self.num_shards
+
+    @classmethod
+    def write(cls,
+              root: str,
+              X: np.ndarray,
+              y: np.ndarray,
+              categories: Optional[List[str]] = None,
+              shard_size: Optional[int] = None,
+              indices: Optional[Sequence[int]] = None,
+              recording_ids: Optional[Sequence[str]] = None) -> 'SpectrogramStore':
+        """
+        Create a store from in-memory arrays, replacing any store in ``root``
+        once it is complete
+
+        Args:
+            root: Store directory
+            X: Samples of shape (n_samples, ...)
+            y: Labels of shape (n_samples,)
+            categories: Category names indexed by label
+            shard_size: Maximum number of samples per shard (None for one shard)
+            indices: Rows of X / y to write, in order (defaults to all). Rows
+                are gathered in small chunks straight into the shard files.
+            recording_ids: Recording id of every row of X / y (see
+                dataset.recording_id), kept so splits can group by recording
+
+        Returns:
+            The written store
+        """
+        store = cls.create(root, X.shape[1:], X.dtype, categories)
+        rows = np.arange(len(X)) if indices is None else np.asarray(indices, dtype=np.int64)
+        shard_size = shard_size or max(len(rows), 1)
+        for start in range(0, len(rows), shard_size):
+            store.append(X, y, rows[start:start + shard_size], recording_ids)
+        store.commit()
+        return store
+
+    @staticmethod
+    def _write_manifest(root: Path, manifest: dict):
+        tmp_path = root / (SpectrogramStore.MANIFEST_NAME + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, root / SpectrogramStore.MANIFEST_NAME)
+
+    def append(self, X: np.ndarray, y: np.ndarray, indices: Optional[Sequence[int]] = None,
+               recording_ids: Optional[Sequence[str]] = None):
+        """
+        Append samples as a new shard
+
+        The shard files are written first and the manifest is replaced last,
+        so an interrupted append leaves the store unchanged.
+
+        Args:
+            X: Samples of shape (n_samples, *sample_shape)
+            y: Labels of shape (n_samples,)
+            indices: Rows of X / y to append (defaults to all)
+            recording_ids: Recording id of every row of X / y, stored in the
+                shard's manifest entry
+        """
+        if len(X) != len(y):
+            raise ValueError(f"X and y have different lengths: {len(X)} != {len(y)}")
+        if tuple(X.shape[1:]) != self.sample_shape:
+            raise ValueError(f"Sample shape {X.shape[1:]} does not match store shape {self.sample_shape}")
+        if recording_ids is not None and len(recording_ids) != len(y):
+            raise ValueError(f"Got {len(recording_ids)} recording ids for {len(y)} samples")
+        if indices is not None:
+            indices = np.asarray(indices, dtype=np.int64)
+            y = np.asarray(y)[indices]
+            if recording_ids is not None:
+                recording_ids = np.asarray(recording_ids, dtype=object)[indices]
+        if len(y) == 0:
+            return
+
+        index = len(self.manifest["shards"])
+        shard = {"x": f"X-{index:05d}.npy", "y": f"y-{index:05d}.npy", "count": int(len(y))}
+        if recording_ids is not None:
+            shard["recording_ids"] = [str(rec_id) for rec_id in recording_ids]
+        if indices is None:
+            _atomic_save(self.root / shard["x"], np.ascontiguousarray(X, dtype=self.dtype))
+        else:
+            _atomic_save_rows(self.root / shard["x"], X, indices, self.dtype)
+        _atomic_save(self.root / shard["y"], np.asarray(y, dtype=np.int64))
+
+        manifest = dict(self.manifest)
+        manifest["shards"] = self.manifest["shards"] + [shard]
+        manifest["count"] = self.manifest["count"] + shard["count"]
+        label_counts = dict(manifest["label_counts"])
+        for label, count in zip(*np.unique(y, return_counts=True)):
+            label_counts[str(label)] = label_counts.get(str(label), 0) + int(count)
+        manifest["label_counts"] = label_counts
+        self._write_manifest(self.root, manifest)
+
+        self.manifest = manifest
+        self._shards.append(None)
+        self._labels = None
+        self._recording_ids = None
+        self._offsets = np.append(self._offsets, self._offsets[-1] + shard["count"])
+
+    def truncate(self, count: int):
+        """
+        Drop the shards after the first ``count`` samples
+
+        Used to roll back appends that a caller did not record, e.g. after an
+        interrupted incremental build. The manifest is replaced before the
+        dropped shard files are removed.
+
+        Args:
+            count: Number of samples to keep; must be a shard boundary
+        """
+        num_shards = int(np.searchsorted(self._offsets, count))
+        if num_shards >= len(self._offsets) or self._offsets[num_shards] != count:
+            raise ValueError(f"{count} is not a shard boundary of the store at {self.root}")
+        if num_shards == self.num_shards:
+            return
+
+        kept, dropped = self.manifest["shards"][:num_shards], self.manifest["shards"][num_shards:]
+        label_counts = {}
+        for i in range(num_shards):
+            for label, label_count in zip(*np.unique(self.shard(i)[1], return_counts=True)):
+                label_counts[str(label)] = label_counts.get(str(label), 0) + int(label_count)
+        manifest = dict(self.manifest, shards=kept, count=int(count), label_counts=label_counts)
+        self._write_manifest(self.root, manifest)
+
+        self.manifest = manifest
+        self._shards = self._shards[:num_shards]
+        self._labels = None
+        self._recording_ids = None
+        self._offsets = self._offsets[:num_shards + 1]
+        for shard in dropped:
+            for key in ("x", "y"):
+                (self.root / shard[key]).unlink(missing_ok=True)
+
+    def update(self, indices: Sequence[int], X: np.ndarray):
+        """
+        Overwrite samples in place
+
+        Labels and the manifest are unchanged; only the pixels of the given
+        rows are rewritten in their shard files.
+
+        Args:
+            indices: Global sample indices
+            X: New samples of shape (len(indices), *sample_shape)
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(indices) != len(X):
+            raise ValueError(f"indices and X have different lengths: {len(indices)} != {len(X)}")
+        if len(indices) and (indices.min() < 0 or indices.max() >= len(self)):
+            raise IndexError("Sample index out of range")
+
+        shard_ids = np.searchsorted(self._offsets, indices, side="right") - 1
+        for shard_id in np.unique(shard_ids):
+            positions = np.flatnonzero(shard_ids == shard_id)
+            shard_X = np.load(self.root / self.manifest["shards"][shard_id]["x"], mmap_mode="r+")
+            shard_X[indices[positions] - self._offsets[shard_id]] = X[positions]
+            shard_X.flush()
+            del shard_X
+            # Drop the cached read-only map so the new rows are picked up
+            self._shards[shard_id] = None
+
+    def __len__(self) -> int:
+        return int(self.manifest["count"])
+
+    def __getitem__(self, key) -> np.ndarray:
+        """
+        Read samples like an array: an integer, a slice or a sequence of
+        global indices (see take)
+        """
+        if isinstance(key, (int, np.integer)):
+            index = int(key) + len(self) if key < 0 else int(key)
+            if not 0 <= index < len(self):
+                raise IndexError(f"Sample index {key} out of range for {len(self)} samples")
+            return self.take([index])[0]
+        if isinstance(key, slice):
+            return self.take(np.arange(len(self))[key])
+        return self.take(key)
+
+    @property
+    def sample_shape(self) -> Tuple[int, ...]:
+        return tuple(self.manifest["sample_shape"])
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return (len(self),) + self.sample_shape
+
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype(self.manifest["dtype"])
+
+    @property
+    def categories(self) -> Optional[List[str]]:
+        return self.manifest.get("categories")
+
+    @property
+    def num_shards(self) -> int:
+        return len(self.manifest["shards"])
+
+    def shard(self, index: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Memory-map one shard
+
+        Args:
+            index: Shard index
+
+        Returns:
+            X: Read-only memmap of the shard's samples
+            y: Labels of the shard
+        """
+        if self._shards[index] is None:
+            info = self.manifest["shards"][index]
+            self._shards[index] = (
+                np.load(self.root / info["x"], mmap_mode="r"),
+                np.load(self.root / info["y"]),
+            )
+        return self._shards[index]
+
+    @property
+    def labels(self) -> np.ndarray:
+        """All labels (small enough to keep in memory)"""
+        if self._labels is None:
+            if self.num_shards:
+                self._labels = np.concatenate([self.shard(i)[1] for i in range(self.num_shards)])
+            else:
+                self._labels = np.empty(0, dtype=np.int64)
+        return self._labels
+
+    @property
+    def recording_ids(self) -> Optional[np.ndarray]:
+        """
+        Recording id of every sample, or None if any shard was written
+        without them (stores from older versions)
+        """
+        if self._recording_ids is None:
+            shards = self.manifest["shards"]
+            if any("recording_ids" not in shard for shard in shards):
+                return None
+            self._recording_ids = np.array(
+                [rec_id for shard in shards for rec_id in shard["recording_ids"]], dtype=object)
+        return self._recording_ids
+
+    def as_array(self) -> np.ndarray:
+        """
+        All samples as a single array
+
+        Returns a zero-copy memmap for single-shard stores; stores with several
+        shards are concatenated into memory, so use indexing, take() or
+        iter_batches() for stores that may not fit in RAM.
+        """
+        if self.num_shards == 1:
+            return self.shard(0)[0]
+        if self.num_shards == 0:
+            return np.empty((0,) + self.sample_shape, dtype=self.dtype)
+        return np.concatenate([self.shard(i)[0] for i in range(self.num_shards)])
+
+    def take(self, indices: Sequence[int]) -> np.ndarray:
+        """
+        Gather samples by global index, preserving the order of ``indices``
+
+        Rows are read shard by shard in ascending order so access to the
+        memory-mapped files stays sequential.
+
+        Args:
+            indices: Global sample indices
+
+        Returns:
+            Array of shape (len(indices), *sample_shape)
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        out = np.empty((len(indices),) + self.sample_shape, dtype=self.dtype)
+        shard_ids = np.searchsorted(self._offsets, indices, side="right") - 1
+        for shard_id in np.unique(shard_ids):
+            positions = np.flatnonzero(shard_ids == shard_id)
+            local = indices[positions] - self._offsets[shard_id]
+            order = np.argsort(local, kind="stable")
+            out[positions[order]] = self.shard(shard_id)[0][local[order]]
+        return out
+
+    def iter_batches(self,
+                     batch_size: int = 64,
+                     indices: Optional[Sequence[int]] = None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Iterate over samples in batches
+
+        Args:
+            batch_size: Number of samples per batch
+            indices: Global indices to iterate over (defaults to all, in order)
+
+        Yields:
+            (X_batch, y_batch) tuples
+        """
+        if indices is None:
+            for i in range(self.num_shards):
+                X, y = self.shard(i)
+                for start in range(0, len(X), batch_size):
+                    yield np.asarray(X[start:start + batch_size]), y[start:start + batch_size]
+            return
+
+        indices = np.asarray(indices, dtype=np.int64)
+        labels = self.labels
+        for start in range(0, len(indices), batch_size):
+            batch = indices[start:start + batch_size]
+            yield self.take(batch), labels[batch]
@@ -1,16 +1,24 @@
 # src/birdsong_classification/evaluation/evaluate.py
+import argparse
 from pathlib import Path
-import numpy as np
 
 from birdsong_classification.data.dataset import BirdSongDataset
-from birdsong_classification.models.model import BirdSongClassifier
-from birdsong_classification.utils.visualization import Visualizer
+from birdsong_classification.data.preprocessing import destandardize, load_train_stats
+from birdsong_classification.data.store import SpectrogramStore
+from birdsong_classification.evaluation.metrics import MetricsAccumulator, classification_report
 from birdsong_classification.utils.path_utils import get_data_dir, get_models_dir, get_results_dir
-import sklearn.metrics
 # Use lowercase for directories to match actual folder names
 CATEGORIES = ["common_chaffinch", "eurasian_blue_tit", "house_sparrow"]
 
 def main():
+    parser = argparse.ArgumentParser(description='Evaluate the trained model on the test set')
+    parser.parse_args()
+    
+    # TensorFlow is only imported once the arguments are parsed
+    import tensorflow as tf
+    from birdsong_classification.data.pipeline import store_dataset
+    from birdsong_classification.models.model import BirdSongClassifier
+    
     # Get directories using utility functions
     data_dir = get_data_dir() / "processed" / "test"
     models_dir = get_models_dir()
@@ -21,47 +29,60 @@ def main():
     print(f"Saving results to: {results_dir}")
     
     try:
-        # Load test data
-        X, y = BirdSongDataset.load_pickle_data(data_dir)
-        print(f"Loaded {len(X)} test samples")
-        
         # Load model
         model_path = models_dir / "birdsong_classifier.h5"
         model = BirdSongClassifier.load(model_path)
         print("Model loaded successfully")
         
+        # Load test data; older models without embedded preprocessing
+        # need standardized input
+        if SpectrogramStore.exists(data_dir):
+            # Stream batches from the memory-mapped store
+            store = BirdSongDataset.load_store(data_dir)
+            stats = None if model.includes_preprocessing else load_train_stats()
+            num_samples = len(store)
+            test_data = store_dataset(store, stats=stats)
+        else:
+            # Legacy pickle files are loaded into memory and hold standardized
+            # data; models that standardize themselves get it undone
+            X, y = BirdSongDataset.load_standardized_data(data_dir)
+            if model.includes_preprocessing:
+                X = destandardize(X, *load_train_stats())
+            num_samples = len(y)
+            test_data = tf.data.Dataset.from_tensor_slices((X, y)).batch(64)
+        print(f"Loaded {num_samples} test samples")
+        
+        # Single streamed forward pass; batches are folded into the
+        # confusion matrix and loss sums, every metric below derives from them
+        print("\nGenerating predictions...")
+        accumulator = MetricsAccumulator(len(CATEGORIES))
+        for X_batch, y_batch in test_data:
+            accumulator.update(y_batch.numpy(), probabilities=model.predict_on_batch(X_batch))
+        metrics = accumulator.result(CATEGORIES)
+        
+        # Keras' evaluate() reports the loss including weight regularization
+        regularization_loss = model.regularization_loss()
+        
         # Overall evaluation
-        loss, acc = model.evaluate(X, y)
         print(f"\nOverall Evaluation:")
-        print(f"Loss: {loss:.4f}")
-        print(f"Accuracy: {acc:.4f}")
+        print(f"Loss: {metrics['loss'] + regularization_loss:.4f}")
+        print(f"Accuracy: {metrics['accuracy']:.4f}")
         
         # Evaluate by species
         species_accuracies = {}
         print("\nEvaluation by Species:")
-        for class_idx, category in enumerate(CATEGORIES):
-            # Get indices for current species
-            species_mask = (y == class_idx)
-            X_species = X[species_mask]
-            y_species = y[species_mask]
-            
-            # Evaluate
-            loss, acc = model.evaluate(X_species, y_species)
+        for category in CATEGORIES:
+            class_metrics = metrics['per_class'][category]
             print(f"{category}:")
-            print(f"  Samples: {len(X_species)}")
-            print(f"  Loss: {loss:.4f}")
-            print(f"  Accuracy: {acc:.4f}")
-            species_accuracies[category] = acc
-        
-        # Generate predictions and confusion matrix
-        print("\nGenerating predictions and plotting results...")
-        predictions = model.predict(X)
-        pred_classes = np.argmax(predictions, axis=1)
+            print(f"  Samples: {class_metrics['support']}")
+            print(f"  Loss: {class_metrics['loss'] + regularization_loss:.4f}")
+            print(f"  Accuracy: {class_metrics['accuracy']:.4f}")
+            species_accuracies[category] = class_metrics['accuracy']
         
-        # Create confusion matrix
-        conf_matrix = sklearn.metrics.confusion_matrix(y, pred_classes)
+        conf_matrix = metrics['confusion_matrix']
         
-        # Create visualizations
+        # Create visualizations (matplotlib is only imported when plotting)
+        from birdsong_classification.utils.visualization import Visualizer
         visualizer = Visualizer()
         
         # Plot and save confusion matrix
@@ -79,11 +100,7 @@ def main():
         
         # Additional metrics
         print("\nDetailed Classification Report:")
-        print(sklearn.metrics.classification_report(
-            y, pred_classes,
-            target_names=CATEGORIES,
-            digits=4
-        ))
+        print(classification_report(metrics, digits=4))
         
         print(f"\nResults saved to {results_dir}")
         
@@ -1,9 +1,118 @@
 # src/birdsong_classification/evaluation/metrics.py
 import numpy as np
-from typing import Dict, List
-import sklearn.metrics
+from typing import Dict, List, Optional
 
-def calculate_metrics(y_true: np.ndarray, y_pred: np.ndarray, categories: List[str]) -> Dict:
+# Probability clipping used by Keras' cross-entropy
+EPSILON = 1e-7
+
+def cross_entropy(y_true: np.ndarray, probabilities: np.ndarray) -> np.ndarray:
+    """
+    Per-sample sparse categorical cross-entropy
+    
+    Args:
+        y_true: True labels
+        probabilities: Predicted probabilities of shape (n_samples, n_classes)
+        
+    Returns:
+        Loss of each sample
+    """
+    p = probabilities[np.arange(len(y_true)), y_true]
+    return -np.log(np.clip(p, EPSILON, 1 - EPSILON))
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray, fill: float = 0.0) -> np.ndarray:
+    numerator = np.asarray(numerator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.full(numerator.shape, fill), where=denominator != 0)
+
+class MetricsAccumulator:
+    """
+    Streaming classification metrics
+    
+    Batches are folded into a confusion matrix (and per-class loss sums when
+    probabilities are given), so evaluating a streamed test set never needs
+    the full prediction arrays in memory. All metrics are derived from the
+    C x C confusion matrix.
+    """
+    
+    def __init__(self, num_classes: int):
+        """
+        Initialize accumulator
+        
+        Args:
+            num_classes: Number of classes
+        """
+        self.num_classes = num_classes
+        self.confusion_matrix = np.zeros((num_classes, num_classes), dtype=np.int64)
+        self.loss_sums = np.zeros(num_classes)
+        self.has_loss = False
+    
+    def update(self, y_true: np.ndarray, y_pred: Optional[np.ndarray] = None,
+               probabilities: Optional[np.ndarray] = None):
+        """
+        Add a batch
+        
+        Args:
+            y_true: True labels of the batch
+            y_pred: Predicted labels (derived from probabilities if omitted)
+            probabilities: Predicted probabilities of shape (n_samples, n_classes)
+        """
+        y_true = np.asarray(y_true, dtype=np.int64)
+        if y_pred is None:
+            if probabilities is None:
+                raise ValueError("Either y_pred or probabilities is required")
+            y_pred = np.argmax(probabilities, axis=1)
+        y_pred = np.asarray(y_pred, dtype=np.int64)
+        
+        C = self.num_classes
+        self.confusion_matrix += np.bincount(y_true * C + y_pred, minlength=C * C).reshape(C, C)
+        
+        if probabilities is not None:
+            self.loss_sums += np.bincount(y_true, weights=cross_entropy(y_true, probabilities), minlength=C)
+            self.has_loss = True
+    
+    def result(self, categories: List[str]) -> Dict:
+        """
+        Compute metrics from the accumulated confusion matrix
+        
+        Args:
+            categories: List of category names
+            
+        Returns:
+            Dictionary with the same layout as calculate_metrics
+        """
+        cm = self.confusion_matrix
+        true_positives = np.diag(cm)
+        support = cm.sum(axis=1)
+        predicted = cm.sum(axis=0)
+        
+        precision = _safe_divide(true_positives, predicted)
+        recall = _safe_divide(true_positives, support)
+        f1 = _safe_divide(2 * precision * recall, precision + recall)
+        
+        metrics = {
+            'confusion_matrix': cm.copy(),
+            'accuracy': float(true_positives.sum() / max(cm.sum(), 1)),
+        }
+        if self.has_loss:
+            metrics['loss'] = float(self.loss_sums.sum() / max(cm.sum(), 1))
+            class_losses = _safe_divide(self.loss_sums, support, fill=np.nan)
+        
+        metrics['per_class'] = {}
+        for i, category in enumerate(categories):
+            metrics['per_class'][category] = {
+                'precision': precision[i],
+                'recall': recall[i],
+                'f1': f1[i],
+                'support': int(support[i]),
+                # Accuracy on the samples of this class equals its recall
+                'accuracy': recall[i]
+            }
+            if self.has_loss:
+                metrics['per_class'][category]['loss'] = float(class_losses[i])
+        
+        return metrics
+
+def calculate_metrics(y_true: np.ndarray, y_pred: np.ndarray, categories: List[str],
+                      probabilities: Optional[np.ndarray] = None) -> Dict:
     """
     Calculate various classification metrics
     
@@ -11,23 +120,43 @@ def calculate_metrics(y_true: np.ndarray, y_pred: np.ndarray, categories: List[s
         y_true: True labels
         y_pred: Predicted labels
         categories: List of category names
+        probabilities: Predicted probabilities (optional). When given, the
+            overall and per-class cross-entropy loss is included.
         
     Returns:
         Dictionary containing various metrics
     """
-    metrics = {}
+    accumulator = MetricsAccumulator(len(categories))
+    accumulator.update(y_true, y_pred, probabilities)
+    return accumulator.result(categories)
+
+def classification_report(metrics: Dict, digits: int = 4) -> str:
+    """
+    Format metrics like sklearn.metrics.classification_report
+    
+    Args:
+        metrics: Output of calculate_metrics or MetricsAccumulator.result
+        digits: Number of digits for floating point values
+        
+    Returns:
+        Text report
+    """
+    per_class = metrics['per_class']
+    width = max(len(name) for name in list(per_class) + ['weighted avg'])
+    headers = ["precision", "recall", "f1-score", "support"]
+    lines = [f"{'':>{width}s} " + "".join(f" {h:>9s}" for h in headers), ""]
     
-    # Basic metrics
-    metrics['confusion_matrix'] = sklearn.metrics.confusion_matrix(y_true, y_pred)
-    metrics['accuracy'] = sklearn.metrics.accuracy_score(y_true, y_pred)
+    def row(name, values, support):
+        return f"{name:>{width}s} " + "".join(f" {v:>9.{digits}f}" for v in values) + f" {support:>9d}"
     
-    # Per-class metrics
-    metrics['per_class'] = {}
-    for i, category in enumerate(categories):
-        metrics['per_class'][category] = {
-            'precision': sklearn.metrics.precision_score(y_true, y_pred, average=None)[i],
-            'recall': sklearn.metrics.recall_score(y_true, y_pred, average=None)[i],
-            'f1': sklearn.metrics.f1_score(y_true, y_pred, average=None)[i]
-        }
+    for name, m in per_class.items():
+        lines.append(row(name, (m['precision'], m['recall'], m['f1']), m['support']))
+    lines.append("")
     
-    return metrics
\ No newline at end of file
+    supports = np.array([m['support'] for m in per_class.values()])
+    scores = np.array([[m['precision'], m['recall'], m['f1']] for m in per_class.values()])
+    total = int(supports.sum())
+    lines.append(f"{'accuracy':>{width}s} " + " " * 20 + f" {metrics['accuracy']:>9.{digits}f} {total:>9d}")
+    lines.append(row('macro avg', scores.mean(axis=0), total))
+    lines.append(row('weighted avg', supports @ scores / max(total, 1), total))
+    return "\n".join(lines)
@@ -0,0 +1,527 @@
+# python/src/birdsong_classification/live.py
+"""
+Live detection from a continuous PCM stream
+
+Reads raw mono PCM (16-bit little-endian by default) from stdin or a FIFO,
+keeps the most recent audio in a ring buffer, runs the streaming syllable
+detector incrementally and classifies each detected syllable. Detections
+are written to stdout as JSON lines.
+
+When inference falls behind, the ``drop`` policy discards the oldest
+waiting syllables and any syllable older than the latency budget, and the
+audio ring buffer overwrites samples that were not read yet; detection then
+restarts after the gap, so time stamps stay correct. The ``queue`` policy
+keeps every syllable and every sample: reading from the input pauses while
+the ring buffer is full, so the producer is blocked instead.
+
+Syllables are rendered in memory only if an agreement report
+(audio/agreement.py) accepts that featurizer for the model; ``--matlab``
+renders them with the MATLAB engine instead, at a much higher latency.
+
+Usage:
+    arecord -f S16_LE -r 22050 -c 1 -t raw | python -m birdsong_classification.live listen
+    python -m birdsong_classification.live replay recording.wav | \\
+        python -m birdsong_classification.live listen
+"""
+import argparse
+import asyncio
+import json
+import os
+import stat
+import sys
+import threading
+import time
+import wave
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from birdsong_classification.audio import constants
+from birdsong_classification.audio.agreement import MIN_RECORDING_AGREEMENT, featurizer_for_model
+from birdsong_classification.audio.streaming import StreamingFilter, StreamingSegmenter, SyllableEvent
+from birdsong_classification.models.backend import load_backend
+from birdsong_classification.predict import CATEGORIES
+from birdsong_classification.utils.path_utils import get_models_dir
+
+POLICIES = ('drop', 'queue')
+_EOF = None
+
+
+class RingBuffer:
+    """
+    Fixed-capacity sample buffer that overwrites the oldest samples when full
+
+    Overwritten samples are counted in ``dropped`` and skipped by the read
+    offset, so a reader can tell where its samples belong in the stream.
+    """
+
+    def __init__(self, capacity: int):
+        """
+        Initialize buffer
+
+        Args:
+            capacity: Maximum number of buffered samples
+        """
+        self._data = np.zeros(capacity, dtype=np.float32)
+        self._start = 0
+        self._size = 0
+        self.dropped = 0
+        self.written = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def free(self) -> int:
+        """Number of samples that can be written without overwriting unread ones"""
+        return len(self._data) - self._size
+
+    @property
+    def read_offset(self) -> int:
+        """Position in the stream (samples written so far) of the next sample read() returns"""
+        return self.written - self._size
+
+    def write(self, samples: np.ndarray):
+        """Append samples, dropping the oldest ones if the buffer overflows"""
+        capacity = len(self._data)
+        self.written += len(samples)
+        if len(samples) >= capacity:
+            self.dropped += self._size + len(samples) - capacity
+            self._data[:] = samples[-capacity:]
+            self._start, self._size = 0, capacity
+            return
+        overflow = max(self._size + len(samples) - capacity, 0)
+        if overflow:
+            self.dropped += overflow
+            self._start = (self._start + overflow) % capacity
+            self._size -= overflow
+        end = (self._start + self._size) % capacity
+        first = min(len(samples), capacity - end)
+        self._data[end:end + first] = samples[:first]
+        self._data[:len(samples) - first] = samples[first:]
+        self._size += len(samples)
+
+    def read(self) -> np.ndarray:
+        """Remove and return all buffered samples"""
+        indices = (self._start + np.arange(self._size)) % len(self._data)
+        samples = self._data[indices]
+        self._start, self._size = 0, 0
+        return samples
+
+
+class _Pending(NamedTuple):
+    event: SyllableEvent
+    detected_at: float
+
+
+class LiveDetector:
+    """Asyncio pipeline: PCM reader -> ring buffer -> detector -> classifier"""
+
+    def __init__(self,
+                 model_path: Optional[str] = None,
+                 stats_path: Optional[str] = None,
+                 sample_rate: int = constants.DEFAULT_FS,
+                 sample_format: str = 'int16',
+                 batch_size: int = 16,
+                 max_queue: int = 32,
+                 policy: str = 'drop',
+                 latency_budget_ms: float = 500.0,
+                 ring_seconds: float = 10.0,
+                 hop_seconds: float = 0.25,
+                 emit: Callable[[Dict], None] = None,
+                 categories: List[str] = CATEGORIES,
+                 use_matlab: bool = False,
+                 agreement_report: Optional[str] = None,
+                 min_agreement: float = MIN_RECORDING_AGREEMENT):
+        """
+        Load model and set up the pipeline
+
+        Args:
+            model_path: Path to the trained model (defaults to models/birdsong_classifier.h5)
+            stats_path: Training statistics, only needed for models without embedded
+                preprocessing (defaults to models/train_stats.npz)
+            sample_rate: Sampling frequency of the incoming PCM
+            sample_format: 'int16' or 'float32' little-endian samples
+            batch_size: Maximum number of syllables per forward pass
+            max_queue: Maximum number of syllables waiting for the classifier
+            policy: 'drop' or 'queue' (see module docstring)
+            latency_budget_ms: Time from detection to result; with 'drop' older
+                syllables are skipped, with 'queue' late results are flagged
+            ring_seconds: Capacity of the audio ring buffer
+            hop_seconds: Audio processed per filter step (adds to the latency)
+            emit: Called with every output record (defaults to JSON lines on stdout)
+            categories: Category names indexed by class
+            use_matlab: Render spectrograms with the MATLAB engine
+            agreement_report: Agreement report that must accept the in-memory
+                featurizer for this model (defaults to <model>.agreement.json)
+            min_agreement: Minimum recording-level agreement of that report
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy '{policy}'. Available: {POLICIES}")
+        if sample_format not in ('int16', 'float32'):
+            raise ValueError(f"Unknown sample format '{sample_format}'")
+
+        model_path = model_path or get_models_dir() / "birdsong_classifier.h5"
+        self.model = load_backend(model_path, stats_path=stats_path)
+        height, _, channels = self.model.input_shape
+        self.featurizer = featurizer_for_model(self.model, model_path, use_matlab,
+                                               agreement_report, min_agreement)
+
+        self.sample_rate = sample_rate
+        self.dtype = np.dtype('<i2') if sample_format == 'int16' else np.dtype('<f4')
+        self.batch_size = batch_size
+        self.policy = policy
+        self.latency_budget = latency_budget_ms / 1000
+        self.emit = emit or (lambda record: print(json.dumps(record), flush=True))
+        self.categories = categories
+
+        self.ring = RingBuffer(int(ring_seconds * sample_rate))
+        self._hop_seconds = hop_seconds
+        self._reset_detector(0)
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self._data_ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._eof = False
+
+        self.votes = np.zeros(len(categories), dtype=np.int64)
+        self.counters = {'detections': 0, 'dropped_syllables': 0, 'late': 0}
+        self._latencies = []
+
+        # Warm up so the first syllable does not pay for tracing
+        self.model.predict_on_batch(np.zeros((1, height, height, channels), dtype=np.float32))
+
+    def _reset_detector(self, offset: int):
+        """Start detecting afresh at a sample offset of the input stream"""
+        self.filter = StreamingFilter(self.sample_rate, constants.DEFAULT_FS,
+                                      hop_seconds=self._hop_seconds, context_seconds=0.1)
+        # An endless stream has no overall maximum and never reaches the
+        # pairs of ends, so only pairs of starts are detected
+        self.segmenter = StreamingSegmenter(constants.DEFAULT_FS, end_pairs=False)
+        self._offset = offset
+        self._time_offset = offset / self.sample_rate
+
+    async def _write(self, samples: np.ndarray):
+        if self.policy == 'drop':
+            self.ring.write(samples)
+            self._data_ready.set()
+            return
+        # Never overwrite unread audio: wait for the detector to make room,
+        # which also stops reading from the input
+        while len(samples):
+            while not self.ring.free:
+                self._space.clear()
+                await self._space.wait()
+            count = min(self.ring.free, len(samples))
+            self.ring.write(samples[:count])
+            samples = samples[count:]
+            self._data_ready.set()
+
+    async def _read(self, reader: asyncio.StreamReader):
+        remainder = b''
+        while True:
+            data = await reader.read(1 << 14)
+            if not data:
+                break
+            data = remainder + data
+            usable = len(data) - len(data) % self.dtype.itemsize
+            remainder = data[usable:]
+            samples = np.frombuffer(data[:usable], dtype=self.dtype).astype(np.float32)
+            if self.dtype.kind == 'i':
+                samples /= 32768.0
+            await self._write(samples)
+        self._eof = True
+        self._data_ready.set()
+
+    def _finish(self) -> List[SyllableEvent]:
+        return self.segmenter.push(self.filter.flush()) + self.segmenter.flush()
+
+    def _detect(self, samples: np.ndarray, offset: int, final: bool) -> List[SyllableEvent]:
+        events = []
+        if offset > self._offset:
+            # Samples were overwritten before they were read: close the
+            # syllables before the gap and start again after it
+            events += [self._shift(event) for event in self._finish()]
+            self._reset_detector(offset)
+        self._offset += len(samples)
+        events += [self._shift(event)
+                   for event in self.segmenter.push(self.filter.push(samples.astype(np.float64)))]
+        if final:
+            events += [self._shift(event) for event in self._finish()]
+        return events
+
+    def _shift(self, event: SyllableEvent) -> SyllableEvent:
+        """Event times relative to the start of the input stream"""
+        return event._replace(start=event.start + self._time_offset, end=event.end + self._time_offset)
+
+    async def _enqueue(self, item):
+        if self.policy == 'drop' and item is not _EOF and self.queue.full():
+            self.queue.get_nowait()
+            self.counters['dropped_syllables'] += 1
+        await self.queue.put(item)
+
+    async def _run_detector(self):
+        while True:
+            await self._data_ready.wait()
+            self._data_ready.clear()
+            final = self._eof
+            offset = self.ring.read_offset
+            samples = self.ring.read()
+            self._space.set()
+            if len(samples) or final:
+                events = await asyncio.to_thread(self._detect, samples, offset, final)
+                now = time.monotonic()
+                for event in events:
+                    await self._enqueue(_Pending(event, now))
+            if final:
+                await self._enqueue(_EOF)
+                return
+
+    def _predict(self, events: List[SyllableEvent]) -> np.ndarray:
+        X = self.featurizer(np.stack([event.samples for event in events]))
+        return self.model.predict_on_batch(X)
+
+    async def _run_classifier(self):
+        done = False
+        while not done:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            if batch[-1] is _EOF:
+                done = True
+                batch.pop()
+
+            if self.policy == 'drop':
+                now = time.monotonic()
+                fresh = [item for item in batch if now - item.detected_at <= self.latency_budget]
+                self.counters['dropped_syllables'] += len(batch) - len(fresh)
+                batch = fresh
+            if not batch:
+                continue
+
+            probabilities = await asyncio.to_thread(self._predict, [item.event for item in batch])
+            now = time.monotonic()
+            for item, probs in zip(batch, probabilities):
+                pred_class = int(np.argmax(probs))
+                latency = now - item.detected_at
+                late = latency > self.latency_budget
+                self.votes[pred_class] += 1
+                self.counters['detections'] += 1
+                self.counters['late'] += int(late)
+                self._latencies.append(latency)
+                self.emit({
+                    'start': float(item.event.start),
+                    'end': float(item.event.end),
+                    'species': self.categories[pred_class],
+                    'confidence': float(probs[pred_class]),
+                    'latency_ms': latency * 1000,
+                    'late': late,
+                })
+
+    async def run(self, reader: asyncio.StreamReader) -> Dict:
+        """
+        Process the stream until EOF
+
+        Args:
+            reader: Stream of raw PCM bytes
+
+        Returns:
+            Summary with vote totals, counters and latency percentiles
+        """
+        await asyncio.gather(self._read(reader), self._run_detector(), self._run_classifier())
+        summary = self.summary()
+        self.emit({'summary': summary})
+        return summary
+
+    def summary(self) -> Dict:
+        """Vote totals, drop counters, latency percentiles and the featurizer used"""
+        summary = {
+            'featurizer': self.featurizer.renderer,
+            'votes': {cat: int(count) for cat, count in zip(self.categories, self.votes)},
+            **self.counters,
+            'dropped_audio_seconds': self.ring.dropped / self.sample_rate,
+        }
+        if self._latencies:
+            p50, p99 = np.percentile(np.array(self._latencies) * 1000, [50, 99])
+            summary.update(p50_latency_ms=float(p50), p99_latency_ms=float(p99))
+        return summary
+
+
+class _ThreadReadTransport(asyncio.ReadTransport):
+    """Lets the StreamReader's flow control pause the thread reading a file"""
+
+    def __init__(self):
+        super().__init__()
+        self.reading = threading.Event()
+        self.reading.set()
+        self.closing = False
+
+    def pause_reading(self):
+        self.reading.clear()
+
+    def resume_reading(self):
+        self.reading.set()
+
+    def is_reading(self) -> bool:
+        return self.reading.is_set()
+
+    def close(self):
+        self.closing = True
+        self.reading.set()
+
+    def is_closing(self) -> bool:
+        return self.closing
+
+
+def _feed_reader(loop: asyncio.AbstractEventLoop, reader: asyncio.StreamReader,
+                 transport: _ThreadReadTransport, f, chunk_size: int = 1 << 16):
+    """Read a file in a worker thread and hand its bytes to the event loop"""
+    fed = threading.Event()
+
+    def feed(data: bytes):
+        reader.feed_data(data)
+        fed.set()
+
+    try:
+        while not transport.closing:
+            transport.reading.wait()
+            data = f.read(chunk_size)
+            if not data:
+                break
+            # Wait for the hand-over so a full buffer pauses the next read
+            fed.clear()
+            loop.call_soon_threadsafe(feed, data)
+            fed.wait()
+        loop.call_soon_threadsafe(reader.feed_eof)
+    except Exception as e:
+        loop.call_soon_threadsafe(reader.set_exception, e)
+
+
+async def open_pcm_reader(source: str = '-') -> asyncio.StreamReader:
+    """
+    Open stdin, a FIFO or a file as an asyncio stream
+
+    Pipes, sockets and terminals are read by the event loop; regular files
+    (including stdin redirected from a file) are not supported by asyncio's
+    pipe transport and are read by a worker thread instead.
+
+    Args:
+        source: '-' for stdin, otherwise a path to a FIFO or file
+    """
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    pipe = sys.stdin.buffer if source == '-' else open(source, 'rb')
+    mode = os.fstat(pipe.fileno()).st_mode
+    if stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode) or stat.S_ISCHR(mode):
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+    else:
+        transport = _ThreadReadTransport()
+        reader.set_transport(transport)
+        # A daemon thread, so a reader that is never drained cannot block exit
+        threading.Thread(target=_feed_reader, args=(loop, reader, transport, pipe),
+                         daemon=True).start()
+    return reader
+
+
+def replay_wav(wav_path: str, out=None, chunk_ms: float = 20.0, realtime: bool = True) -> int:
+    """
+    Write the frames of a WAV file as raw PCM, paced at real-time speed
+
+    Only the first channel is written. The WAV should be 16-bit PCM at the
+    rate the listener expects.
+
+    Args:
+        wav_path: Path to a 16-bit PCM WAV file
+        out: Binary output stream (defaults to stdout)
+        chunk_ms: Duration of each write
+        realtime: Sleep between writes to match the recording's duration
+
+    Returns:
+        Sampling frequency of the WAV file
+    """
+    out = out or sys.stdout.buffer
+    with wave.open(wav_path, 'rb') as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError("Only 16-bit PCM WAV files are supported")
+        fs, channels = wav.getframerate(), wav.getnchannels()
+        frames_per_chunk = max(int(fs * chunk_ms / 1000), 1)
+        start = time.monotonic()
+        sent = 0
+        while True:
+            data = wav.readframes(frames_per_chunk)
+            if not data:
+                break
+            samples = np.frombuffer(data, dtype='<i2')[::channels]
+            out.write(samples.tobytes())
+            out.flush()
+            sent += len(samples)
+            if realtime:
+                delay = start + sent / fs - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+    return fs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Live bird species detection from PCM audio')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    listen = subparsers.add_parser('listen', help='Detect syllables in a PCM stream')
+    listen.add_argument('--input', type=str, default='-',
+                      help="PCM source: '-' for stdin or a FIFO path")
+    listen.add_argument('--sample-rate', type=int, default=constants.DEFAULT_FS,
+                      help='Sampling frequency of the PCM stream')
+    listen.add_argument('--format', type=str, default='int16', choices=['int16', 'float32'],
+                      help='Little-endian sample format')
+    listen.add_argument('--model', type=str, default=None,
+                      help='Path to trained model (.h5, or .tflite for the TFLite runtime)')
+    listen.add_argument('--stats', type=str, default=None,
+                      help='Path to training statistics (models without embedded preprocessing)')
+    listen.add_argument('--batch-size', type=int, default=16,
+                      help='Maximum number of syllables per forward pass')
+    listen.add_argument('--max-queue', type=int, default=32,
+                      help='Maximum number of syllables waiting for the classifier')
+    listen.add_argument('--policy', type=str, default='drop', choices=POLICIES,
+                      help='What to do when inference falls behind')
+    listen.add_argument('--latency-budget-ms', type=float, default=500.0,
+                      help='Maximum time from detection to result')
+    listen.add_argument('--matlab', action='store_true',
+                      help='Render spectrograms with the MATLAB engine, like the training JPEGs')
+    listen.add_argument('--agreement-report', type=str, default=None,
+                      help='Agreement report required for the in-memory featurizer '
+                           '(defaults to <model>.agreement.json)')
+    listen.add_argument('--min-agreement', type=float, default=MIN_RECORDING_AGREEMENT,
+                      help='Minimum recording-level agreement in that report')
+
+    replay = subparsers.add_parser('replay', help='Write a WAV file to stdout as PCM at real-time speed')
+    replay.add_argument('wav_file', type=str,
+                      help='16-bit PCM WAV file')
+    replay.add_argument('--fast', action='store_true',
+                      help='Write as fast as possible instead of in real time')
+    args = parser.parse_args()
+
+    if args.command == 'replay':
+        fs = replay_wav(args.wav_file, realtime=not args.fast)
+        print(f"Replayed {args.wav_file} at {fs} Hz", file=sys.stderr)
+        return
+
+    async def listen_main():
+        detector = LiveDetector(
+            model_path=args.model,
+            stats_path=args.stats,
+            sample_rate=args.sample_rate,
+            sample_format=args.format,
+            batch_size=args.batch_size,
+            max_queue=args.max_queue,
+            policy=args.policy,
+            latency_budget_ms=args.latency_budget_ms,
+            use_matlab=args.matlab,
+            agreement_report=args.agreement_report,
+            min_agreement=args.min_agreement
+        )
+        await detector.run(await open_pcm_reader(args.input))
+
+    asyncio.run(listen_main())
+
+
+if __name__ == "__main__":
+    main()
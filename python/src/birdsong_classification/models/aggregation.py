@@ -0,0 +1,141 @@
+# src/birdsong_classification/models/aggregation.py
+from typing import Optional
+
+import numpy as np
+
+STRATEGIES = ('vote', 'mean', 'logprob')
+
+# Probability floor for the log-prob sum (same as Keras' epsilon)
+EPSILON = 1e-7
+
+
+class Aggregator:
+    """
+    Combines per-syllable class probabilities into per-recording scores
+
+    Strategies:
+        vote: Fraction of syllables whose argmax is each class (the original
+            majority vote)
+        mean: Mean of the softmax probabilities
+        logprob: Sum of log-probabilities, normalized to a posterior (treats
+            syllables as independent observations)
+
+    With ``margin`` set, the aggregator reports ``done`` once at least
+    ``min_syllables`` syllables have been seen and the leading class's score
+    exceeds the runner-up by more than the margin, so callers can stop
+    classifying the remaining syllables of a recording.
+    """
+
+    def __init__(self,
+                 num_classes: int,
+                 strategy: str = 'vote',
+                 margin: Optional[float] = None,
+                 min_syllables: int = 3):
+        """
+        Initialize aggregator
+
+        Args:
+            num_classes: Number of classes
+            strategy: One of STRATEGIES
+            margin: Posterior margin for early exit (None to use all syllables)
+            min_syllables: Minimum number of syllables before exiting early
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown aggregation strategy '{strategy}', expected one of {STRATEGIES}")
+        self.num_classes = num_classes
+        self.strategy = strategy
+        self.margin = margin
+        self.min_syllables = max(min_syllables, 1)
+        self.reset()
+
+    def reset(self):
+        """Forget all syllables seen so far"""
+        self.count = 0
+        self.votes = np.zeros(self.num_classes, dtype=np.int64)
+        self.prob_sum = np.zeros(self.num_classes)
+        self.log_prob_sum = np.zeros(self.num_classes)
+
+    def update(self, predictions: np.ndarray) -> bool:
+        """
+        Add the predictions of more syllables
+
+        Args:
+            predictions: Probabilities of shape (n_syllables, num_classes)
+
+        Returns:
+            Whether the early-exit condition is met
+        """
+        predictions = np.asarray(predictions, dtype=np.float64)
+        if len(predictions):
+            self.count += len(predictions)
+            self.votes += np.bincount(np.argmax(predictions, axis=1), minlength=self.num_classes)
+            self.prob_sum += predictions.sum(axis=0)
+            self.log_prob_sum += np.log(np.maximum(predictions, EPSILON)).sum(axis=0)
+        return self.done
+
+    def scores(self) -> np.ndarray:
+        """Per-class scores summing to one (zeros before the first syllable)"""
+        if self.count == 0:
+            return np.zeros(self.num_classes)
+        if self.strategy == 'vote':
+            return self.votes / self.count
+        if self.strategy == 'mean':
+            return self.prob_sum / self.count
+        log_posterior = self.log_prob_sum - self.log_prob_sum.max()
+        posterior = np.exp(log_posterior)
+        return posterior / posterior.sum()
+
+    def predicted_class(self) -> Optional[int]:
+        """Index of the leading class (None before the first syllable)"""
+        if self.count == 0:
+            return None
+        if self.strategy == 'vote':
+            # Ties go to the lowest class index, like np.bincount(...).argmax()
+            return int(np.argmax(self.votes))
+        return int(np.argmax(self.scores()))
+
+    def posterior_margin(self) -> float:
+        """Score of the leading class minus that of the runner-up"""
+        top = np.sort(self.scores())[::-1]
+        return float(top[0] - top[1]) if len(top) > 1 else float(top[0])
+
+    @property
+    def done(self) -> bool:
+        """Whether enough evidence has been seen to stop early"""
+        return (self.margin is not None and self.count >= self.min_syllables
+                and self.posterior_margin() > self.margin)
+
+    def needed(self, available: int) -> int:
+        """
+        Number of further syllables to classify in the next step
+
+        Args:
+            available: Number of syllables not classified yet
+
+        Returns:
+            Zero once done; just enough to reach min_syllables before that;
+            otherwise all of them, so callers keep classifying full batches
+            and recheck the margin on the running scores after each batch.
+            Pass a batch size as ``available`` to bound the step.
+        """
+        if self.done:
+            return 0
+        if self.margin is not None and self.count < self.min_syllables:
+            return min(available, self.min_syllables - self.count)
+        return available
+
+
+def aggregate(predictions: np.ndarray, strategy: str = 'vote') -> np.ndarray:
+    """
+    Aggregate per-syllable probabilities into per-class scores
+
+    Args:
+        predictions: Probabilities of shape (n_syllables, n_classes)
+        strategy: One of STRATEGIES
+
+    Returns:
+        Scores of shape (n_classes,) summing to one
+    """
+    aggregator = Aggregator(np.shape(predictions)[1], strategy)
+    aggregator.update(predictions)
+    return aggregator.scores()
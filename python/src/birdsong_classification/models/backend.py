@@ -0,0 +1,179 @@
+# src/birdsong_classification/models/backend.py
+"""
+Inference backends
+
+All backends take raw images of shape (n, height, width, channels) as
+produced by the featurizer or read from a store (uint8 or float values in
+[0, 255]) and return class probabilities, so the prediction tools can run a
+Keras model or an exported TFLite model interchangeably. Models that embed
+their preprocessing standardize inside the graph; for older models the
+backend standardizes with the training statistics. The TFLite backend uses
+the standalone LiteRT (``ai_edge_litert``) or ``tflite_runtime`` interpreter
+when one is installed and only falls back to TensorFlow otherwise.
+"""
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+from birdsong_classification.data.preprocessing import load_train_stats, standardize
+
+BACKENDS = ('keras', 'tflite')
+
+# Input name of models that resize and standardize raw images themselves
+RAW_INPUT_NAME = 'raw_images'
+
+
+class InferenceBackend(ABC):
+    """Common interface of the runtimes that can execute the classifier"""
+
+    name = None
+
+    def __init__(self, input_shape: Tuple[int, int, int], num_classes: int,
+                 stats: Optional[Tuple[float, float]] = None):
+        """
+        Args:
+            input_shape: Image shape the network expects (height, width, channels)
+            num_classes: Number of classes
+            stats: (mean, std) to standardize with, None if the model embeds
+                its preprocessing
+        """
+        self.input_shape = tuple(input_shape)
+        self.num_classes = num_classes
+        self.stats = stats
+
+    @property
+    def includes_preprocessing(self) -> bool:
+        """Whether the model standardizes raw images itself"""
+        return self.stats is None
+
+    @abstractmethod
+    def _predict(self, X: np.ndarray) -> np.ndarray:
+        """Run the runtime on one batch of (standardized if needed) images"""
+
+    def predict_on_batch(self, X: np.ndarray) -> np.ndarray:
+        """
+        Make predictions on a single batch
+
+        Args:
+            X: Raw input images (one batch)
+
+        Returns:
+            Predicted probabilities of shape (n, num_classes)
+        """
+        if self.stats is not None:
+            X = standardize(X, *self.stats)
+        return self._predict(X)
+
+    def predict(self, X: np.ndarray, batch_size: int = 64) -> np.ndarray:
+        """
+        Make predictions on any number of images, batch by batch
+
+        Args:
+            X: Raw input images
+            batch_size: Number of images per forward pass
+
+        Returns:
+            Predicted probabilities of shape (n, num_classes)
+        """
+        if len(X) == 0:
+            return np.empty((0, self.num_classes), dtype=np.float32)
+        return np.concatenate([self.predict_on_batch(X[start:start + batch_size])
+                               for start in range(0, len(X), batch_size)])
+
+
+class KerasBackend(InferenceBackend):
+    """Runs a saved Keras model (imports TensorFlow)"""
+
+    name = 'keras'
+
+    def __init__(self, model_path: Union[str, Path], stats_path: Optional[str] = None):
+        """
+        Load model
+
+        Args:
+            model_path: Path to a saved Keras model (.h5 / .keras)
+            stats_path: Training statistics for models without embedded
+                preprocessing (defaults to models/train_stats.npz)
+        """
+        from birdsong_classification.models.model import BirdSongClassifier
+        self.classifier = BirdSongClassifier.load(model_path)
+        stats = None if self.classifier.includes_preprocessing else load_train_stats(stats_path)
+        super().__init__(self.classifier.input_shape, self.classifier.num_classes, stats)
+
+    def _predict(self, X: np.ndarray) -> np.ndarray:
+        return self.classifier.predict_on_batch(X)
+
+
+def _tflite_interpreter_class():
+    """Standalone TFLite interpreter if installed, TensorFlow's otherwise"""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteBackend(InferenceBackend):
+    """Runs an exported .tflite model"""
+
+    name = 'tflite'
+
+    def __init__(self, model_path: Union[str, Path], stats_path: Optional[str] = None,
+                 num_threads: Optional[int] = None):
+        """
+        Load model
+
+        Args:
+            model_path: Path to a .tflite file
+            stats_path: Training statistics for models without embedded
+                preprocessing (defaults to models/train_stats.npz)
+            num_threads: Number of interpreter threads (None for the runtime default)
+        """
+        Interpreter = _tflite_interpreter_class()
+        self.interpreter = Interpreter(model_path=str(model_path), num_threads=num_threads)
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = None
+        stats = None if RAW_INPUT_NAME in self._input['name'] else load_train_stats(stats_path)
+        super().__init__(tuple(int(d) for d in self._input['shape'][1:]),
+                         int(self._output['shape'][-1]), stats)
+
+    def _predict(self, X: np.ndarray) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=self._input['dtype'])
+        if len(X) != self._batch_size:
+            # The batch dimension is dynamic; reallocate only when it changes
+            self.interpreter.resize_tensor_input(self._input['index'], X.shape)
+            self.interpreter.allocate_tensors()
+            self._batch_size = len(X)
+        self.interpreter.set_tensor(self._input['index'], X)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self._output['index']).copy()
+
+
+def load_backend(model_path: Union[str, Path], backend: Optional[str] = None,
+                 stats_path: Optional[str] = None) -> InferenceBackend:
+    """
+    Load a model with the matching backend
+
+    Args:
+        model_path: Path to a Keras model or a .tflite file
+        backend: One of BACKENDS (defaults to the file extension's backend)
+        stats_path: Training statistics, only read for models without
+            embedded preprocessing (defaults to models/train_stats.npz)
+
+    Returns:
+        Loaded backend
+    """
+    if backend is None:
+        backend = 'tflite' if Path(model_path).suffix.lower() == '.tflite' else 'keras'
+    if backend == 'tflite':
+        return TFLiteBackend(model_path, stats_path)
+    if backend == 'keras':
+        return KerasBackend(model_path, stats_path)
+    raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
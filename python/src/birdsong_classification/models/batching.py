@@ -0,0 +1,236 @@
+# src/birdsong_classification/models/batching.py
+"""
+Micro-batching of concurrent prediction requests
+
+Used by serve.py so that requests arriving together share one forward pass.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    Groups inputs from concurrent callers into single predict calls
+
+    Each caller submits the syllable images of one recording. The worker
+    thread concatenates queued requests until ``max_batch_size`` rows are
+    collected or ``max_wait_ms`` has passed since the first one, runs one
+    forward pass and hands every caller back the rows that belong to it.
+    """
+
+    def __init__(self,
+                 predict_fn: Callable[[np.ndarray], np.ndarray],
+                 max_batch_size: int = 64,
+                 max_wait_ms: float = 5.0,
+                 max_queue_size: int = 0,
+                 num_classes: Optional[int] = None):
+        """
+        Initialize batcher and start its worker thread
+
+        Args:
+            predict_fn: Function mapping a batch of inputs to predictions
+            max_batch_size: Maximum number of rows per predict call. A single
+                request larger than this is still run as one batch.
+            max_wait_ms: Maximum time to wait for more inputs once a batch
+                has been started
+            max_queue_size: Maximum number of queued requests (0 for no limit).
+                submit() blocks while the queue is full.
+            num_classes: Number of columns of predict_fn's output, for the
+                result of empty requests (None to ask predict_fn)
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.num_classes = num_classes
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._pending = None
+        self._closed = False
+
+        # Counters
+        self._lock = threading.Lock()
+        self._queued_requests = 0
+        self._queued_rows = 0
+        self._max_queued_rows = 0
+        self._requests = 0
+        self._rows = 0
+        self._batches = 0
+        self._capacity = 0
+        self._errors = 0
+
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    @classmethod
+    def for_classifier(cls, classifier, **kwargs) -> 'MicroBatcher':
+        """
+        Create a batcher around a BirdSongClassifier or inference backend
+
+        Args:
+            classifier: Loaded BirdSongClassifier or InferenceBackend
+            **kwargs: Batching limits passed to __init__
+        """
+        kwargs.setdefault('num_classes', classifier.num_classes)
+        return cls(classifier.predict_on_batch, **kwargs)
+
+    def submit(self, X: np.ndarray, timeout: float = None) -> Future:
+        """
+        Queue inputs for prediction
+
+        Args:
+            X: Input rows of shape (n, ...)
+            timeout: Maximum time to wait for space in a bounded queue
+
+        Returns:
+            Future resolving to the predictions for X
+
+        Raises:
+            queue.Full: If the queue stayed full for ``timeout`` seconds
+            RuntimeError: If the batcher was closed
+        """
+        future = Future()
+        if len(X) == 0:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            if self.num_classes is None:
+                future.set_result(self.predict_fn(X))
+            else:
+                future.set_result(np.empty((0, self.num_classes), dtype=np.float32))
+            return future
+
+        # Count the request before the worker can take it off the queue;
+        # callers blocked on a full queue are part of the depth
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._queued_requests += 1
+            self._queued_rows += len(X)
+            self._max_queued_rows = max(self._max_queued_rows, self._queued_rows)
+        try:
+            self._queue.put((X, future), timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self._queued_requests -= 1
+                self._queued_rows -= len(X)
+            raise
+        return future
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Queue inputs and block until their predictions are available"""
+        return self.submit(X).result()
+
+    def stats(self) -> Dict:
+        """
+        Snapshot of the batcher counters
+
+        Returns:
+            Dictionary with the current and peak queue depth (rows), number of
+            requests, rows and batches processed, failed batches, average rows
+            per batch and the average batch fill ratio (rows / max_batch_size,
+            where a batch holding a single oversized request counts as full)
+        """
+        with self._lock:
+            batches = self._batches
+            return {
+                'queue_depth_requests': self._queued_requests,
+                'queue_depth_rows': self._queued_rows,
+                'max_queue_depth_rows': self._max_queued_rows,
+                'requests': self._requests,
+                'rows': self._rows,
+                'batches': batches,
+                'errors': self._errors,
+                'mean_batch_size': self._rows / batches if batches else 0.0,
+                'batch_fill_ratio': self._rows / self._capacity if batches else 0.0,
+            }
+
+    def close(self):
+        """Finish queued work and stop the worker thread; later submits raise RuntimeError"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(_STOP)
+        self._worker.join()
+
+        # Requests that got past the closed check while the worker stopped
+        while True:
+            try:
+                X, future = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._queued_requests -= 1
+                self._queued_rows -= len(X)
+            future.set_exception(RuntimeError("MicroBatcher is closed"))
+
+    def _collect(self) -> Tuple[List[Tuple[np.ndarray, Future]], bool]:
+        """Wait for the first item, then gather more until full or timed out"""
+        first = self._pending if self._pending is not None else self._queue.get()
+        self._pending = None
+        if first is _STOP:
+            return [], True
+
+        batch = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is _STOP or size + len(item[0]) > self.max_batch_size:
+                # Keep it for the next round
+                self._pending = item
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch, False
+
+    def _run(self):
+        while True:
+            batch, stop = self._collect()
+            if stop:
+                return
+
+            rows = sum(len(X) for X, _ in batch)
+            with self._lock:
+                self._queued_requests -= len(batch)
+                self._queued_rows -= rows
+
+            batch = [(X, future) for X, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                predictions = self.predict_fn(np.concatenate([X for X, _ in batch]))
+            except Exception as e:
+                with self._lock:
+                    self._errors += 1
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            with self._lock:
+                rows = sum(len(X) for X, _ in batch)
+                self._requests += len(batch)
+                self._rows += rows
+                self._batches += 1
+                self._capacity += max(rows, self.max_batch_size)
+
+            # Scatter rows back to the callers in submission order
+            splits = np.cumsum([len(X) for X, _ in batch])[:-1]
+            for (_, future), result in zip(batch, np.split(predictions, splits)):
+                future.set_result(result)
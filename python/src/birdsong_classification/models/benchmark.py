@@ -0,0 +1,236 @@
+# src/birdsong_classification/models/benchmark.py
+"""
+Benchmark training configurations
+
+Usage:
+    python -m birdsong_classification.models.benchmark --synthetic 3000 --epochs 5
+
+Trains the classifier once per configuration (float32, XLA, bfloat16 mixed
+precision and both, for every batch size) from the same initial weights on
+the same data, and reports steady-state throughput, the time of the first
+epoch (which includes tracing and XLA compilation) and the wall-clock time
+until the validation accuracy first reaches the target.
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from birdsong_classification.data.dataset import BirdSongDataset
+from birdsong_classification.data.preprocessing import compute_stats, load_train_stats
+from birdsong_classification.data.store import SpectrogramStore
+from birdsong_classification.models.config import LR_SCHEDULES, TrainingConfig
+from birdsong_classification.utils.path_utils import get_data_dir
+
+CATEGORIES = ["common_chaffinch", "eurasian_blue_tit", "house_sparrow"]
+
+# Compute settings compared by default
+MODES = {
+    'float32': {'jit_compile': False, 'mixed_precision': False},
+    'xla': {'jit_compile': True, 'mixed_precision': False},
+    'bfloat16': {'jit_compile': False, 'mixed_precision': True},
+    'xla+bfloat16': {'jit_compile': True, 'mixed_precision': True},
+}
+
+
+class RunResult(NamedTuple):
+    """Outcome of one benchmarked training run"""
+    mode: str
+    batch_size: int
+    samples_per_second: float
+    first_epoch_seconds: float
+    time_to_target: Optional[float]
+    best_val_accuracy: float
+
+
+def write_synthetic_store(root: Path, num_samples: int, size: int = 64, seed: int = 0) -> Tuple[SpectrogramStore, Tuple[float, float]]:
+    """
+    Write a learnable synthetic store
+
+    Each class adds energy to its own frequency band on top of uniform noise,
+    so the accuracy target is reachable within a few epochs.
+
+    Args:
+        root: Store directory
+        num_samples: Number of samples
+        size: Image height and width
+        seed: Random seed
+
+    Returns:
+        (store, training statistics)
+    """
+    rng = np.random.default_rng(seed)
+    y = np.arange(num_samples) % len(CATEGORIES)
+    rng.shuffle(y)
+    X = rng.integers(0, 160, (num_samples, size, size, 3), dtype=np.uint8)
+    band = size // len(CATEGORIES)
+    for label in range(len(CATEGORIES)):
+        X[y == label, label * band:(label + 1) * band] += np.uint8(48)
+    # Every sample is its own recording
+    recording_ids = [f"{CATEGORIES[label]}/{i}" for i, label in enumerate(y)]
+    return SpectrogramStore.write(root, X, y, CATEGORIES, recording_ids=recording_ids), compute_stats(X)
+
+
+def _epoch_timer(target_accuracy: float):
+    """Keras callback timing the training phase of every epoch and the time to target"""
+    import tensorflow as tf
+
+    class EpochTimer(tf.keras.callbacks.Callback):
+        def on_train_begin(self, logs=None):
+            self.start = time.perf_counter()
+            self.train_seconds = []
+            self.time_to_target = None
+            self.best_val_accuracy = 0.0
+
+        def on_epoch_begin(self, epoch, logs=None):
+            self.epoch_start = time.perf_counter()
+            self.train_end = None
+
+        def on_test_begin(self, logs=None):
+            # Validation runs inside fit; keep it out of the throughput
+            if self.train_end is None:
+                self.train_end = time.perf_counter()
+
+        def on_epoch_end(self, epoch, logs=None):
+            now = time.perf_counter()
+            self.train_seconds.append((self.train_end or now) - self.epoch_start)
+            val_accuracy = float((logs or {}).get('val_accuracy', 0.0))
+            self.best_val_accuracy = max(self.best_val_accuracy, val_accuracy)
+            if self.time_to_target is None and val_accuracy >= target_accuracy:
+                self.time_to_target = now - self.start
+
+    return EpochTimer()
+
+
+def benchmark_config(store: SpectrogramStore,
+                     train_indices: np.ndarray,
+                     val_indices: np.ndarray,
+                     stats: Tuple[float, float],
+                     config: TrainingConfig,
+                     batch_size: int,
+                     epochs: int,
+                     target_accuracy: float,
+                     seed: int = 0) -> Dict:
+    """
+    Train one configuration and time it
+
+    Args:
+        store: Store to train on
+        train_indices: Training samples
+        val_indices: Validation samples
+        stats: Training (mean, std), embedded in the model
+        config: Optimizer and compute settings
+        batch_size: Number of samples per training step
+        epochs: Number of epochs
+        target_accuracy: Validation accuracy to time
+        seed: Random seed for the initial weights and the shuffling
+
+    Returns:
+        samples_per_second (median over the epochs after the first),
+        first_epoch_seconds, time_to_target (None if never reached) and
+        best_val_accuracy
+    """
+    import tensorflow as tf
+    from birdsong_classification.data.pipeline import store_dataset
+    from birdsong_classification.models.model import BirdSongClassifier
+
+    # Same initial weights and sample order for every configuration
+    tf.keras.utils.set_random_seed(seed)
+    train_data = store_dataset(store, train_indices, batch_size=batch_size, shuffle=True, seed=seed)
+    val_data = store_dataset(store, val_indices, batch_size=batch_size)
+    classifier = BirdSongClassifier(store.sample_shape, len(CATEGORIES), stats=stats, config=config)
+
+    timer = _epoch_timer(target_accuracy)
+    classifier.model.fit(train_data, epochs=epochs, validation_data=val_data,
+                         callbacks=[timer], verbose=0)
+
+    steady = timer.train_seconds[1:] or timer.train_seconds
+    return {
+        'samples_per_second': len(train_indices) / float(np.median(steady)),
+        'first_epoch_seconds': timer.train_seconds[0],
+        'time_to_target': timer.time_to_target,
+        'best_val_accuracy': timer.best_val_accuracy,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark training configurations')
+    parser.add_argument('--data-dir', type=str, default=None,
+                        help='Processed data directory with a train/ store (defaults to data/processed)')
+    parser.add_argument('--stats', type=str, default=None,
+                        help='Path to training statistics (defaults to models/train_stats.npz)')
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help='Benchmark on this many generated samples instead')
+    parser.add_argument('--max-samples', type=int, default=None,
+                        help='Use at most this many samples of the store')
+    parser.add_argument('--modes', type=str, nargs='+', default=list(MODES), choices=list(MODES),
+                        help='Compute settings to compare')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[64],
+                        help='Batch sizes to compare')
+    parser.add_argument('--epochs', type=int, default=5,
+                        help='Number of epochs per run')
+    parser.add_argument('--learning-rate', type=float, default=0.0001,
+                        help='Initial learning rate')
+    parser.add_argument('--lr-schedule', type=str, default='constant', choices=LR_SCHEDULES,
+                        help='Learning rate schedule')
+    parser.add_argument('--target-accuracy', type=float, default=0.9,
+                        help='Validation accuracy to measure the time to')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Random seed')
+    args = parser.parse_args()
+
+    from birdsong_classification.data.pipeline import split_indices
+    from birdsong_classification.models.model import bfloat16_supported
+
+    modes = args.modes
+    if not bfloat16_supported():
+        modes = [mode for mode in modes if not MODES[mode]['mixed_precision']]
+        print(f"No bfloat16 support on this hardware, comparing {', '.join(modes)}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.synthetic:
+            store, stats = write_synthetic_store(Path(tmp_dir), args.synthetic, seed=args.seed)
+        else:
+            data_dir = Path(args.data_dir) if args.data_dir else get_data_dir() / "processed"
+            store = BirdSongDataset.load_store(data_dir / "train")
+            stats = load_train_stats(args.stats)
+        num_samples = len(store) if args.max_samples is None else min(args.max_samples, len(store))
+        recording_ids = store.recording_ids
+        train_indices, val_indices = split_indices(
+            num_samples, validation_split=0.1, labels=store.labels[:num_samples], seed=args.seed,
+            recording_ids=None if recording_ids is None else recording_ids[:num_samples])
+        print(f"Benchmarking on {len(train_indices)} training and {len(val_indices)} validation "
+              f"samples of shape {store.sample_shape}")
+
+        results: List[RunResult] = []
+        for batch_size in args.batch_sizes:
+            steps = max(-(-len(train_indices) // batch_size), 1)
+            for mode in modes:
+                config = TrainingConfig(learning_rate=args.learning_rate,
+                                        lr_schedule=args.lr_schedule,
+                                        decay_steps=args.epochs * steps,
+                                        **MODES[mode])
+                print(f"Training {mode} with batch size {batch_size}...")
+                run = benchmark_config(store, train_indices, val_indices, stats, config,
+                                       batch_size, args.epochs, args.target_accuracy, args.seed)
+                results.append(RunResult(mode, batch_size, run['samples_per_second'],
+                                         run['first_epoch_seconds'], run['time_to_target'],
+                                         run['best_val_accuracy']))
+
+    if not results:
+        return
+    baseline = results[0].samples_per_second
+    print(f"\n{'mode':<14} {'batch':>6} {'samples/s':>10} {'speedup':>8} {'1st epoch s':>12} "
+          f"{f'to {args.target_accuracy:.0%} s':>10} {'best val':>9}")
+    for row in results:
+        to_target = f"{row.time_to_target:10.1f}" if row.time_to_target is not None else f"{'-':>10}"
+        print(f"{row.mode:<14} {row.batch_size:>6} {row.samples_per_second:>10.1f} "
+              f"{row.samples_per_second / baseline:>7.2f}x {row.first_epoch_seconds:>12.2f} "
+              f"{to_target} {row.best_val_accuracy:>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
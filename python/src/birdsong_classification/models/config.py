@@ -0,0 +1,27 @@
+# src/birdsong_classification/models/config.py
+from typing import NamedTuple, Union
+
+LR_SCHEDULES = ('constant', 'cosine', 'exponential')
+
+
+class TrainingConfig(NamedTuple):
+    """
+    Optimizer and compute settings of a training run
+    
+    Attributes:
+        learning_rate: Initial learning rate
+        lr_schedule: One of LR_SCHEDULES
+        decay_steps: Steps over which the learning rate decays (cosine: to
+            zero; exponential: by a factor of decay_rate)
+        decay_rate: Decay factor of the exponential schedule
+        jit_compile: Compile the training step with XLA; 'auto' lets Keras
+            decide (XLA on GPUs only)
+        mixed_precision: Compute in bfloat16 while keeping float32 weights
+            (ignored where the hardware has no bfloat16 support)
+    """
+    learning_rate: float = 0.0001
+    lr_schedule: str = 'constant'
+    decay_steps: int = 1000
+    decay_rate: float = 0.9
+    jit_compile: Union[bool, str] = 'auto'
+    mixed_precision: bool = False
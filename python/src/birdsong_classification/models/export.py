@@ -0,0 +1,219 @@
+# src/birdsong_classification/models/export.py
+"""
+Export the classifier to TFLite and compare backends
+
+Usage:
+    python -m birdsong_classification.models.export [--int8] [--calibration-samples 200]
+
+Writes models/birdsong_classifier.tflite (or birdsong_classifier_int8.tflite),
+then reports test accuracy, the accuracy delta to the Keras model and the
+median latency per batch size for every backend.
+"""
+import argparse
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from birdsong_classification.data.dataset import BirdSongDataset
+from birdsong_classification.data.preprocessing import load_train_stats, standardize
+from birdsong_classification.data.store import SpectrogramStore
+from birdsong_classification.models.backend import RAW_INPUT_NAME, InferenceBackend, KerasBackend, TFLiteBackend
+from birdsong_classification.utils.path_utils import get_data_dir, get_models_dir
+
+
+def calibration_dataset(store: SpectrogramStore,
+                        stats: Optional[Tuple[float, float]] = None,
+                        num_samples: int = 200,
+                        seed: int = 0) -> Callable[[], Iterator[List[np.ndarray]]]:
+    """
+    Representative dataset for post-training quantization
+
+    Args:
+        store: Training store to sample from
+        stats: (mean, std) for models without embedded preprocessing, None
+            to yield raw images
+        num_samples: Number of samples used for calibration
+        seed: Random seed for the sample
+
+    Returns:
+        Generator function yielding single float32 samples
+    """
+    rng = np.random.default_rng(seed)
+    indices = np.sort(rng.choice(len(store), size=min(num_samples, len(store)), replace=False))
+
+    def generate():
+        for X_batch, _ in store.iter_batches(batch_size=64, indices=indices):
+            X_batch = standardize(X_batch, *stats) if stats is not None else X_batch.astype(np.float32)
+            for sample in X_batch:
+                yield [sample[np.newaxis]]
+
+    return generate
+
+
+def export_tflite(model_path: Path,
+                  output_path: Path,
+                  quantize: bool = False,
+                  train_store: Optional[SpectrogramStore] = None,
+                  stats_path: Optional[str] = None,
+                  num_calibration: int = 200) -> Path:
+    """
+    Convert a saved Keras model to TFLite
+
+    With ``quantize``, weights and activations are quantized to int8 using
+    ranges calibrated on a sample of the training store; inputs and outputs
+    stay float32, so the backends are interchangeable. Models with embedded
+    preprocessing are exported with a fixed image size and keep taking raw
+    images.
+
+    Args:
+        model_path: Path to the saved Keras model
+        output_path: Path of the .tflite file to write
+        quantize: Apply post-training int8 quantization
+        train_store: Training store to calibrate on (required with quantize)
+        stats_path: Training statistics for calibrating models without
+            embedded preprocessing (defaults to models/train_stats.npz)
+        num_calibration: Number of calibration samples
+
+    Returns:
+        Path of the written file
+    """
+    import tensorflow as tf
+    from birdsong_classification.models.model import BirdSongClassifier
+
+    classifier = BirdSongClassifier.load(model_path)
+    model = classifier.model
+    if classifier.includes_preprocessing:
+        # Fix the image size so the interpreter reports the network's input shape
+        inputs = tf.keras.Input(shape=classifier.input_shape, name=RAW_INPUT_NAME)
+        model = tf.keras.Model(inputs, model(inputs))
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize:
+        if train_store is None:
+            raise ValueError("int8 quantization needs the training store")
+        stats = None if classifier.includes_preprocessing else load_train_stats(stats_path)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = calibration_dataset(train_store, stats, num_calibration)
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_bytes(converter.convert())
+    return output_path
+
+
+def measure_latency(backend: InferenceBackend, X: np.ndarray, repeats: int = 20) -> float:
+    """
+    Median wall-clock time of one predict_on_batch call
+
+    Args:
+        backend: Backend to time
+        X: Batch to predict on
+        repeats: Number of timed calls (after one warm-up call)
+
+    Returns:
+        Median latency in milliseconds
+    """
+    backend.predict_on_batch(X)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        backend.predict_on_batch(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def compare_backends(backends: Dict[str, InferenceBackend],
+                     test_store: SpectrogramStore,
+                     batch_sizes: Sequence[int] = (1, 32),
+                     max_samples: Optional[int] = None,
+                     repeats: int = 20) -> Dict[str, Dict]:
+    """
+    Accuracy and latency of each backend on the same test data
+
+    Args:
+        backends: Backends by name; the first one is the reference for the
+            accuracy delta
+        test_store: Test store
+        batch_sizes: Batch sizes to measure latency for
+        max_samples: Evaluate on at most this many test samples
+        repeats: Number of timed calls per batch size
+
+    Returns:
+        Per backend: accuracy, accuracy_delta, agreement with the reference
+        and latency_ms per batch size
+    """
+    num_samples = len(test_store) if max_samples is None else min(max_samples, len(test_store))
+    correct = {name: 0 for name in backends}
+    agree = {name: 0 for name in backends}
+    reference = next(iter(backends))
+    for X_batch, y_batch in test_store.iter_batches(batch_size=64, indices=np.arange(num_samples)):
+        predicted = {name: np.argmax(backend.predict_on_batch(X_batch), axis=1)
+                     for name, backend in backends.items()}
+        for name in backends:
+            correct[name] += int(np.sum(predicted[name] == y_batch))
+            agree[name] += int(np.sum(predicted[name] == predicted[reference]))
+
+    latency_batch = test_store.take(np.arange(max(batch_sizes)) % len(test_store))
+    report = {}
+    for name, backend in backends.items():
+        accuracy = correct[name] / num_samples if num_samples else 0.0
+        report[name] = {
+            'accuracy': accuracy,
+            'accuracy_delta': accuracy - correct[reference] / num_samples if num_samples else 0.0,
+            'agreement': agree[name] / num_samples if num_samples else 0.0,
+            'latency_ms': {size: measure_latency(backend, latency_batch[:size], repeats)
+                           for size in batch_sizes},
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the classifier to TFLite')
+    parser.add_argument('--model', type=str, default=None,
+                      help='Path to trained Keras model')
+    parser.add_argument('--output', type=str, default=None,
+                      help='Path of the .tflite file (defaults to the models directory)')
+    parser.add_argument('--int8', action='store_true',
+                      help='Apply post-training int8 quantization')
+    parser.add_argument('--calibration-samples', type=int, default=200,
+                      help='Number of training samples used to calibrate int8 ranges')
+    parser.add_argument('--stats', type=str, default=None,
+                      help='Path to training statistics (models without embedded preprocessing)')
+    parser.add_argument('--data-dir', type=str, default=None,
+                      help='Processed data directory with train/ and test/ stores')
+    parser.add_argument('--eval-samples', type=int, default=None,
+                      help='Evaluate on at most this many test samples')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 32],
+                      help='Batch sizes to measure latency for')
+    parser.add_argument('--no-report', action='store_true',
+                      help='Only export, skip the accuracy and latency comparison')
+    args = parser.parse_args()
+
+    model_path = Path(args.model) if args.model else get_models_dir() / "birdsong_classifier.h5"
+    output_path = (Path(args.output) if args.output else
+                   model_path.with_name(model_path.stem + ("_int8" if args.int8 else "") + ".tflite"))
+    data_dir = Path(args.data_dir) if args.data_dir else get_data_dir() / "processed"
+
+    train_store = BirdSongDataset.load_store(data_dir / "train") if args.int8 else None
+    print(f"Exporting {model_path} to {output_path}" + (" (int8)" if args.int8 else ""))
+    export_tflite(model_path, output_path, args.int8, train_store, args.stats, args.calibration_samples)
+    print(f"Model size: {model_path.stat().st_size / 1e6:.2f} MB -> {output_path.stat().st_size / 1e6:.2f} MB")
+
+    if args.no_report:
+        return
+
+    test_store = BirdSongDataset.load_store(data_dir / "test")
+    backends = {'keras': KerasBackend(model_path, args.stats),
+                output_path.name: TFLiteBackend(output_path, args.stats)}
+    report = compare_backends(backends, test_store, args.batch_sizes, args.eval_samples)
+
+    print(f"\n{'backend':<40} {'accuracy':>9} {'delta':>8} {'agree':>7}"
+          + "".join(f" {f'bs={size} ms':>10}" for size in args.batch_sizes))
+    for name, row in report.items():
+        print(f"{name:<40} {row['accuracy']:>9.4f} {row['accuracy_delta']:>+8.4f} {row['agreement']:>7.3f}"
+              + "".join(f" {row['latency_ms'][size]:>10.2f}" for size in args.batch_sizes))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,131 +1,376 @@
+import csv
+import shutil
+from pathlib import Path
+
 import tensorflow as tf
+from tensorflow.keras.callbacks import BackupAndRestore, CSVLogger, EarlyStopping, ModelCheckpoint
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import (
     Conv2D, MaxPooling2D, Dense, Dropout, 
-    Activation, Flatten, BatchNormalization
+    Activation, Flatten, BatchNormalization,
+    Input, Resizing, Rescaling
 )
 import numpy as np
 from tensorflow.keras import regularizers
 from tensorflow.keras.optimizers import Adam
-from typing import Tuple
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from birdsong_classification.models.backend import RAW_INPUT_NAME
+from birdsong_classification.models.config import LR_SCHEDULES, TrainingConfig
+
+# Layout of a training run directory
+HISTORY_FILE = 'history.csv'
+BEST_WEIGHTS_FILE = 'best.weights.h5'
+BACKUP_DIR = 'backup'
+
+def bfloat16_supported() -> bool:
+    """Whether bfloat16 math is fast here (GPUs from Ampere on, CPUs with AVX512-BF16 or AMX)"""
+    gpus = tf.config.list_physical_devices('GPU')
+    if gpus:
+        details = tf.config.experimental.get_device_details(gpus[0])
+        return details.get('compute_capability', (0, 0)) >= (8, 0)
+    try:
+        with open('/proc/cpuinfo') as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return 'avx512_bf16' in flags or 'amx_bf16' in flags
+
+def learning_rate_schedule(config: TrainingConfig) -> Union[float, tf.keras.optimizers.schedules.LearningRateSchedule]:
+    """
+    Build the learning rate (schedule) of a training config
+    
+    Args:
+        config: Training config
+        
+    Returns:
+        Constant learning rate or Keras schedule
+    """
+    if config.lr_schedule == 'constant':
+        return config.learning_rate
+    if config.lr_schedule == 'cosine':
+        return tf.keras.optimizers.schedules.CosineDecay(config.learning_rate, config.decay_steps)
+    if config.lr_schedule == 'exponential':
+        return tf.keras.optimizers.schedules.ExponentialDecay(
+            config.learning_rate, config.decay_steps, config.decay_rate)
+    raise ValueError(f"Unknown learning rate schedule '{config.lr_schedule}', expected one of {LR_SCHEDULES}")
+
+def read_history(history_path: Union[str, Path]) -> Dict[str, List[float]]:
+    """
+    Read the per-epoch history from a run directory's CSV log
+    
+    Epochs logged twice (re-run after a restart) keep their latest row.
+    
+    Args:
+        history_path: CSV written by the CSVLogger callback
+        
+    Returns:
+        Metric name to per-epoch values, like History.history
+    """
+    history_path = Path(history_path)
+    if not history_path.exists():
+        return {}
+    with open(history_path, newline='') as f:
+        rows = {int(row['epoch']): row for row in csv.DictReader(f)}
+    history = {}
+    for epoch in sorted(rows):
+        for key, value in rows[epoch].items():
+            if key != 'epoch':
+                history.setdefault(key, []).append(float(value))
+    return history
+
+class ResumableEarlyStopping(EarlyStopping):
+    """EarlyStopping on a minimized metric that keeps counting patience across restarts"""
+    
+    def __init__(self, previous: Sequence[float] = (), **kwargs):
+        """
+        Args:
+            previous: Monitored values of the epochs before the restart
+            **kwargs: EarlyStopping arguments
+        """
+        super().__init__(**kwargs)
+        self.previous = list(previous)
+    
+    def on_train_begin(self, logs=None):
+        super().on_train_begin(logs)
+        if self.previous:
+            best_epoch = int(np.argmin(self.previous))
+            self.best = self.previous[best_epoch]
+            self.best_epoch = best_epoch
+            self.wait = len(self.previous) - 1 - best_epoch
 
 class BirdSongClassifier:
     """CNN model for bird song classification"""
     
-    def __init__(self, input_shape: Tuple[int, int, int], num_classes: int = 3):
+    def __init__(self, input_shape: Tuple[int, int, int], num_classes: int = 3,
+                 stats: Optional[Tuple[float, float]] = None,
+                 config: Optional[TrainingConfig] = None):
         """
         Initialize model
         
         Args:
             input_shape: Shape of input images (height, width, channels)
             num_classes: Number of bird species to classify
+            stats: Training (mean, std). When given, resizing to input_shape and
+                standardization are layers of the model: it takes raw images
+                (uint8 or float, any height and width) and the saved file needs
+                no separate train_stats.npz. Without stats the model expects
+                standardized images of input_shape.
+            config: Optimizer and compute settings (defaults to TrainingConfig())
         """
-        self.input_shape = input_shape
+        self.input_shape = tuple(input_shape)
         self.num_classes = num_classes
-        self.model = self._build_model()
+        self.stats = None if stats is None else (float(stats[0]), float(stats[1]))
+        self.config = config or TrainingConfig()
+        if self.config.mixed_precision and not bfloat16_supported():
+            print("Warning: no bfloat16 support on this hardware, training in float32")
+            self.config = self.config._replace(mixed_precision=False)
+        self.model = self._build_model(self.config.mixed_precision)
+    
+    @property
+    def includes_preprocessing(self) -> bool:
+        """Whether the model resizes and standardizes raw images itself"""
+        return self.stats is not None
         
-    def _build_model(self) -> Sequential:
+    def _build_model(self, mixed_precision: bool = False) -> Sequential:
         """
         Build the CNN architecture
         
+        Args:
+            mixed_precision: Run the network layers in bfloat16; preprocessing
+                and the softmax stay float32
+        
         Returns:
             Compiled Keras model
         """
-        model = Sequential([
+        dtype = 'mixed_bfloat16' if mixed_precision else None
+        if self.includes_preprocessing:
+            # Raw images in, resized and standardized inside the graph
+            height, width, channels = self.input_shape
+            mean, std = self.stats
+            preprocessing = [
+                Input(shape=(None, None, channels), name=RAW_INPUT_NAME),
+                Resizing(height, width, name='resize'),
+                Rescaling(1.0 / std, offset=-mean / std, name='standardize'),
+            ]
+            first_conv_args = {}
+        else:
+            preprocessing = []
+            first_conv_args = {'input_shape': self.input_shape}
+        
+        model = Sequential(preprocessing + [
             # First Conv Block
             Conv2D(32, (3, 3), 
-                  input_shape=self.input_shape,
-                  kernel_regularizer=regularizers.l2(0.001)),
-            BatchNormalization(),
-            Activation('relu'),
-            MaxPooling2D(pool_size=(2, 2)),
+                  **first_conv_args,
+                  kernel_regularizer=regularizers.l2(0.001), dtype=dtype),
+            BatchNormalization(dtype=dtype),
+            Activation('relu', dtype=dtype),
+            MaxPooling2D(pool_size=(2, 2), dtype=dtype),
             
             # Second Conv Block
             Conv2D(32, (3, 3),
-                  kernel_regularizer=regularizers.l2(0.001)),
-            BatchNormalization(),
-            Activation('relu'),
-            MaxPooling2D(pool_size=(2, 2)),
+                  kernel_regularizer=regularizers.l2(0.001), dtype=dtype),
+            BatchNormalization(dtype=dtype),
+            Activation('relu', dtype=dtype),
+            MaxPooling2D(pool_size=(2, 2), dtype=dtype),
             
             # Flatten and Dense Layers
-            Flatten(),
-            Dense(16, kernel_regularizer=regularizers.l2(0.001)),
-            Dropout(0.5),
-            Dense(self.num_classes),
-            Activation('softmax')
+            Flatten(dtype=dtype),
+            Dense(16, kernel_regularizer=regularizers.l2(0.001), dtype=dtype),
+            Dropout(0.5, dtype=dtype),
+            Dense(self.num_classes, dtype=dtype),
+            # Softmax in float32 for a numerically stable loss
+            Activation('softmax', dtype='float32')
         ])
         
         # Compile model
         model.compile(
-            optimizer=Adam(learning_rate=0.0001),
+            optimizer=Adam(learning_rate=learning_rate_schedule(self.config)),
             loss='sparse_categorical_crossentropy',
-            metrics=['accuracy']
+            metrics=['accuracy'],
+            jit_compile=self.config.jit_compile
         )
         
         return model
     
     def train(self, 
-              X_train: np.ndarray, 
-              y_train: np.ndarray,
+              X_train: Union[np.ndarray, tf.data.Dataset], 
+              y_train: Optional[np.ndarray] = None,
               validation_split: float = 0.1,
               batch_size: int = 64,
               epochs: int = 3,
-              verbose: int = 1) -> tf.keras.callbacks.History:
+              verbose: int = 1,
+              validation_data: Optional[tf.data.Dataset] = None,
+              run_dir: Optional[Union[str, Path]] = None,
+              patience: Optional[int] = None,
+              checkpoint_every: Union[str, int] = 'epoch',
+              resume: bool = True) -> tf.keras.callbacks.History:
         """
         Train the model
         
+        With a run directory, weights and optimizer state are backed up
+        periodically and an interrupted run restarts from the latest backup
+        (which is deleted once training finishes). The directory also holds
+        the per-epoch history (history.csv) and the weights with the lowest
+        validation loss (best.weights.h5).
+        
         Args:
-            X_train: Training images
-            y_train: Training labels
-            validation_split: Fraction of data to use for validation
-            batch_size: Batch size for training
+            X_train: Training images, or a tf.data.Dataset of (images, labels) batches
+            y_train: Training labels (not used with a dataset)
+            validation_split: Fraction of data to use for validation (arrays only)
+            batch_size: Batch size for training (arrays only)
             epochs: Number of epochs to train
             verbose: Verbosity mode
+            validation_data: Validation dataset (datasets only)
+            run_dir: Directory for checkpoints and history (None to keep
+                nothing on disk)
+            patience: Stop after this many epochs without a lower validation
+                loss and restore the best weights (None to train all epochs)
+            checkpoint_every: Back up at the end of every 'epoch' or every
+                given number of training steps
+            resume: Continue from the backup in run_dir if there is one,
+                otherwise discard it and start over
             
         Returns:
-            Training history
-        """
-        return self.model.fit(
-            X_train, y_train,
-            batch_size=batch_size,
-            epochs=epochs,
-            validation_split=validation_split,
-            verbose=verbose
-        )
+            Training history (with a run directory, of all epochs of the run,
+            including those before a restart)
+        """
+        callbacks = []
+        previous = {}
+        if run_dir is not None:
+            run_dir = Path(run_dir)
+            backup_dir = run_dir / BACKUP_DIR
+            if not resume:
+                shutil.rmtree(backup_dir, ignore_errors=True)
+            resuming = backup_dir.exists() and any(backup_dir.iterdir())
+            if resuming:
+                print(f"Resuming training from the checkpoint in {backup_dir}")
+                previous = read_history(run_dir / HISTORY_FILE)
+            run_dir.mkdir(parents=True, exist_ok=True)
+            best_val_loss = min(previous['val_loss']) if previous.get('val_loss') else None
+            # Logged before the backup, so a resumed epoch is never missing from the history
+            callbacks += [
+                CSVLogger(str(run_dir / HISTORY_FILE), append=resuming),
+                ModelCheckpoint(str(run_dir / BEST_WEIGHTS_FILE), monitor='val_loss',
+                                save_best_only=True, save_weights_only=True,
+                                initial_value_threshold=best_val_loss),
+                BackupAndRestore(str(backup_dir), save_freq=checkpoint_every),
+            ]
+        if patience is not None:
+            if run_dir is None:
+                callbacks.append(EarlyStopping(monitor='val_loss', patience=patience,
+                                               restore_best_weights=True, verbose=verbose))
+            else:
+                # Best weights come from best.weights.h5, which survives restarts
+                callbacks.append(ResumableEarlyStopping(previous.get('val_loss', []), monitor='val_loss',
+                                                        patience=patience, verbose=verbose))
+        
+        if isinstance(X_train, tf.data.Dataset):
+            # Batching and the validation split are handled by the input pipeline
+            history = self.model.fit(
+                X_train,
+                epochs=epochs,
+                validation_data=validation_data,
+                callbacks=callbacks,
+                verbose=verbose
+            )
+        else:
+            history = self.model.fit(
+                X_train, y_train,
+                batch_size=batch_size,
+                epochs=epochs,
+                validation_split=validation_split,
+                callbacks=callbacks,
+                verbose=verbose
+            )
+        
+        if run_dir is not None:
+            if patience is not None and (run_dir / BEST_WEIGHTS_FILE).exists():
+                self.model.load_weights(run_dir / BEST_WEIGHTS_FILE)
+            history.history = read_history(run_dir / HISTORY_FILE)
+        return history
     
-    def evaluate(self, X_test: np.ndarray, y_test: np.ndarray) -> Tuple[float, float]:
+    def evaluate(self, X_test: Union[np.ndarray, tf.data.Dataset],
+                 y_test: Optional[np.ndarray] = None) -> Tuple[float, float]:
         """
         Evaluate model on test data
         
         Args:
-            X_test: Test images
-            y_test: Test labels
+            X_test: Test images, or a tf.data.Dataset of (images, labels) batches
+            y_test: Test labels (not used with a dataset)
             
         Returns:
             Tuple of (loss, accuracy)
         """
         return self.model.evaluate(X_test, y_test)
     
-    def predict(self, X: np.ndarray) -> np.ndarray:
+    def regularization_loss(self) -> float:
+        """Sum of the weight regularization penalties included in the training loss"""
+        return float(sum(np.sum(loss) for loss in self.model.losses))
+    
+    def predict(self, X: Union[np.ndarray, tf.data.Dataset], verbose: int = 1) -> np.ndarray:
         """
         Make predictions on new data
         
         Args:
-            X: Input images
+            X: Input images, or a tf.data.Dataset of image batches
+            verbose: Verbosity mode
             
         Returns:
             Predicted probabilities for each class
         """
-        return self.model.predict(X)
+        return self.model.predict(X, verbose=verbose)
+    
+    def predict_on_batch(self, X: np.ndarray) -> np.ndarray:
+        """
+        Make predictions on a single batch, skipping the per-call setup of predict
+        
+        Args:
+            X: Input images (one batch); raw images if the model includes
+                preprocessing, standardized images otherwise
+            
+        Returns:
+            Predicted probabilities for each class
+        """
+        return np.asarray(self.model.predict_on_batch(X))
     
     def save(self, filepath: str):
-        """Save model to file"""
-        self.model.save(filepath)
+        """
+        Save model (including embedded preprocessing) to file
+        
+        A model trained with mixed precision is saved as its float32
+        equivalent (the weights are float32 either way), so inference and
+        export do not depend on bfloat16 support.
+        """
+        if self.config.mixed_precision:
+            model = self._build_model(mixed_precision=False)
+            model.set_weights(self.model.get_weights())
+            model.save(filepath)
+        else:
+            self.model.save(filepath)
     
     @classmethod
     def load(cls, filepath: str) -> 'BirdSongClassifier':
-        """Load model from file"""
+        """
+        Load model from file
+        
+        Models saved without embedded preprocessing still load; they expect
+        standardized input (see ``includes_preprocessing``).
+        """
         model = tf.keras.models.load_model(filepath)
-        instance = cls(model.input_shape[1:])
+        # Bypass __init__ so no throwaway model is built and compiled
+        instance = cls.__new__(cls)
+        instance.num_classes = model.output_shape[-1]
+        instance.config = TrainingConfig()
         instance.model = model
+        try:
+            resize = model.get_layer('resize')
+            standardize = model.get_layer('standardize')
+        except ValueError:
+            instance.input_shape = tuple(model.input_shape[1:])
+            instance.stats = None
+        else:
+            instance.input_shape = (resize.height, resize.width, model.input_shape[-1])
+            std = 1.0 / float(standardize.scale)
+            instance.stats = (-float(standardize.offset) * std, std)
         return instance
\ No newline at end of file
@@ -1,37 +1,120 @@
 # src/birdsong_classification/models/train.py
+import argparse
+import json
+import math
 from pathlib import Path
 import numpy as np
 
 from birdsong_classification.data.dataset import BirdSongDataset
-from birdsong_classification.models.model import BirdSongClassifier
+from birdsong_classification.data.preprocessing import load_train_stats
+from birdsong_classification.data.store import SpectrogramStore
+from birdsong_classification.models.config import LR_SCHEDULES, TrainingConfig
 from birdsong_classification.utils.path_utils import get_project_root, get_data_dir, get_models_dir
-from birdsong_classification.utils.visualization import Visualizer
 
 def main():
+    parser = argparse.ArgumentParser(description='Train the bird song classifier')
+    parser.add_argument('--batch-size', type=int, default=64,
+                      help='Number of samples per training step')
+    parser.add_argument('--epochs', type=int, default=50,
+                      help='Number of epochs to train')
+    parser.add_argument('--learning-rate', type=float, default=0.0001,
+                      help='Initial learning rate')
+    parser.add_argument('--lr-schedule', type=str, default='constant', choices=LR_SCHEDULES,
+                      help='Learning rate schedule')
+    parser.add_argument('--decay-steps', type=int, default=None,
+                      help='Steps over which the learning rate decays (defaults to the whole run)')
+    parser.add_argument('--decay-rate', type=float, default=0.9,
+                      help='Decay factor of the exponential schedule')
+    parser.add_argument('--jit-compile', action='store_true',
+                      help='Compile the training step with XLA')
+    parser.add_argument('--mixed-precision', action='store_true',
+                      help='Train in bfloat16 mixed precision where the hardware supports it')
+    parser.add_argument('--patience', type=int, default=10,
+                      help='Stop after this many epochs without a lower validation loss (0 to train all epochs)')
+    parser.add_argument('--run-dir', type=str, default=None,
+                      help='Directory for checkpoints and history (defaults to models/training_run)')
+    parser.add_argument('--checkpoint-steps', type=int, default=None,
+                      help='Back up every this many steps instead of every epoch')
+    parser.add_argument('--restart', action='store_true',
+                      help='Discard the checkpoint of an interrupted run instead of resuming it')
+    args = parser.parse_args()
+    
+    # TensorFlow is only imported once the arguments are parsed
+    from birdsong_classification.data.pipeline import split_indices, store_dataset
+    from birdsong_classification.models.model import BirdSongClassifier
+    
     # Get directories using utility functions
     data_dir = get_data_dir() / "processed" / "train"
     models_dir = get_models_dir()
+    run_dir = Path(args.run_dir) if args.run_dir else models_dir / "training_run"
     
-    # Create models directory if it doesn't exist
+    # Create models and run directories if they don't exist
     models_dir.mkdir(parents=True, exist_ok=True)
+    run_dir.mkdir(parents=True, exist_ok=True)
+    with open(run_dir / "config.json", "w") as f:
+        json.dump(vars(args), f, indent=2)
     
     print(f"Loading data from: {data_dir}")
     print(f"Saving model to: {models_dir}")
+    print(f"Checkpoints and history in: {run_dir}")
     
     try:
-        # Load processed data
-        X, y = BirdSongDataset.load_pickle_data(data_dir)
-        print(f"Loaded {len(X)} samples with shape {X.shape}")
+        if SpectrogramStore.exists(data_dir):
+            # Standardization is a layer of the model, so raw images are fed
+            stats = load_train_stats()
+            # Stream raw batches from the memory-mapped store
+            store = BirdSongDataset.load_store(data_dir)
+            print(f"Found {len(store)} samples with shape {store.shape}")
+            if store.recording_ids is None:
+                print("Warning: the store has no recording ids, so validation syllables may come from "
+                      "training recordings; rerun prepare_data to split by recording")
+            train_indices, val_indices = split_indices(len(store), validation_split=0.1, labels=store.labels,
+                                                       recording_ids=store.recording_ids)
+            train_data = store_dataset(store, train_indices, batch_size=args.batch_size, shuffle=True)
+            val_data = store_dataset(store, val_indices, batch_size=args.batch_size)
+            input_shape, y = store.sample_shape, store.labels
+            num_train = len(train_indices)
+        else:
+            # Legacy pickle files are loaded into memory; they already hold
+            # standardized data, so the model must not standardize again
+            stats = None
+            X, y = BirdSongDataset.load_standardized_data(data_dir)
+            print(f"Loaded {len(X)} samples with shape {X.shape}")
+            print("Warning: legacy pickle data, the model will need train_stats.npz at prediction time")
+            input_shape = X.shape[1:]
+            num_train = int(len(X) * 0.9)
+        
+        # Decay over the whole run unless told otherwise
+        decay_steps = args.decay_steps or args.epochs * max(math.ceil(num_train / args.batch_size), 1)
+        config = TrainingConfig(
+            learning_rate=args.learning_rate,
+            lr_schedule=args.lr_schedule,
+            decay_steps=decay_steps,
+            decay_rate=args.decay_rate,
+            jit_compile=True if args.jit_compile else 'auto',
+            mixed_precision=args.mixed_precision
+        )
         
         # Create and train model
         model = BirdSongClassifier(
-            input_shape=X.shape[1:],
-            num_classes=len(np.unique(y))
+            input_shape=input_shape,
+            num_classes=len(np.unique(y)),
+            stats=stats,
+            config=config
         )
         
-        # Train model
+        # Train model, resuming an interrupted run from its latest checkpoint
         print("Training model...")
-        history = model.train(X, y, epochs=50)
+        run_args = dict(
+            run_dir=run_dir,
+            patience=args.patience or None,
+            checkpoint_every=args.checkpoint_steps or 'epoch',
+            resume=not args.restart
+        )
+        if SpectrogramStore.exists(data_dir):
+            history = model.train(train_data, validation_data=val_data, epochs=args.epochs, **run_args)
+        else:
+            history = model.train(X, y, batch_size=args.batch_size, epochs=args.epochs, **run_args)
         
         # Save model
         model_path = models_dir / "birdsong_classifier.h5"
@@ -40,6 +123,7 @@ def main():
         
         # Plot training history
         try:
+            from birdsong_classification.utils.visualization import Visualizer
             visualizer = Visualizer()
             visualizer.plot_training_history(history)
             print("Training plots saved to results directory")
@@ -1,45 +1,90 @@
 # python/src/birdsong_classification/predict.py
+import argparse
+import shutil
 import sys
+import tempfile
 from pathlib import Path
-import matlab.engine
 import numpy as np
 import json
-from typing import Dict
-import tensorflow as tf
-import h5py
+from typing import Dict, List, Optional
 
-from birdsong_classification.data.dataset import BirdSongDataset
-from birdsong_classification.models.model import BirdSongClassifier
+from birdsong_classification.audio.cache import FeatureCache, hash_audio, make_key
+from birdsong_classification.audio.pipeline import process_single_audio, syllable_params
+from birdsong_classification.audio.spectrogram import SpectrogramFeaturizer
+from birdsong_classification.models.aggregation import STRATEGIES, Aggregator
+from birdsong_classification.models.backend import load_backend
 from birdsong_classification.utils.path_utils import get_project_root, get_models_dir
 
 CATEGORIES = ["common_chaffinch", "eurasian_blue_tit", "house_sparrow"]
 
-def predict_bird_species(audio_path: str) -> Dict:
+def summarize_predictions(predictions: np.ndarray, categories: List[str] = CATEGORIES,
+                          strategy: str = 'vote') -> Dict:
     """
-    Predict bird species from audio file
+    Turn per-syllable class probabilities into the prediction result
     
     Args:
-        audio_path: Path to audio file
+        predictions: Predicted probabilities of shape (n_syllables, n_classes)
+        categories: List of category names
+        strategy: Aggregation strategy ('vote', 'mean' or 'logprob')
         
     Returns:
         Dictionary containing predictions and confidence scores
     """
-    print(f"Processing audio file: {audio_path}")
+    if len(predictions) == 0:
+        raise ValueError("No syllables to classify")
     
-    # Create temporary directory for spectrograms
-    temp_dir = Path(get_project_root()) / "temp_predict"
-    temp_dir.mkdir(exist_ok=True)
+    # Vote (or average probabilities) and calculate confidence
+    aggregator = Aggregator(len(categories), strategy)
+    aggregator.update(predictions)
+    scores = aggregator.scores()
+    confidence_scores = {cat: float(score) for cat, score in zip(categories, scores)}
     
-    try:
-        # Start MATLAB engine
-        print("Starting MATLAB engine...")
-        eng = matlab.engine.start_matlab()
+    return {
+        'predicted_species': categories[aggregator.predicted_class()],
+        'confidence_scores': confidence_scores,
+        'individual_predictions': [categories[i] for i in np.argmax(predictions, axis=1)]
+    }
+
+def start_matlab_engine():
+    """Start a MATLAB engine with the pipeline's source directories on its path"""
+    # stderr, so tools that write JSON lines to stdout can use the engine
+    print("Starting MATLAB engine...", file=sys.stderr)
+    import matlab.engine
+    eng = matlab.engine.start_matlab()
+    
+    # Add MATLAB paths
+    matlab_dir = get_project_root() / "matlab"
+    eng.addpath(str(matlab_dir))
+    eng.addpath(str(matlab_dir / "src"))
+    eng.addpath(eng.genpath(str(matlab_dir / "src" / "utils")))
+    return eng
+
+def extract_features_matlab(audio_path: str, cache: Optional[FeatureCache] = None) -> np.ndarray:
+    """
+    Extract spectrograms with the original MATLAB pipeline
+    
+    MATLAB writes JPEGs to a temporary directory that is unique to the call,
+    so concurrent predictions do not collide.
+    
+    Args:
+        audio_path: Path to audio file
+        cache: Optional cache; the decoded images of a recording are stored
+            on first use, so repeat predictions skip MATLAB (and reuse the
+            syllables it sampled then)
         
-        # Add MATLAB paths
-        matlab_dir = get_project_root() / "matlab"
-        eng.addpath(str(matlab_dir))
-        eng.addpath(str(matlab_dir / "src"))
-        eng.addpath(eng.genpath(str(matlab_dir / "src" / "utils")))
+    Returns:
+        Spectrogram images of shape (n_syllables, height, width, channels)
+    """
+    if cache is not None:
+        key = make_key(hash_audio(audio_path), {**syllable_params(), 'featurizer': 'matlab', 'img_size': 150})
+        X = cache.get(key, 'matlab-features')
+        if X is not None:
+            return X
+    
+    temp_dir = Path(tempfile.mkdtemp(prefix="birdsong_predict_"))
+    eng = None
+    try:
+        eng = start_matlab_engine()
         
         # Process audio in MATLAB
         print("Extracting syllables and generating spectrograms...")
@@ -47,55 +92,98 @@ def predict_bird_species(audio_path: str) -> Dict:
         
         # Load spectrograms
         print("Loading spectrograms...")
+        from birdsong_classification.data.dataset import BirdSongDataset
         dataset = BirdSongDataset(str(temp_dir), CATEGORIES)
         X, _ = dataset.load_data(prediction_mode=True)
-        
-        # Load and apply training data statistics
-        stats = np.load(get_models_dir() / 'train_stats.npz')
-        X = (X - stats['mean']) / stats['std']
-        print(X.shape)
-        # Load model and predict
-        print(get_models_dir() / "birdsong_classifier.h5")
-        model = BirdSongClassifier.load(get_models_dir() / "birdsong_classifier.h5")
-
-        predictions = model.predict(X)
-        pred_classes = np.argmax(predictions, axis=1)
-        
-        # Vote and calculate confidence
-        final_class = np.bincount(pred_classes).argmax()
-        confidence_scores = {
-            cat: float(np.mean(pred_classes == i))
-            for i, cat in enumerate(CATEGORIES)
-        }
-        
-        result = {
-            'predicted_species': CATEGORIES[final_class],
-            'confidence_scores': confidence_scores,
-            'individual_predictions': [CATEGORIES[i] for i in pred_classes]
-        }
-        
-        print("\nPrediction Results:")
-        print(f"Predicted Species: {result['predicted_species']}")
-        print("\nConfidence Scores:")
-        for species, score in result['confidence_scores'].items():
-            print(f"  {species}: {score*100:.1f}%")
-        
-        return result
+        if cache is not None:
+            cache.put(key, 'matlab-features', X)
+        return X
         
     finally:
-        # Cleanup
-        try:
+        if eng is not None:
             eng.quit()
-        except:
-            pass
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def predict_bird_species(audio_path: str,
+                         model_path: Optional[str] = None,
+                         stats_path: Optional[str] = None,
+                         use_matlab: bool = True,
+                         strategy: str = 'vote',
+                         cache: Optional[FeatureCache] = None) -> Dict:
+    """
+    Predict bird species from audio file
+    
+    By default the spectrograms are rendered by MATLAB, exactly like the
+    JPEGs the model was trained on. With ``use_matlab=False`` syllables are
+    segmented and rendered in memory and handed to the model as an array,
+    without MATLAB or the filesystem. That featurizer only approximates the
+    JPEGs (see audio/spectrogram.py); measure its agreement with the model
+    using audio/agreement.py before relying on it.
+    
+    Args:
+        audio_path: Path to audio file
+        model_path: Path to the trained model (defaults to models/birdsong_classifier.h5)
+        stats_path: Training statistics, only needed for models without embedded
+            preprocessing (defaults to models/train_stats.npz)
+        use_matlab: Generate spectrograms with the MATLAB engine (False for
+            the in-memory featurizer)
+        strategy: Aggregation strategy ('vote', 'mean' or 'logprob')
+        cache: Optional cache of syllables and spectrograms of previously
+            seen recordings
         
-        if temp_dir.exists():
-            import shutil
-            shutil.rmtree(temp_dir)
+    Returns:
+        Dictionary containing predictions and confidence scores
+    """
+    print(f"Processing audio file: {audio_path}")
+    
+    model = load_backend(model_path or get_models_dir() / "birdsong_classifier.h5", stats_path=stats_path)
+    
+    if use_matlab:
+        X = extract_features_matlab(audio_path, cache)
+    else:
+        print("Extracting syllables and generating spectrograms...")
+        height, _, channels = model.input_shape
+        featurizer = SpectrogramFeaturizer(img_size=height, colormap='parula' if channels == 3 else None)
+        X = process_single_audio(audio_path, featurizer=featurizer, cache=cache)
+    
+    if len(X) == 0:
+        raise ValueError("No syllables detected in audio")
+    
+    # Raw images in; standardization happens in the model (or its backend)
+    predictions = model.predict_on_batch(X)
+    result = summarize_predictions(predictions, strategy=strategy)
+    
+    print("\nPrediction Results:")
+    print(f"Predicted Species: {result['predicted_species']}")
+    print("\nConfidence Scores:")
+    for species, score in result['confidence_scores'].items():
+        print(f"  {species}: {score*100:.1f}%")
+    
+    return result
 
-if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python -m birdsong_classification.predict <audio_file>")
-        sys.exit(1)
+def main():
+    parser = argparse.ArgumentParser(description='Predict bird species from an audio file')
+    parser.add_argument('audio_file', type=str,
+                      help='Path to audio file')
+    parser.add_argument('--model', type=str, default=None,
+                      help='Path to trained model (.h5, or .tflite for the TFLite runtime)')
+    parser.add_argument('--stats', type=str, default=None,
+                      help='Path to training statistics (models without embedded preprocessing)')
+    parser.add_argument('--in-memory', action='store_true',
+                      help='Generate spectrograms with the in-memory featurizer instead of MATLAB '
+                           '(approximates the training JPEGs; see audio/agreement.py)')
+    parser.add_argument('--strategy', type=str, default='vote', choices=STRATEGIES,
+                      help='How syllable predictions are combined')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                      help='Cache syllables and spectrograms in this directory for repeat predictions')
+    parser.add_argument('--cache-size-mb', type=float, default=1024,
+                      help='Cache size limit in MB')
+    args = parser.parse_args()
     
-    predict_bird_species(sys.argv[1])
\ No newline at end of file
+    cache = None
+    if args.cache_dir:
+        cache = FeatureCache(args.cache_dir, max_bytes=int(args.cache_size_mb * 2**20))
+    predict_bird_species(args.audio_file, args.model, args.stats, not args.in_memory, args.strategy, cache)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+# python/src/birdsong_classification/predict_batch.py
+"""
+Batch prediction over directories of recordings
+
+Files are segmented and turned into spectrograms by a pool of worker
+processes; the syllables of many files are pooled into large inference
+batches and the votes are aggregated per file. Results are appended to a
+CSV or JSONL file as soon as each file is done, and files that already have
+a result in the output are skipped, so an interrupted run can simply be
+restarted. Files that failed are tried again.
+The in-memory featurizer is only used if an agreement report
+(audio/agreement.py) accepts it for the model; with ``--matlab`` every
+worker renders with its own MATLAB engine instead. Each result records which
+featurizer was used.
+
+Usage:
+    python -m birdsong_classification.predict_batch <dir|glob> [...] --output results.csv
+"""
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from birdsong_classification.models.aggregation import STRATEGIES, Aggregator
+from birdsong_classification.utils.path_utils import get_models_dir
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac', '.ogg')
+
+_featurizer = None
+_max_syllables = None
+_seed = None
+_filtered_dir = None
+_cache = None
+
+
+def find_audio_files(inputs: List[str]) -> List[Path]:
+    """
+    Expand directories (recursively) and glob patterns into audio files
+
+    Args:
+        inputs: Directories, files or glob patterns
+
+    Returns:
+        Sorted unique list of audio files
+    """
+    files = set()
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            candidates = path.rglob('*')
+        elif path.is_file():
+            candidates = [path]
+        else:
+            candidates = (Path(p) for p in glob.glob(item, recursive=True))
+        files.update(p for p in candidates if p.is_file() and p.suffix.lower() in AUDIO_EXTENSIONS)
+    return sorted(files)
+
+
+def _init_worker(img_size: int, colormap: Optional[str], max_syllables: int, seed: Optional[int],
+                 filtered_dir: Optional[str] = None, cache_dir: Optional[str] = None,
+                 cache_bytes: int = 1 << 30, use_matlab: bool = False):
+    global _featurizer, _max_syllables, _seed, _filtered_dir, _cache
+    from birdsong_classification.audio.cache import FeatureCache
+    from birdsong_classification.audio.spectrogram import SpectrogramFeaturizer
+    if use_matlab:
+        from birdsong_classification.audio.agreement import MatlabFeaturizer
+        _featurizer = MatlabFeaturizer(img_size=img_size)
+    else:
+        _featurizer = SpectrogramFeaturizer(img_size=img_size, colormap=colormap)
+    _max_syllables = max_syllables
+    _seed = seed
+    _filtered_dir = filtered_dir
+    # Workers share the directory; each keeps its own LRU index of it
+    _cache = FeatureCache(cache_dir, max_bytes=cache_bytes) if cache_dir else None
+
+
+def _featurize(path: str) -> Tuple[str, Optional[np.ndarray], Optional[str]]:
+    """Worker task: spectrograms of one file, or an error message"""
+    from birdsong_classification.audio.pipeline import process_single_audio
+    try:
+        rng = None if _seed is None else np.random.default_rng([_seed, zlib.crc32(path.encode())])
+        return path, process_single_audio(path, _max_syllables, _featurizer, rng, cache=_cache,
+                                          filtered_dir=_filtered_dir), None
+    except Exception as e:
+        return path, None, str(e) or type(e).__name__
+
+
+class ResultWriter:
+    """Appends one result per file to a CSV or JSONL file"""
+
+    def __init__(self, output_path: str, categories: List[str], featurizer: str = 'in-memory'):
+        """
+        Open output for appending
+
+        Args:
+            output_path: Output file; '.jsonl' selects JSON lines, anything else CSV
+            categories: Category names for the confidence columns
+            featurizer: Featurizer that renders the spectrograms ('matlab' or
+                'in-memory'), recorded with every result
+        """
+        self.path = Path(output_path)
+        self.jsonl = self.path.suffix.lower() == '.jsonl'
+        self.categories = categories
+        self.featurizer = featurizer
+        self.fieldnames = (['file', 'predicted_species', 'num_syllables']
+                           + [f'confidence_{cat}' for cat in categories] + ['featurizer', 'error'])
+        new_file = not self.path.exists() or self.path.stat().st_size == 0
+        if not new_file and not self.jsonl:
+            with open(self.path, newline='') as f:
+                header = next(csv.reader(f), [])
+            if header != self.fieldnames:
+                raise ValueError(f"{self.path} has the columns {header}, not {self.fieldnames}. "
+                                 "Write to a new output file.")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a', newline='')
+        if not self.jsonl:
+            self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames)
+            if new_file:
+                self._writer.writeheader()
+
+    @staticmethod
+    def completed(output_path: str) -> Set[str]:
+        """Files with a result (not an error) in an existing output"""
+        path = Path(output_path)
+        if not path.exists():
+            return set()
+        with open(path, newline='') as f:
+            if path.suffix.lower() == '.jsonl':
+                done = set()
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Partially written last line of an interrupted run
+                        continue
+                    if record.get('file') and not record.get('error'):
+                        done.add(record['file'])
+                return done
+            return {row['file'] for row in csv.DictReader(f) if row.get('file') and not row.get('error')}
+
+    def write(self, file: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        """
+        Write the result (or error) for one file
+
+        Args:
+            file: Audio file path
+            result: Output of summarize_predictions
+            error: Error message if the file could not be classified
+        """
+        if self.jsonl:
+            record = {'file': file, 'featurizer': self.featurizer, 'error': error}
+            if result is not None:
+                record.update(predicted_species=result['predicted_species'],
+                              num_syllables=len(result['individual_predictions']),
+                              confidence_scores=result['confidence_scores'])
+            self._file.write(json.dumps(record) + '\n')
+        else:
+            row = {'file': file, 'featurizer': self.featurizer, 'error': error or ''}
+            if result is not None:
+                row.update(predicted_species=result['predicted_species'],
+                           num_syllables=len(result['individual_predictions']))
+                row.update({f'confidence_{cat}': result['confidence_scores'][cat] for cat in self.categories})
+            self._writer.writerow(row)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def predict_batch(inputs: List[str],
+                  output_path: str,
+                  model_path: Optional[str] = None,
+                  stats_path: Optional[str] = None,
+                  num_workers: Optional[int] = None,
+                  batch_size: int = 256,
+                  max_syllables: int = 5,
+                  seed: Optional[int] = None,
+                  strategy: str = 'vote',
+                  early_exit_margin: Optional[float] = None,
+                  min_syllables: int = 3,
+                  filtered_dir: Optional[str] = None,
+                  cache_dir: Optional[str] = None,
+                  cache_size_mb: float = 1024,
+                  use_matlab: bool = False,
+                  agreement_report: Optional[str] = None,
+                  min_agreement: Optional[float] = None) -> Dict:
+    """
+    Classify all audio files matched by inputs
+
+    Args:
+        inputs: Directories, files or glob patterns
+        output_path: CSV or JSONL results file (appended to)
+        model_path: Path to the trained model (defaults to models/birdsong_classifier.h5)
+        stats_path: Training statistics, only needed for models without embedded
+            preprocessing (defaults to models/train_stats.npz)
+        num_workers: Number of segmentation processes (defaults to the CPU count)
+        batch_size: Minimum number of pooled syllables per forward pass
+        max_syllables: Maximum number of syllables per file
+        seed: Seed for syllable sampling (None for random)
+        strategy: Aggregation strategy ('vote', 'mean' or 'logprob')
+        early_exit_margin: Stop classifying a file's syllables once the leading
+            class's score exceeds the runner-up by this margin (None to use all)
+        min_syllables: Minimum number of syllables classified before exiting early
+        filtered_dir: Output directory of audio/frontend.py; files with an
+            up-to-date filtered signal there are not decoded again
+        cache_dir: Cache syllables and spectrograms in this directory (None
+            to disable), so files seen before are not segmented or rendered again
+        cache_size_mb: Cache size limit in MB
+        use_matlab: Render spectrograms with a MATLAB engine per worker
+        agreement_report: Agreement report that must accept the in-memory
+            featurizer for this model (defaults to <model>.agreement.json)
+        min_agreement: Minimum recording-level agreement of that report
+            (defaults to agreement.MIN_RECORDING_AGREEMENT)
+
+    Returns:
+        Counts of processed, skipped and failed files, number of classified
+        syllables, elapsed time and files/sec
+    """
+    from birdsong_classification.audio.agreement import MIN_RECORDING_AGREEMENT, featurizer_for_model
+    from birdsong_classification.models.backend import load_backend
+    from birdsong_classification.predict import CATEGORIES, summarize_predictions
+
+    start = time.perf_counter()
+    files = find_audio_files(inputs)
+    done = ResultWriter.completed(output_path)
+    todo = [str(f) for f in files if str(f) not in done]
+    print(f"Found {len(files)} audio files, {len(files) - len(todo)} already classified in {output_path}")
+
+    model_path = model_path or get_models_dir() / "birdsong_classifier.h5"
+    model = load_backend(model_path, stats_path=stats_path)
+    height, _, channels = model.input_shape
+    if use_matlab:
+        if channels != 3:
+            raise ValueError(f"The MATLAB path renders color images; the model expects {channels} channel(s)")
+        colormap, renderer = 'parula', 'matlab'
+    else:
+        # Only checked here; the workers build the same featurizer
+        featurizer = featurizer_for_model(model, model_path, report_path=agreement_report,
+                                          min_agreement=min_agreement or MIN_RECORDING_AGREEMENT)
+        colormap, renderer = featurizer.colormap, featurizer.renderer
+
+    writer = ResultWriter(output_path, CATEGORIES, renderer)
+    summary = {'processed': 0, 'skipped': len(files) - len(todo), 'failed': 0, 'syllables_classified': 0}
+    # path -> (features, aggregator, classified predictions)
+    pooled = {}
+
+    def step(features, aggregator) -> int:
+        # With early exit, classify each file min_syllables rows at a time so
+        # the rest can be skipped once its margin is reached
+        remaining = len(features) - aggregator.count
+        if early_exit_margin is not None:
+            remaining = min(remaining, aggregator.min_syllables)
+        return aggregator.needed(remaining)
+
+    def pending_rows() -> int:
+        return sum(step(features, aggregator) for features, aggregator, _ in pooled.values())
+
+    def run_pool():
+        """Classify the syllables the pooled files still need and write finished files"""
+        requests = []
+        for path, (features, aggregator, _) in pooled.items():
+            take = step(features, aggregator)
+            if take:
+                requests.append((path, features[aggregator.count:aggregator.count + take]))
+        if requests:
+            X = np.concatenate([rows for _, rows in requests])
+            predictions = model.predict_on_batch(X)
+            summary['syllables_classified'] += len(X)
+            splits = np.cumsum([len(rows) for _, rows in requests])[:-1]
+            for (path, _), file_predictions in zip(requests, np.split(predictions, splits)):
+                _, aggregator, classified = pooled[path]
+                aggregator.update(file_predictions)
+                classified.append(file_predictions)
+
+        for path in list(pooled):
+            features, aggregator, classified = pooled[path]
+            if aggregator.done or aggregator.count == len(features):
+                writer.write(path, summarize_predictions(np.concatenate(classified), CATEGORIES, strategy))
+                summary['processed'] += 1
+                del pooled[path]
+
+    num_workers = num_workers or os.cpu_count() or 1
+    # Spawned workers only import the audio code, not TensorFlow
+    context = multiprocessing.get_context('spawn')
+    try:
+        with ProcessPoolExecutor(max_workers=num_workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(height, colormap, max_syllables, seed, filtered_dir,
+                                           cache_dir, int(cache_size_mb * 2**20), use_matlab)) as executor:
+            remaining = iter(todo)
+            in_flight = set()
+            while True:
+                # Bound the number of featurized files held in memory
+                while len(in_flight) < 4 * num_workers:
+                    path = next(remaining, None)
+                    if path is None:
+                        break
+                    in_flight.add(executor.submit(_featurize, path))
+                if not in_flight:
+                    break
+
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    path, features, error = future.result()
+                    if error is None and len(features) == 0:
+                        error = "No syllables detected in audio"
+                    if error is not None:
+                        writer.write(path, error=error)
+                        summary['failed'] += 1
+                        continue
+                    pooled[path] = (features, Aggregator(len(CATEGORIES), strategy, early_exit_margin,
+                                                         min_syllables), [])
+
+                if pending_rows() >= batch_size:
+                    run_pool()
+            while pooled:
+                run_pool()
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    handled = summary['processed'] + summary['failed']
+    summary.update(elapsed_seconds=elapsed, files_per_second=handled / elapsed if elapsed > 0 else 0.0)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Predict bird species for many recordings')
+    parser.add_argument('inputs', nargs='+',
+                      help='Directories, audio files or glob patterns')
+    parser.add_argument('--output', type=str, default='predictions.csv',
+                      help='Results file (.csv or .jsonl); files with a result are skipped, failed ones retried')
+    parser.add_argument('--model', type=str, default=None,
+                      help='Path to trained model (.h5, or .tflite for the TFLite runtime)')
+    parser.add_argument('--stats', type=str, default=None,
+                      help='Path to training statistics (models without embedded preprocessing)')
+    parser.add_argument('--workers', type=int, default=None,
+                      help='Number of segmentation processes (defaults to the CPU count)')
+    parser.add_argument('--batch-size', type=int, default=256,
+                      help='Number of pooled syllables per forward pass')
+    parser.add_argument('--max-syllables', type=int, default=5,
+                      help='Maximum number of syllables per file')
+    parser.add_argument('--seed', type=int, default=None,
+                      help='Seed for syllable sampling')
+    parser.add_argument('--strategy', type=str, default='vote', choices=STRATEGIES,
+                      help='How syllable predictions are combined')
+    parser.add_argument('--early-exit-margin', type=float, default=None,
+                      help='Stop classifying a file once the leading class leads by this score margin')
+    parser.add_argument('--min-syllables', type=int, default=3,
+                      help='Minimum number of syllables classified before exiting early')
+    parser.add_argument('--filtered-dir', type=str, default=None,
+                      help='Reuse filtered signals written by audio.frontend (e.g. data/filtered)')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                      help='Cache syllables and spectrograms in this directory for repeat runs')
+    parser.add_argument('--cache-size-mb', type=float, default=1024,
+                      help='Cache size limit in MB')
+    parser.add_argument('--matlab', action='store_true',
+                      help='Render spectrograms with MATLAB, like the training JPEGs (one engine per worker)')
+    parser.add_argument('--agreement-report', type=str, default=None,
+                      help='Agreement report required for the in-memory featurizer '
+                           '(defaults to <model>.agreement.json)')
+    parser.add_argument('--min-agreement', type=float, default=None,
+                      help='Minimum recording-level agreement in that report (default 0.95)')
+    args = parser.parse_args()
+
+    summary = predict_batch(args.inputs, args.output, args.model, args.stats,
+                            args.workers, args.batch_size, args.max_syllables, args.seed,
+                            args.strategy, args.early_exit_margin, args.min_syllables,
+                            args.filtered_dir, args.cache_dir, args.cache_size_mb,
+                            args.matlab, args.agreement_report, args.min_agreement)
+    print(f"Classified {summary['processed']} files ({summary['syllables_classified']} syllables), "
+          f"{summary['failed']} failed, {summary['skipped']} skipped in {summary['elapsed_seconds']:.1f}s "
+          f"({summary['files_per_second']:.2f} files/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# python/src/birdsong_classification/predict_stream.py
+"""
+Streaming prediction for long recordings
+
+Syllables are detected block by block (see audio/streaming.py), exactly
+like syllable_cut on the whole file, classified in batches as they arrive
+and reported as time-stamped detections together with running per-species
+vote totals. Memory use is bounded by the block and batch sizes, whatever
+the length of the recording. With an early-exit margin, reading stops as
+soon as the leading species is clear. The in-memory
+featurizer is only used if an agreement report (audio/agreement.py) accepts
+it for the model; ``--matlab`` renders the syllables with MATLAB instead.
+
+Usage:
+    python -m birdsong_classification.predict_stream <audio_file> [--batch-size 32]
+
+Prints one JSON line per detection followed by a summary line.
+"""
+import argparse
+import json
+from typing import BinaryIO, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+
+from birdsong_classification.audio.agreement import MIN_RECORDING_AGREEMENT, featurizer_for_model
+from birdsong_classification.audio.streaming import SyllableEvent, stream_syllables
+from birdsong_classification.models.aggregation import STRATEGIES, Aggregator
+from birdsong_classification.models.backend import load_backend
+from birdsong_classification.predict import CATEGORIES
+from birdsong_classification.utils.path_utils import get_models_dir
+
+
+class StreamingPredictor:
+    """Classifies the syllables of a recording while it is being read"""
+
+    def __init__(self,
+                 model_path: Optional[str] = None,
+                 stats_path: Optional[str] = None,
+                 batch_size: int = 32,
+                 categories: List[str] = CATEGORIES,
+                 strategy: str = 'vote',
+                 early_exit_margin: Optional[float] = None,
+                 min_syllables: int = 3,
+                 use_matlab: bool = False,
+                 agreement_report: Optional[str] = None,
+                 min_agreement: float = MIN_RECORDING_AGREEMENT):
+        """
+        Load model and statistics
+
+        Args:
+            model_path: Path to the trained model (defaults to models/birdsong_classifier.h5)
+            stats_path: Training statistics, only needed for models without embedded
+                preprocessing (defaults to models/train_stats.npz)
+            batch_size: Number of syllables classified per forward pass
+            categories: Category names indexed by class
+            strategy: Aggregation strategy for the summary ('vote', 'mean' or 'logprob')
+            early_exit_margin: Stop once the leading species' score exceeds the
+                runner-up by this margin (None to classify the whole recording)
+            min_syllables: Minimum number of syllables classified before exiting early
+            use_matlab: Render spectrograms with the MATLAB engine
+            agreement_report: Agreement report that must accept the in-memory
+                featurizer for this model (defaults to <model>.agreement.json)
+            min_agreement: Minimum recording-level agreement of that report
+        """
+        model_path = model_path or get_models_dir() / "birdsong_classifier.h5"
+        self.model = load_backend(model_path, stats_path=stats_path)
+        self.batch_size = batch_size
+        self.categories = categories
+
+        self.featurizer = featurizer_for_model(self.model, model_path, use_matlab,
+                                               agreement_report, min_agreement)
+        self.aggregator = Aggregator(len(categories), strategy, early_exit_margin, min_syllables)
+        self.stopped_early = False
+
+    def _classify(self, events: List[SyllableEvent]) -> List[Dict]:
+        X = self.featurizer(np.stack([event.samples for event in events]))
+        probabilities = self.model.predict_on_batch(X)
+        detections = []
+        for event, probs in zip(events, probabilities):
+            pred_class = int(np.argmax(probs))
+            self.aggregator.update(probs[np.newaxis])
+            detections.append({
+                'start': float(event.start),
+                'end': float(event.end),
+                'species': self.categories[pred_class],
+                'confidence': float(probs[pred_class]),
+                'votes': self.vote_totals(),
+            })
+        return detections
+
+    def run(self, audio: Union[str, BinaryIO], block_seconds: float = 10.0,
+            two_pass: bool = True) -> Iterator[Dict]:
+        """
+        Detect and classify syllables in a recording
+
+        Vote totals are reset at the start of each run. With an early-exit
+        margin the recording is only read until the margin is reached; it is
+        checked after every batch.
+
+        Args:
+            audio: Path to audio file or a binary file-like object
+            block_seconds: Duration of the blocks read from the file
+            two_pass: Find the detection threshold in a first pass over the
+                file, as syllable_cut does (see stream_syllables)
+
+        Yields:
+            Detections in time order with start/end (seconds), species,
+            confidence and the running vote totals
+        """
+        self.aggregator.reset()
+        self.stopped_early = False
+        batch = []
+        for event in stream_syllables(audio, block_seconds, two_pass=two_pass):
+            batch.append(event)
+            # Smaller batches while early exit still needs to reach min_syllables
+            if len(batch) >= self.aggregator.needed(self.batch_size):
+                yield from self._classify(batch)
+                batch = []
+                if self.aggregator.done:
+                    self.stopped_early = True
+                    return
+        if batch:
+            yield from self._classify(batch)
+
+    def vote_totals(self) -> Dict[str, int]:
+        """Number of syllables assigned to each species so far"""
+        return {cat: int(count) for cat, count in zip(self.categories, self.aggregator.votes)}
+
+    def summary(self) -> Dict:
+        """
+        Result of the syllables classified so far
+
+        Returns:
+            Dictionary with the predicted species (None without syllables),
+            the aggregated score per species, the number of syllables,
+            whether the run stopped early and the featurizer that rendered
+            the spectrograms ('matlab' or 'in-memory')
+        """
+        pred_class = self.aggregator.predicted_class()
+        return {
+            'predicted_species': self.categories[pred_class] if pred_class is not None else None,
+            'confidence_scores': {
+                cat: float(score) for cat, score in zip(self.categories, self.aggregator.scores())
+            },
+            'num_syllables': self.aggregator.count,
+            'early_exit': self.stopped_early,
+            'featurizer': self.featurizer.renderer,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Predict bird species in a long recording')
+    parser.add_argument('audio_file', type=str,
+                      help='Path to audio file')
+    parser.add_argument('--model', type=str, default=None,
+                      help='Path to trained model (.h5, or .tflite for the TFLite runtime)')
+    parser.add_argument('--stats', type=str, default=None,
+                      help='Path to training statistics (models without embedded preprocessing)')
+    parser.add_argument('--batch-size', type=int, default=32,
+                      help='Number of syllables per forward pass')
+    parser.add_argument('--block-seconds', type=float, default=10.0,
+                      help='Duration of the audio blocks read at a time')
+    parser.add_argument('--single-pass', action='store_true',
+                      help='Read the file once, with a running detection threshold '
+                           '(differs from syllable_cut early in the recording)')
+    parser.add_argument('--strategy', type=str, default='vote', choices=STRATEGIES,
+                      help='How syllable predictions are combined in the summary')
+    parser.add_argument('--early-exit-margin', type=float, default=None,
+                      help='Stop once the leading species leads by this score margin')
+    parser.add_argument('--min-syllables', type=int, default=3,
+                      help='Minimum number of syllables classified before exiting early')
+    parser.add_argument('--matlab', action='store_true',
+                      help='Render spectrograms with the MATLAB engine, like the training JPEGs')
+    parser.add_argument('--agreement-report', type=str, default=None,
+                      help='Agreement report required for the in-memory featurizer '
+                           '(defaults to <model>.agreement.json)')
+    parser.add_argument('--min-agreement', type=float, default=MIN_RECORDING_AGREEMENT,
+                      help='Minimum recording-level agreement in that report')
+    args = parser.parse_args()
+
+    predictor = StreamingPredictor(args.model, args.stats, batch_size=args.batch_size,
+                                   strategy=args.strategy, early_exit_margin=args.early_exit_margin,
+                                   min_syllables=args.min_syllables, use_matlab=args.matlab,
+                                   agreement_report=args.agreement_report,
+                                   min_agreement=args.min_agreement)
+    for detection in predictor.run(args.audio_file, args.block_seconds, not args.single_pass):
+        print(json.dumps(detection), flush=True)
+    print(json.dumps({'summary': predictor.summary()}), flush=True)
+
+
+if __name__ == "__main__":
+    main()
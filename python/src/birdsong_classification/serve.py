@@ -0,0 +1,240 @@
+# python/src/birdsong_classification/serve.py
+"""
+Long-running prediction service
+
+Loads the model and training statistics once and answers prediction requests
+over local HTTP. Concurrent requests are micro-batched into a single
+``model.predict`` call. Spectrograms are rendered in memory only if an
+agreement report (audio/agreement.py) accepts that featurizer for the model;
+with ``--matlab`` they are rendered by the MATLAB engine instead.
+
+Endpoints:
+    POST /predict  JSON body {"path": "<audio file>"} or raw audio bytes
+    GET  /health   Liveness check
+    GET  /stats    Request count, p50/p99 latency in milliseconds and
+                   batching counters (queue depth, batch fill ratio) and
+                   feature cache hits/misses when enabled
+"""
+import argparse
+import io
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Union
+
+import numpy as np
+
+from birdsong_classification.audio.agreement import MIN_RECORDING_AGREEMENT, MatlabFeaturizer, featurizer_for_model
+from birdsong_classification.audio.cache import FeatureCache
+from birdsong_classification.audio.pipeline import process_single_audio
+from birdsong_classification.models.backend import load_backend
+from birdsong_classification.models.batching import MicroBatcher
+from birdsong_classification.predict import CATEGORIES, summarize_predictions
+from birdsong_classification.utils.path_utils import get_models_dir
+
+
+class PredictionService:
+    """Keeps the classifier warm and serves predictions for audio files"""
+    
+    def __init__(self,
+                 model_path: Optional[str] = None,
+                 stats_path: Optional[str] = None,
+                 max_batch_size: int = 64,
+                 max_wait_ms: float = 5.0,
+                 max_queue_size: int = 0,
+                 latency_window: int = 10000,
+                 cache: Optional[FeatureCache] = None,
+                 use_matlab: bool = False,
+                 agreement_report: Optional[str] = None,
+                 min_agreement: float = MIN_RECORDING_AGREEMENT):
+        """
+        Load model and statistics
+        
+        Args:
+            model_path: Path to the trained model (defaults to models/birdsong_classifier.h5)
+            stats_path: Training statistics, only needed for models without embedded
+                preprocessing (defaults to models/train_stats.npz)
+            max_batch_size: Maximum number of syllables per predict call
+            max_wait_ms: Maximum time to wait for other requests to join a batch
+            max_queue_size: Maximum number of requests waiting for the model (0 for no limit)
+            latency_window: Number of recent requests used for latency percentiles
+            cache: Optional feature cache for audio that was seen before
+            use_matlab: Render spectrograms with the MATLAB engine
+            agreement_report: Agreement report that must accept the in-memory
+                featurizer for this model (defaults to <model>.agreement.json)
+            min_agreement: Minimum recording-level agreement of that report
+        """
+        model_path = model_path or get_models_dir() / "birdsong_classifier.h5"
+        
+        print(f"Loading model from {model_path}")
+        self.model = load_backend(model_path, stats_path=stats_path)
+        
+        height, width, channels = self.model.input_shape
+        self.featurizer = featurizer_for_model(self.model, model_path, use_matlab,
+                                               agreement_report, min_agreement)
+        print(f"Rendering spectrograms with the {self.featurizer.renderer} featurizer")
+        
+        # Trace the model once so the first request does not pay for it
+        self.model.predict_on_batch(np.zeros((1, height, width, channels), dtype=np.float32))
+        
+        self.batcher = MicroBatcher.for_classifier(
+            self.model,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            max_queue_size=max_queue_size
+        )
+        self.cache = cache
+        self._latencies = deque(maxlen=latency_window)
+        self._lock = threading.Lock()
+    
+    def predict(self, audio: Union[str, BinaryIO]) -> Dict:
+        """
+        Predict bird species from audio
+        
+        Args:
+            audio: Path to audio file or a binary file-like object
+            
+        Returns:
+            Same dictionary as predict.predict_bird_species, plus the
+            featurizer that rendered the spectrograms ('matlab' or 'in-memory')
+        """
+        start = time.perf_counter()
+        X = process_single_audio(audio, featurizer=self.featurizer, cache=self.cache)
+        if len(X) == 0:
+            raise ValueError("No syllables detected in audio")
+        result = summarize_predictions(self.batcher.predict(X), CATEGORIES)
+        result['featurizer'] = self.featurizer.renderer
+        with self._lock:
+            self._latencies.append(time.perf_counter() - start)
+        return result
+    
+    def latency_stats(self) -> Dict:
+        """Latency percentiles (ms) over the recent window and batcher counters"""
+        with self._lock:
+            latencies = np.array(self._latencies)
+        stats = {'requests': int(latencies.size)}
+        if latencies.size:
+            p50, p99 = np.percentile(latencies * 1000, [50, 99])
+            stats.update(p50_ms=float(p50), p99_ms=float(p99))
+        stats['batching'] = self.batcher.stats()
+        if self.cache is not None:
+            stats['cache'] = self.cache.stats()
+        return stats
+    
+    def close(self):
+        """Stop the batching worker (and the MATLAB engine)"""
+        self.batcher.close()
+        if isinstance(self.featurizer, MatlabFeaturizer):
+            self.featurizer.close()
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    """HTTP front-end for a PredictionService"""
+    
+    service: PredictionService = None
+    
+    def _send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {'status': 'ok'})
+        elif self.path == "/stats":
+            self._send_json(200, self.service.latency_stats())
+        else:
+            self._send_json(404, {'error': f"Unknown endpoint {self.path}"})
+    
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send_json(404, {'error': f"Unknown endpoint {self.path}"})
+            return
+        
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                audio = json.loads(body)["path"]
+                if not Path(audio).is_file():
+                    raise FileNotFoundError(f"Audio file not found: {audio}")
+            else:
+                audio = io.BytesIO(body)
+            result = self.service.predict(audio)
+        except (KeyError, json.JSONDecodeError, FileNotFoundError, RuntimeError) as e:
+            self._send_json(400, {'error': str(e)})
+        except ValueError as e:
+            self._send_json(422, {'error': str(e)})
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+        else:
+            self._send_json(200, result)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve bird species predictions over HTTP')
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+                      help='Interface to bind to')
+    parser.add_argument('--port', type=int, default=8000,
+                      help='Port to listen on')
+    parser.add_argument('--model', type=str, default=None,
+                      help='Path to trained model (.h5, or .tflite for the TFLite runtime)')
+    parser.add_argument('--stats', type=str, default=None,
+                      help='Path to training statistics (models without embedded preprocessing)')
+    parser.add_argument('--max-batch-size', type=int, default=64,
+                      help='Maximum number of syllables per forward pass')
+    parser.add_argument('--max-wait-ms', type=float, default=5.0,
+                      help='Maximum time to wait for a batch to fill')
+    parser.add_argument('--max-queue-size', type=int, default=0,
+                      help='Maximum number of requests waiting for the model (0 for no limit)')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                      help='Feature cache directory (defaults to <project root>/cache)')
+    parser.add_argument('--cache-size-mb', type=float, default=0,
+                      help='Feature cache size limit in MB (0 disables the cache)')
+    parser.add_argument('--matlab', action='store_true',
+                      help='Render spectrograms with the MATLAB engine, like the training JPEGs')
+    parser.add_argument('--agreement-report', type=str, default=None,
+                      help='Agreement report required for the in-memory featurizer '
+                           '(defaults to <model>.agreement.json)')
+    parser.add_argument('--min-agreement', type=float, default=MIN_RECORDING_AGREEMENT,
+                      help='Minimum recording-level agreement in that report')
+    args = parser.parse_args()
+    
+    cache = None
+    if args.cache_size_mb > 0:
+        cache = FeatureCache(args.cache_dir, max_bytes=int(args.cache_size_mb * 2**20))
+    
+    service = PredictionService(
+        model_path=args.model,
+        stats_path=args.stats,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        max_queue_size=args.max_queue_size,
+        cache=cache,
+        use_matlab=args.matlab,
+        agreement_report=args.agreement_report,
+        min_agreement=args.min_agreement
+    )
+    PredictionHandler.service = service
+    server = ThreadingHTTPServer((args.host, args.port), PredictionHandler)
+    print(f"Serving predictions on http://{args.host}:{args.port}")
+    
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
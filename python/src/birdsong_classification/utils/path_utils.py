@@ -19,4 +19,9 @@ def get_models_dir() -> Path:
 
 def get_results_dir() -> Path:
     """Get path to results directory"""
-    return get_project_root() / "results"
\ No newline at end of file
+    return get_project_root() / "results"
+
+
+def get_cache_dir() -> Path:
+    """Get path to feature cache directory"""
+    return get_project_root() / "cache"
@@ -1,21 +1,13 @@
-# python/src/utils/visualization.py
-import matplotlib.pyplot as plt
-import seaborn as sns
-from typing import Dict, List, Optional
-import numpy as np
-import tensorflow as tf
-import pandas as pd
-from pathlib import Path
-
 # python/src/birdsong_classification/utils/visualization.py
 import matplotlib.pyplot as plt
 import seaborn as sns
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional
 import numpy as np
-import tensorflow as tf
-import pandas as pd
 from pathlib import Path
 
+if TYPE_CHECKING:
+    import tensorflow as tf
+
 class Visualizer:
     """Utility class for visualizing training and evaluation results"""
     
@@ -53,7 +45,7 @@ class Visualizer:
         sns.set_style("whitegrid")
     
     def plot_training_history(self, 
-                            history: tf.keras.callbacks.History,
+                            history: 'tf.keras.callbacks.History',
                             save_name: Optional[str] = "training_history.png"):
         """
         Plot training history including loss and accuracy
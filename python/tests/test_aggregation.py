@@ -0,0 +1,33 @@
+# tests/test_aggregation.py
+"""Early-exit stepping of the syllable aggregator"""
+import numpy as np
+
+from birdsong_classification.models.aggregation import Aggregator
+
+
+def confident(label, n, num_classes=3):
+    predictions = np.full((n, num_classes), 0.05)
+    predictions[:, label] = 1 - 0.05 * (num_classes - 1)
+    return predictions
+
+
+def test_needed_without_margin_takes_everything():
+    aggregator = Aggregator(3)
+    assert aggregator.needed(32) == 32
+    aggregator.update(confident(0, 10))
+    assert aggregator.needed(32) == 32
+
+
+def test_needed_reaches_min_syllables_then_takes_full_batches():
+    aggregator = Aggregator(3, 'mean', margin=0.5, min_syllables=3)
+    assert aggregator.needed(32) == 3
+    assert aggregator.needed(2) == 2
+
+    # Split evidence: the margin is not met, so the next step is a full batch
+    aggregator.update(np.vstack([confident(0, 2), confident(1, 1)]))
+    assert not aggregator.done
+    assert aggregator.needed(32) == 32
+
+    # The margin is rechecked on the running scores after the batch
+    assert aggregator.update(confident(0, 32))
+    assert aggregator.needed(32) == 0
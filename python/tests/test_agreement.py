@@ -0,0 +1,95 @@
+# tests/test_agreement.py
+"""Featurizer/JPEG agreement report, with a stand-in for the MATLAB engine"""
+import json
+import sys
+import types
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from birdsong_classification.audio.agreement import (MatlabFeaturizer, agreement_report, default_report_path,
+                                                     featurizer_for_model, model_digest, render_matlab)
+from birdsong_classification.audio.spectrogram import SpectrogramFeaturizer
+
+
+class FakeEngine:
+    """Writes one flat gray JPEG per syllable, named like generate_spectrograms.m"""
+
+    def generate_spectrograms(self, syllables, params, output_dir, nargout=0):
+        assert set(params) == {'window', 'overlap', 'nfft', 'fs'}
+        matrix = np.asarray(syllables[0])
+        for j in range(matrix.shape[1]):
+            level = int(matrix[0, j])
+            cv2.imwrite(str(Path(output_dir) / f"1{j + 1}.jpg"), np.full((40, 60, 3), level, np.uint8))
+
+
+@pytest.fixture
+def matlab_module(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'matlab', types.SimpleNamespace(double=np.asarray))
+
+
+def test_render_matlab_keeps_syllable_order(matlab_module):
+    # More than nine syllables: 110.jpg must come after 19.jpg
+    levels = np.arange(12) * 20
+    syllables = np.repeat(levels[:, np.newaxis], 100, axis=1).astype(float)
+    X = render_matlab(FakeEngine(), syllables, SpectrogramFeaturizer(img_size=16))
+    assert X.shape == (12, 16, 16, 3)
+    np.testing.assert_allclose(X[:, 8, 8, 0], levels, atol=2)
+
+
+def test_agreement_report():
+    images = np.zeros((4, 2, 2, 3))
+    jpeg = np.array([[0.9, 0.1], [0.8, 0.2], [0.1, 0.9], [0.6, 0.4]])
+    featurizer = np.array([[0.7, 0.3], [0.4, 0.6], [0.2, 0.8], [0.6, 0.4]])
+    report = agreement_report(images, images + 3, jpeg, featurizer, np.array([0, 0, 1, 1]))
+
+    assert report['syllables'] == 4 and report['recordings'] == 2
+    assert report['mean_abs_pixel_error'] == 3
+    assert report['syllable_agreement'] == 0.75
+    # Recording 0 ties 1:1 under the featurizer and goes to class 0, like the JPEGs
+    assert report['recording_agreement'] == 1.0
+    assert report['mean_total_variation'] == pytest.approx((0.2 + 0.4 + 0.1 + 0) / 4)
+
+
+def write_report(model_path, featurizer, agreement=1.0):
+    report = {'recording_agreement': agreement, 'model_sha256': model_digest(model_path),
+              'featurizer': featurizer.params()}
+    default_report_path(model_path).write_text(json.dumps(report))
+
+
+def test_in_memory_path_needs_a_matching_report(tmp_path):
+    model_path = tmp_path / 'model.h5'
+    model_path.write_bytes(b'weights')
+    model = types.SimpleNamespace(input_shape=(16, 16, 3))
+
+    with pytest.raises(ValueError, match='No featurizer agreement report'):
+        featurizer_for_model(model, model_path)
+
+    write_report(model_path, SpectrogramFeaturizer(img_size=16))
+    assert featurizer_for_model(model, model_path).renderer == 'in-memory'
+
+    write_report(model_path, SpectrogramFeaturizer(img_size=32))
+    with pytest.raises(ValueError, match='other featurizer settings'):
+        featurizer_for_model(model, model_path)
+
+    write_report(model_path, SpectrogramFeaturizer(img_size=16), agreement=0.9)
+    with pytest.raises(ValueError, match='below the required'):
+        featurizer_for_model(model, model_path)
+    assert featurizer_for_model(model, model_path, min_agreement=0.9).renderer == 'in-memory'
+
+    # Retraining the model invalidates the report
+    model_path.write_bytes(b'new weights')
+    with pytest.raises(ValueError, match='different model'):
+        featurizer_for_model(model, model_path, min_agreement=0.9)
+
+
+def test_matlab_featurizer_renders_with_the_engine(matlab_module):
+    featurizer = MatlabFeaturizer(img_size=16, eng=FakeEngine())
+    syllables = np.full((3, 100), 120.0)
+    X = featurizer(syllables)
+    assert X.dtype == np.float32 and X.shape == (3, 16, 16, 3)
+    np.testing.assert_allclose(X[:, 8, 8, 0], 120, atol=2)
+    assert featurizer(syllables[:0]).shape == (0, 16, 16, 3)
+    assert featurizer.renderer == 'matlab' and featurizer.params()['renderer'] == 'matlab'
@@ -0,0 +1,90 @@
+# tests/test_batching.py
+"""Queue accounting of the micro-batcher"""
+import queue
+import threading
+import types
+
+import numpy as np
+import pytest
+
+from birdsong_classification.models.batching import MicroBatcher
+
+
+def identity(X):
+    return X
+
+
+def test_full_queue_rolls_back_the_queue_depth():
+    started, release = threading.Event(), threading.Event()
+
+    def blocking_predict(X):
+        started.set()
+        release.wait(10)
+        return X
+
+    batcher = MicroBatcher(blocking_predict, max_batch_size=4, max_wait_ms=0, max_queue_size=1)
+    first = batcher.submit(np.ones((2, 1)))
+    assert started.wait(10)
+    second = batcher.submit(np.ones((3, 1)))
+    with pytest.raises(queue.Full):
+        batcher.submit(np.ones((5, 1)), timeout=0.05)
+
+    stats = batcher.stats()
+    assert (stats['queue_depth_requests'], stats['queue_depth_rows']) == (1, 3)
+
+    release.set()
+    assert len(first.result(10)) == 2 and len(second.result(10)) == 3
+    batcher.close()
+    stats = batcher.stats()
+    assert (stats['queue_depth_requests'], stats['queue_depth_rows']) == (0, 0)
+
+
+def test_queue_depth_never_goes_negative_under_concurrent_submits():
+    batcher = MicroBatcher(identity, max_batch_size=8, max_wait_ms=0)
+    depths = []
+
+    def client():
+        for _ in range(200):
+            batcher.submit(np.ones((1, 1))).result(10)
+            depths.append(batcher.stats()['queue_depth_rows'])
+
+    threads = [threading.Thread(target=client) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.close()
+
+    assert min(depths) >= 0
+    assert batcher.stats()['queue_depth_rows'] == 0
+    assert batcher.stats()['rows'] == 800
+
+
+def test_oversized_request_counts_as_a_full_batch():
+    batcher = MicroBatcher(identity, max_batch_size=4, max_wait_ms=0)
+    assert len(batcher.predict(np.ones((10, 1)))) == 10
+    assert batcher.stats()['batch_fill_ratio'] == 1.0
+    assert len(batcher.predict(np.ones((2, 1)))) == 2
+    batcher.close()
+    assert batcher.stats()['batch_fill_ratio'] == pytest.approx(12 / 14)
+
+
+def test_submit_after_close_raises():
+    batcher = MicroBatcher(identity, max_batch_size=4, max_wait_ms=0)
+    assert len(batcher.predict(np.ones((2, 1)))) == 2
+    batcher.close()
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit(np.ones((1, 1)))
+
+
+def test_empty_request_has_one_column_per_class():
+    classifier = types.SimpleNamespace(num_classes=3, predict_on_batch=lambda X: np.ones((len(X), 3)))
+    batcher = MicroBatcher.for_classifier(classifier, max_wait_ms=0)
+    assert batcher.predict(np.empty((0, 8, 8, 3))).shape == (0, 3)
+    batcher.close()
+
+    # Without num_classes the prediction function decides
+    batcher = MicroBatcher(classifier.predict_on_batch, max_wait_ms=0)
+    assert batcher.predict(np.empty((0, 8, 8, 3))).shape == (0, 3)
+    batcher.close()
@@ -0,0 +1,55 @@
+# tests/test_cache.py
+"""Syllable and feature caching of the prediction pipeline"""
+from pathlib import Path
+
+import numpy as np
+
+from birdsong_classification.audio import constants, io
+from birdsong_classification.audio.cache import FeatureCache
+from birdsong_classification.audio.pipeline import extract_syllables_from_file, process_single_audio, syllable_params
+from birdsong_classification.audio.spectrogram import SpectrogramFeaturizer
+
+RECORDING = str(Path(__file__).resolve().parents[2] / 'data' / 'raw' / 'house_sparrow' / '1.mp3')
+
+
+class CountingFeaturizer(SpectrogramFeaturizer):
+    """Featurizer that counts the syllables it renders"""
+
+    rendered = 0
+
+    def __call__(self, syllables):
+        self.rendered += len(syllables)
+        return super().__call__(syllables)
+
+
+def test_cached_features_match_and_skip_rendering(tmp_path):
+    cache = FeatureCache(tmp_path, max_bytes=1 << 30)
+    featurizer = CountingFeaturizer(img_size=32)
+
+    direct = process_single_audio(RECORDING, 3, featurizer, np.random.default_rng(0))
+    cold = process_single_audio(RECORDING, 3, featurizer, np.random.default_rng(0), cache=cache)
+    assert featurizer.rendered == 6
+    warm = process_single_audio(RECORDING, 3, featurizer, np.random.default_rng(0), cache=cache)
+    assert featurizer.rendered == 6
+    np.testing.assert_array_equal(cold, direct)
+    np.testing.assert_array_equal(warm, direct)
+
+    # Other featurizer settings never reuse these images
+    other = CountingFeaturizer(img_size=16)
+    assert process_single_audio(RECORDING, 3, other, np.random.default_rng(0), cache=cache).shape[1] == 16
+    assert other.rendered == 3
+
+
+def test_segmentation_settings_are_part_of_the_key(tmp_path, monkeypatch):
+    cache = FeatureCache(tmp_path, max_bytes=1 << 30)
+    extract_syllables_from_file(RECORDING, cache=cache)
+    extract_syllables_from_file(RECORDING, cache=cache)
+    assert cache.stats()['hits'] == 1
+
+    assert syllable_params()['bandpass_order'] == io.BANDPASS_ORDER
+    for name, value in [('MIN_SPACE_MS', 20), ('SHORT_WINDOW_MS', 10), ('LONG_WINDOW_MS', 300)]:
+        with monkeypatch.context() as patch:
+            patch.setattr(constants, name, value)
+            misses = cache.stats()['misses']
+            extract_syllables_from_file(RECORDING, cache=cache)
+            assert cache.stats()['misses'] == misses + 1, name
@@ -0,0 +1,142 @@
+# tests/test_download_bird_songs.py
+"""Downloader against a local stand-in for the xeno-canto API"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from birdsong_classification.data.download_bird_songs import (
+    MANIFEST_NAME, download_bird_songs, part_path_for
+)
+
+SPECIES = 'Eurasian blue tit'
+SPECIES_DIR = 'eurasian_blue_tit'
+
+
+class FakeXenoCanto(ThreadingHTTPServer):
+    """Serves /api pages of recordings and /files/<id>.mp3 with Range support"""
+
+    def __init__(self, recordings, page_size=2):
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.files = dict(recordings)
+        self.order = list(self.files)
+        self.page_size = page_size
+        self.missing = set()
+        self.requests = []
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def page(self, number):
+        start = (number - 1) * self.page_size
+        ids = self.order[start:start + self.page_size]
+        return {
+            'numPages': -(-len(self.order) // self.page_size),
+            'recordings': [{'id': rec_id, 'file': f"{self.base_url}/files/{rec_id}.mp3"} for rec_id in ids],
+        }
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self.server.requests.append((url.path, self.headers.get('Range')))
+        if url.path == '/api':
+            page = int(parse_qs(url.query)['page'][0])
+            return self.send_bytes(json.dumps(self.server.page(page)).encode(), 'application/json')
+        rec_id = url.path.rsplit('/', 1)[-1][:-len('.mp3')]
+        if rec_id in self.server.missing or rec_id not in self.server.files:
+            self.send_error(404)
+            return
+        data = self.server.files[rec_id]
+        byte_range = self.headers.get('Range')
+        if byte_range:
+            offset = int(byte_range[len('bytes='):-1])
+            if offset >= len(data):
+                self.send_error(416)
+                return
+            return self.send_bytes(data[offset:], 'audio/mpeg', status=206)
+        self.send_bytes(data, 'audio/mpeg')
+
+    def send_bytes(self, data, content_type, status=200):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def server():
+    recordings = {str(rec_id): f"recording {rec_id} ".encode() * 1000 for rec_id in (101, 102, 103, 104, 105)}
+    server = FakeXenoCanto(recordings)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def download(server, output_dir, **kwargs):
+    return download_bird_songs(SPECIES, num_files=5, output_dir=str(output_dir),
+                               base_url=f"{server.base_url}/api", max_workers=2,
+                               backoff=0.01, **kwargs)
+
+
+def file_requests(server):
+    return [request for request in server.requests if request[0].startswith('/files/')]
+
+
+def load_downloads(species_dir):
+    with open(species_dir / MANIFEST_NAME) as f:
+        manifest = json.load(f)
+    return {rec_id: (species_dir / name).read_bytes() for rec_id, name in manifest.items()}
+
+
+def test_downloads_all_pages_and_skips_on_rerun(server, tmp_path):
+    assert download(server, tmp_path) == {'downloaded': 5, 'skipped': 0, 'failed': 0}
+    assert load_downloads(tmp_path / SPECIES_DIR) == server.files
+
+    server.requests.clear()
+    assert download(server, tmp_path) == {'downloaded': 0, 'skipped': 5, 'failed': 0}
+    assert file_requests(server) == []
+
+
+def test_resumes_part_file_of_the_same_recording_after_reorder(server, tmp_path):
+    species_dir = tmp_path / SPECIES_DIR
+    species_dir.mkdir()
+    # Interrupted run: names assigned, half of recording 103 downloaded
+    (species_dir / MANIFEST_NAME).write_text(json.dumps({rec_id: f"{i}.mp3" for i, rec_id in enumerate(server.order, 1)}))
+    part = server.files['103'][:1234]
+    part_path_for(species_dir, '103').write_bytes(part)
+
+    server.order.reverse()
+    assert download(server, tmp_path)['downloaded'] == 5
+    assert load_downloads(species_dir) == server.files
+    assert ('/files/103.mp3', f"bytes={len(part)}-") in server.requests
+    assert not list(species_dir.glob('*.part'))
+
+
+def test_permanent_client_error_is_not_retried(server, tmp_path):
+    server.missing.add('102')
+    summary = download(server, tmp_path, max_retries=5)
+    assert summary == {'downloaded': 4, 'skipped': 0, 'failed': 1}
+    assert sum(path == '/files/102.mp3' for path, _ in file_requests(server)) == 1
+
+
+def test_adopts_files_of_the_downloader_without_manifest(server, tmp_path):
+    species_dir = tmp_path / SPECIES_DIR
+    species_dir.mkdir()
+    # The old downloader named the i-th recording of the query <i>.mp3
+    for i, rec_id in enumerate(server.order[:3], 1):
+        (species_dir / f"{i}.mp3").write_bytes(server.files[rec_id])
+
+    assert download(server, tmp_path) == {'downloaded': 2, 'skipped': 3, 'failed': 0}
+    assert sorted(path for path, _ in file_requests(server)) == ['/files/104.mp3', '/files/105.mp3']
+    assert load_downloads(species_dir) == server.files
+    assert len(list(species_dir.glob('*.mp3'))) == 5
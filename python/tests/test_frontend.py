@@ -0,0 +1,59 @@
+# tests/test_frontend.py
+"""Front-end reruns and reuse of its output by segmentation"""
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from birdsong_classification.audio.frontend import load_filtered, run_frontend
+from birdsong_classification.audio.pipeline import extract_syllables_from_file
+
+RECORDING = Path(__file__).resolve().parents[2] / 'data' / 'raw' / 'house_sparrow' / '1.mp3'
+
+
+def make_raw_dir(tmp_path):
+    raw_dir = tmp_path / 'raw'
+    (raw_dir / 'house_sparrow').mkdir(parents=True)
+    audio_path = raw_dir / 'house_sparrow' / '1.mp3'
+    shutil.copy(RECORDING, audio_path)
+    return raw_dir, audio_path
+
+
+def run(raw_dir, output_dir, **kwargs):
+    return run_frontend(raw_dir, output_dir, num_workers=1, **kwargs)
+
+
+def test_rerun_skips_only_outputs_valid_for_the_settings(tmp_path):
+    raw_dir, audio_path = make_raw_dir(tmp_path)
+    output_dir = tmp_path / 'filtered'
+
+    assert run(raw_dir, output_dir) == {'processed': 1, 'skipped': 0, 'failed': 0}
+    assert run(raw_dir, output_dir) == {'processed': 0, 'skipped': 1, 'failed': 0}
+
+    # Different settings must not reuse the output, whatever the mtimes say
+    assert load_filtered(audio_path, output_dir, target_fs=32000) is None
+    assert run(raw_dir, output_dir, target_fs=32000)['processed'] == 1
+    assert run(raw_dir, output_dir, filter_band=(2000, 8000))['processed'] == 1
+    assert load_filtered(audio_path, output_dir) is None
+    assert load_filtered(audio_path, output_dir, filter_band=(2000, 8000)) is not None
+
+    # A changed recording is processed again
+    stat = audio_path.stat()
+    os.utime(audio_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert load_filtered(audio_path, output_dir, filter_band=(2000, 8000)) is None
+    assert run(raw_dir, output_dir, filter_band=(2000, 8000))['processed'] == 1
+
+
+def test_segmentation_reads_the_filtered_signal(tmp_path):
+    raw_dir, audio_path = make_raw_dir(tmp_path)
+    output_dir = tmp_path / 'filtered'
+    run(raw_dir, output_dir)
+
+    signal = load_filtered(audio_path, output_dir)
+    assert signal is not None and signal.dtype == np.float64
+
+    direct = extract_syllables_from_file(str(audio_path))
+    reused = extract_syllables_from_file(str(audio_path), filtered_dir=output_dir)
+    assert len(direct) > 0
+    np.testing.assert_array_equal(reused, direct)
@@ -0,0 +1,54 @@
+# tests/test_import_time.py
+"""CLI start-up must not import the heavy dependencies"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import birdsong_classification
+
+HEAVY_MODULES = {'tensorflow', 'h5py', 'matlab', 'matplotlib', 'cv2'}
+
+CLIS = [
+    'birdsong_classification.predict',
+    'birdsong_classification.predict_batch',
+    'birdsong_classification.predict_stream',
+    'birdsong_classification.serve',
+    'birdsong_classification.live',
+    'birdsong_classification.models.train',
+    'birdsong_classification.models.export',
+    'birdsong_classification.models.benchmark',
+    'birdsong_classification.evaluation.evaluate',
+]
+
+
+def parse_importtime(importtime_log: str) -> dict:
+    """Cumulative import time (us) of every module in ``python -X importtime`` output"""
+    modules = {}
+    for line in importtime_log.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                modules[name.strip()] = int(cumulative)
+    return modules
+
+
+@pytest.mark.parametrize('cli', CLIS)
+def test_help_skips_heavy_imports(cli, tmp_path, record_property):
+    env = dict(os.environ)
+    src_dir = str(Path(birdsong_classification.__file__).resolve().parents[1])
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [src_dir, env.get('PYTHONPATH')]))
+
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-m', cli, '--help'],
+                            cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    modules = parse_importtime(result.stderr)
+    top_level = {name.split('.')[0] for name in modules}
+    assert 'birdsong_classification' in top_level
+    assert not top_level & HEAVY_MODULES, f"{cli} --help imports {sorted(top_level & HEAVY_MODULES)}"
+
+    # Reported only (pytest --junitxml): wall-clock budgets are flaky on shared machines
+    record_property('package_import_ms', modules['birdsong_classification'] / 1000)
@@ -0,0 +1,91 @@
+# tests/test_incremental.py
+"""Interrupted incremental builds and the shared train/test split rule"""
+import cv2
+import numpy as np
+import pytest
+
+from birdsong_classification.data import incremental
+from birdsong_classification.data.dataset import BirdSongDataset, build_index
+from birdsong_classification.data.incremental import assign_split, split_by_hash, update_dataset
+from birdsong_classification.data.preprocessing import RunningStats, compute_stats
+from birdsong_classification.data.store import SpectrogramStore
+
+CATEGORIES = ['a', 'b']
+
+
+def write_images(root, recordings, seed):
+    rng = np.random.default_rng(seed)
+    for category in CATEGORIES:
+        (root / category).mkdir(parents=True, exist_ok=True)
+        for recording in recordings:
+            for syllable in range(1, 3):
+                cv2.imwrite(str(root / category / f"{recording}{syllable}.jpg"),
+                            rng.integers(0, 255, (20, 20, 3), dtype=np.uint8))
+
+
+def build(tmp_path):
+    return update_dataset(BirdSongDataset(tmp_path / 'spectrograms', CATEGORIES, img_size=8),
+                          tmp_path / 'processed' / 'train', tmp_path / 'processed' / 'test',
+                          stats_path=tmp_path / 'train_stats.npz')
+
+
+def interrupted(tmp_path, monkeypatch):
+    with monkeypatch.context() as patch:
+        patch.setattr(incremental, 'save_index', lambda *args: (_ for _ in ()).throw(KeyboardInterrupt))
+        with pytest.raises(KeyboardInterrupt):
+            build(tmp_path)
+
+
+def assert_consistent(tmp_path):
+    dataset = BirdSongDataset(tmp_path / 'spectrograms', CATEGORIES, img_size=8)
+    paths, _ = dataset.list_images()
+    train = SpectrogramStore(tmp_path / 'processed' / 'train')
+    test = SpectrogramStore(tmp_path / 'processed' / 'test')
+    assert len(train) + len(test) == len(paths)
+
+    # Every image is in its store once, with its current pixels
+    index = incremental.load_index(tmp_path / 'processed' / incremental.INDEX_NAME)
+    stores = {'train': train, 'test': test}
+    for path in paths:
+        entry = index['files'][path.relative_to(dataset.data_dir).as_posix()]
+        np.testing.assert_array_equal(stores[entry['split']].take([entry['row']])[0], dataset.load_image(path))
+
+    stats = RunningStats.load(tmp_path / 'train_stats.npz')
+    mean, std = compute_stats(train.take(np.arange(len(train))))
+    assert stats.count == train.take(np.arange(len(train))).size
+    assert stats.mean == pytest.approx(mean) and stats.std == pytest.approx(std)
+
+
+def test_interrupted_append_is_not_counted_twice(tmp_path, monkeypatch):
+    write_images(tmp_path / 'spectrograms', range(10, 30), seed=0)
+    build(tmp_path)
+    write_images(tmp_path / 'spectrograms', range(30, 50), seed=1)
+
+    interrupted(tmp_path, monkeypatch)
+    summary = build(tmp_path)
+    assert summary['new'] == 80
+    assert_consistent(tmp_path)
+
+
+def test_interrupted_update_is_rolled_back(tmp_path, monkeypatch):
+    write_images(tmp_path / 'spectrograms', range(10, 30), seed=0)
+    build(tmp_path)
+    # Half of the files get new pixels
+    write_images(tmp_path / 'spectrograms', range(10, 20), seed=1)
+
+    interrupted(tmp_path, monkeypatch)
+    summary = build(tmp_path)
+    assert summary['changed'] == 40
+    assert_consistent(tmp_path)
+
+
+def test_full_build_holds_out_the_incremental_recordings(tmp_path):
+    write_images(tmp_path / 'spectrograms', range(10, 60), seed=0)
+    paths, labels = BirdSongDataset(tmp_path / 'spectrograms', CATEGORIES).list_images()
+    index = build_index(paths, labels)
+
+    train_idx, test_idx = split_by_hash(index['recording_id'].astype(str))
+    assert len(test_idx) > 0
+    for i in test_idx:
+        assert assign_split(index['recording_id'][i]) == 'test'
+    assert set(index['recording_id'][train_idx]).isdisjoint(index['recording_id'][test_idx])
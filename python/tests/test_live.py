@@ -0,0 +1,29 @@
+# tests/test_live.py
+"""Sample accounting of the live audio ring buffer"""
+import numpy as np
+
+from birdsong_classification.live import RingBuffer
+
+
+def test_read_returns_samples_in_order():
+    ring = RingBuffer(8)
+    ring.write(np.arange(5, dtype=np.float32))
+    assert ring.read().tolist() == [0, 1, 2, 3, 4]
+    ring.write(np.arange(5, 11, dtype=np.float32))
+    assert (len(ring), ring.free, ring.read_offset) == (6, 2, 5)
+    assert ring.read().tolist() == [5, 6, 7, 8, 9, 10]
+    assert (ring.dropped, ring.read_offset) == (0, 11)
+
+
+def test_overflow_counts_lost_samples_and_advances_read_offset():
+    ring = RingBuffer(4)
+    ring.write(np.arange(3, dtype=np.float32))
+    ring.write(np.arange(3, 6, dtype=np.float32))
+    assert (ring.dropped, ring.read_offset, ring.free) == (2, 2, 0)
+    assert ring.read().tolist() == [2, 3, 4, 5]
+
+    # A single write larger than the buffer keeps its newest samples
+    ring.write(np.arange(6, 16, dtype=np.float32))
+    assert (ring.dropped, ring.read_offset) == (8, 12)
+    assert ring.read().tolist() == [12, 13, 14, 15]
+    assert ring.read_offset == ring.written == 16
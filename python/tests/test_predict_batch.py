@@ -0,0 +1,35 @@
+# tests/test_predict_batch.py
+"""Resuming batch prediction from an existing results file"""
+import pytest
+
+from birdsong_classification.predict_batch import ResultWriter
+
+CATEGORIES = ['a', 'b']
+RESULT = {'predicted_species': 'a', 'confidence_scores': {'a': 0.75, 'b': 0.25},
+          'individual_predictions': ['a', 'a', 'b', 'a']}
+
+
+@pytest.mark.parametrize('suffix', ['.csv', '.jsonl'])
+def test_failed_files_are_not_completed(tmp_path, suffix):
+    output = tmp_path / f'results{suffix}'
+    writer = ResultWriter(str(output), CATEGORIES)
+    writer.write('ok.mp3', RESULT)
+    writer.write('broken.mp3', error='No syllables detected in audio')
+    writer.close()
+    assert ResultWriter.completed(str(output)) == {'ok.mp3'}
+
+    # A later run retries the failed file and appends its result
+    writer = ResultWriter(str(output), CATEGORIES)
+    writer.write('broken.mp3', RESULT)
+    writer.close()
+    assert ResultWriter.completed(str(output)) == {'ok.mp3', 'broken.mp3'}
+
+
+def test_partial_last_line_is_ignored(tmp_path):
+    output = tmp_path / 'results.jsonl'
+    writer = ResultWriter(str(output), CATEGORIES)
+    writer.write('ok.mp3', RESULT)
+    writer.close()
+    with open(output, 'a') as f:
+        f.write('{"file": "cut.mp3", "predic')
+    assert ResultWriter.completed(str(output)) == {'ok.mp3'}
@@ -0,0 +1,53 @@
+# tests/test_segmentation_parity.py
+"""syllable_cut against reference boundaries of matlab/src/syllable_cut.m"""
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from birdsong_classification.audio.segmentation import ms_to_samples, syllable_cut
+
+REFERENCE_FILE = Path(__file__).parent / 'fixtures' / 'syllable_cut_reference.json'
+
+with open(REFERENCE_FILE) as f:
+    REFERENCE = json.load(f)
+
+
+def matlab_round(x):
+    return int(np.floor(x + 0.5))
+
+
+def synthesize(case):
+    """Sum of sine bursts, identical to synthesize() in export_syllable_reference.m"""
+    fs = case['fs']
+    signal = np.zeros(matlab_round(case['duration'] * fs))
+    for onset, length, freq, amplitude in np.reshape(np.asarray(case['bursts'], dtype=float), (-1, 4)):
+        start = matlab_round(onset * fs)
+        t = np.arange(matlab_round(length * fs)) / fs
+        signal[start:start + len(t)] += amplitude * np.sin(2 * np.pi * freq * t)
+    return signal
+
+
+def as_indices(values):
+    # jsonencode writes 1-element vectors as scalars
+    return np.atleast_1d(np.asarray(values, dtype=np.int64))
+
+
+@pytest.mark.parametrize('case', REFERENCE['cases'], ids=lambda case: case['name'])
+def test_syllable_cut_matches_matlab(case):
+    signal = synthesize(case)
+    fs = case['fs']
+    syllables, time_points = syllable_cut(signal, fs, REFERENCE['min_length'], REFERENCE['max_length'])
+
+    starts = as_indices(case['starts'])
+    ends = as_indices(case['ends'])
+    np.testing.assert_array_equal(np.round(time_points[0] * fs).astype(np.int64), starts)
+    np.testing.assert_array_equal(np.round(time_points[1] * fs).astype(np.int64), ends)
+
+    min_samples = ms_to_samples(REFERENCE['min_length'], fs)
+    assert syllables.shape == (len(starts), min_samples)
+    if len(starts):
+        assert case['syllable_length'] == min_samples
+    for syllable, start in zip(syllables, starts):
+        np.testing.assert_array_equal(syllable, signal[start - 1:start - 1 + min_samples])
@@ -0,0 +1,36 @@
+# tests/test_split.py
+"""Validation split of the training store by recording"""
+import numpy as np
+
+from birdsong_classification.data.pipeline import split_indices
+from birdsong_classification.data.store import SpectrogramStore
+
+
+def write_store(root, num_recordings=40, syllables=5):
+    rng = np.random.default_rng(0)
+    recording_labels = np.arange(num_recordings) % 3
+    y = np.repeat(recording_labels, syllables)
+    recording_ids = np.repeat([f"species{label}/{i}" for i, label in enumerate(recording_labels)], syllables)
+    X = rng.integers(0, 255, (len(y), 4, 4, 3), dtype=np.uint8)
+    # Shuffled and sharded like prepare_data writes the training store
+    order = rng.permutation(len(y))
+    return SpectrogramStore.write(root, X, y, shard_size=64, indices=order,
+                                  recording_ids=recording_ids), recording_ids[order]
+
+
+def test_store_keeps_recording_ids(tmp_path):
+    store, expected = write_store(tmp_path / 'train')
+    reopened = SpectrogramStore(tmp_path / 'train')
+    assert reopened.num_shards > 1
+    np.testing.assert_array_equal(reopened.recording_ids, expected)
+
+
+def test_no_recording_on_both_sides_of_the_split(tmp_path):
+    store, _ = write_store(tmp_path / 'train')
+    train_idx, val_idx = split_indices(len(store), validation_split=0.2, labels=store.labels,
+                                       recording_ids=store.recording_ids)
+
+    assert len(train_idx) + len(val_idx) == len(store)
+    assert set(store.recording_ids[train_idx]).isdisjoint(store.recording_ids[val_idx])
+    assert set(np.unique(store.labels[val_idx])) == {0, 1, 2}
+    assert len(np.unique(store.recording_ids[val_idx])) == 8
@@ -0,0 +1,55 @@
+# tests/test_store.py
+"""Lazy access to the sharded store and atomic rebuilds"""
+import numpy as np
+import pytest
+
+from birdsong_classification.data.dataset import BirdSongDataset
+from birdsong_classification.data.store import SpectrogramStore
+
+
+def sample_data(n=50, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 255, (n, 4, 4, 3), dtype=np.uint8), rng.integers(0, 3, n)
+
+
+def test_load_processed_data_does_not_materialize(tmp_path):
+    X, y = sample_data()
+    SpectrogramStore.write(tmp_path, X, y, shard_size=16)
+    store, labels = BirdSongDataset.load_processed_data(tmp_path)
+
+    assert isinstance(store, SpectrogramStore) and store.num_shards == 4
+    assert store.shape == X.shape and store.dtype == X.dtype
+    np.testing.assert_array_equal(labels, y)
+    np.testing.assert_array_equal(store[17], X[17])
+    np.testing.assert_array_equal(store[-1], X[-1])
+    np.testing.assert_array_equal(store[10:40:3], X[10:40:3])
+    np.testing.assert_array_equal(store[[33, 2, 17]], X[[33, 2, 17]])
+    with pytest.raises(IndexError):
+        store[len(X)]
+
+
+def test_interrupted_rebuild_keeps_the_old_store(tmp_path, monkeypatch):
+    root = tmp_path / 'train'
+    X, y = sample_data()
+    SpectrogramStore.write(root, X, y, shard_size=16)
+
+    new_X, new_y = sample_data(seed=1)
+    calls = []
+
+    def failing_append(self, *args, **kwargs):
+        calls.append(1)
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        return original_append(self, *args, **kwargs)
+
+    original_append = SpectrogramStore.append
+    monkeypatch.setattr(SpectrogramStore, 'append', failing_append)
+    with pytest.raises(KeyboardInterrupt):
+        SpectrogramStore.write(root, new_X, new_y, shard_size=16)
+    monkeypatch.undo()
+
+    np.testing.assert_array_equal(SpectrogramStore(root)[:], X)
+
+    SpectrogramStore.write(root, new_X, new_y, shard_size=16)
+    np.testing.assert_array_equal(SpectrogramStore(root)[:], new_X)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['train']
@@ -0,0 +1,52 @@
+# tests/test_streaming_parity.py
+"""Streaming segmentation against syllable_cut on complete signals"""
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from birdsong_classification.audio import constants
+from birdsong_classification.audio.pipeline import extract_syllables_from_file
+from birdsong_classification.audio.segmentation import get_power_envelope, syllable_cut
+from birdsong_classification.audio.streaming import StreamingSegmenter, stream_syllables
+from test_segmentation_parity import REFERENCE, synthesize
+
+RAW_DIR = Path(__file__).resolve().parents[2] / 'data' / 'raw'
+
+
+def segment_in_blocks(signal, fs, block_size, **kwargs):
+    segmenter = StreamingSegmenter(fs, REFERENCE['min_length'], REFERENCE['max_length'], **kwargs)
+    events = []
+    for i in range(0, len(signal), block_size):
+        events += segmenter.push(signal[i:i + block_size])
+    return events + segmenter.flush()
+
+
+@pytest.mark.parametrize('case', REFERENCE['cases'], ids=lambda case: case['name'])
+@pytest.mark.parametrize('block_size', [97, 4096])
+def test_segmenter_matches_syllable_cut(case, block_size):
+    signal, fs = synthesize(case), case['fs']
+    syllables, time_points = syllable_cut(signal, fs, REFERENCE['min_length'], REFERENCE['max_length'])
+    envelope_max = get_power_envelope(signal, constants.LONG_WINDOW_MS, fs).max()
+
+    events = segment_in_blocks(signal, fs, block_size, envelope_max=envelope_max)
+    np.testing.assert_array_equal([[event.start for event in events], [event.end for event in events]],
+                                  time_points.reshape(2, -1))
+    for event, syllable in zip(events, syllables):
+        np.testing.assert_array_equal(event.samples, syllable)
+
+    # Without the pairs of ends only the leading pairs of starts remain
+    starts_only = segment_in_blocks(signal, fs, block_size, envelope_max=envelope_max, end_pairs=False)
+    assert [event.start for event in starts_only] == [event.start for event in events[:len(starts_only)]]
+
+
+@pytest.mark.parametrize('species', ['house_sparrow', 'eurasian_blue_tit'])
+def test_stream_syllables_matches_extract_syllables(species):
+    recording = RAW_DIR / species / '1.mp3'
+    syllables = extract_syllables_from_file(recording)
+    events = list(stream_syllables(recording, block_seconds=3.0))
+    assert len(syllables) > 0 and len(events) == len(syllables)
+
+    # Block-wise filtering moves samples by rounding error only
+    for event, syllable in zip(events, syllables):
+        np.testing.assert_allclose(event.samples, syllable, atol=1e-6)